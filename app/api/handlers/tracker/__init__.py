@@ -11,15 +11,26 @@ deal with hits to ``Tracker`` classes, and produce/yield
           embedded licenses and other legalese, see `LICENSE.md`.-sam (<sam.gammon@ampush.com>)
 '''
 
+# stdlib
+import base64
+
 # Root
 import config
 
 # Policy
 from policy import base
 
+# Protocol
+from protocol import builtin
+from protocol import transport
+
 # WebHandler
 from api.handlers import WebHandler
 
+# Tracker Platform
+from api.platform.tracker import admission
+from api.platform.tracker import exceptions
+
 
 # detect redis support
 try:
@@ -28,6 +39,10 @@ except:
     _REDIS = False
 
 
+## Globals
+_TRANSPARENT_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
 ## TrackerEndpoint - handles tracker hits.
 class TrackerEndpoint(WebHandler):
 
@@ -35,42 +50,150 @@ class TrackerEndpoint(WebHandler):
 
     _config_path = 'handlers.tracker.TrackerEndpoint'
 
-    def entrypoint(self, explicit=False, legacy=False, policy=base.EventProfile):
+    def respond(self, policy):
 
-        ''' HTTP GET
-            :returns: Response to a tracker hit. '''
+        ''' Write the response configured for ``policy`` via
+            its HTTP :py:class:`transport.TransportConfig`,
+            without waiting on hit processing.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the current hit.
+
+            :returns: The current :py:attr:`response`. '''
+
+        _transport = policy.resolve_transport(transport.InputChannel.HTTP)
+        mode = _transport.response_mode if _transport else transport.HTTPResponseMode.BEACON
+
+        # empty GIF for image pixels
+        if mode is transport.HTTPResponseMode.IMG:
+            self.response.headers['Content-Type'] = 'image/gif'
+            self.response.write(_TRANSPARENT_GIF)
+
+        # redirects, falling back to a beacon without a destination
+        elif mode in (transport.HTTPResponseMode.REDIRECT_TEMP, transport.HTTPResponseMode.REDIRECT_PERM):
+            destination = self.request.params.get(builtin.TrackerProtocol.DESTINATION)
+            if destination:
+                return self.redirect(destination, permanent=(mode is transport.HTTPResponseMode.REDIRECT_PERM))
+            self.response.set_status(204)
+
+        # 204 No-Content beacon
+        elif mode is transport.HTTPResponseMode.BEACON:
+            self.response.set_status(204)
+
+        return self.response
+
+    def process(self, policy, legacy=False, deferred=False, multiplier=1):
+
+        ''' Enforce ``policy`` against the current hit, then
+            persist and publish the resulting events.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the current hit.
+
+            :keyword legacy: Flag indicating a legacy hit.
+
+            :keyword deferred: Flag indicating that the response
+            has already been written, in which case errors are
+            never re-raised.
+
+            :keyword multiplier: Sampling multiplier for the current
+            hit (see :py:meth:`AdmissionController.sample`).
+
+            :returns: Tupled ``(raw, event)``, or ``None`` if
+            processing failed (or the hit was shed, or is a
+            duplicate). '''
+
+        # admission control: under overload, degrade lower-priority hits first
+        level = self.tracker.admission.admit(self.request, policy, legacy)
+        if level == admission.DROP:
+            return None  # sampled out
 
         try:
 
+            # while the datastore is down, journal the hit locally instead of waiting on it
+            if self.tracker.spool.tripped:
+                return self.tracker.spool.append(self.request, policy, legacy, multiplier)
+
+            # in split ingestion mode, only persist the raw event and queue it for enforcement
+            if self.tracker.queue.enabled:
+                return self.tracker.queue.submit(self.request, policy, legacy, multiplier)
+
+            # degraded by admission control: record the raw event only
+            if level == admission.RAW:
+                return self.tracker.admission.record(self.request, policy, legacy, multiplier)
+
             # publish raw event first, propagating globally
             # collapse policy for this event, enforce, and fail-out from critical errors
-            raw, tracker, event, pipe = self.tracker.policy.enforce(self.request, policy, legacy=legacy)
+            raw, tracker, event, pipe = self.tracker.policy.enforce(*(
+                self.request,
+                policy), legacy=legacy, aggregate=level == admission.FULL, multiplier=multiplier)
+
+            # store tracked event, then publish
+            evkey, pipe = self.tracker.engine.persist(event, pipeline=pipe)
+
+            # underlying storage doesn't support pipelining, publish key
+            pipe = self.tracker.stream.publish(evkey, execute=False, pipeline=pipe, propagate=True)
+
+            # if we have an active pipeline, it's time to flush...
+            if pipe:
+                self.tracker.engine.execute(pipe)
+
+        except exceptions.DuplicateHit as e:
+
+            # already recorded within the dedup window: respond as usual, but write nothing
+            self.logging.info(str(e))
 
         except Exception as e:
 
+            # datastore outage: journal the hit, to be replayed once it recovers
+            if self.tracker.spool.enabled and isinstance(e, self.tracker.spool.outages):
+                return self.tracker.spool.append(self.request, policy, legacy, multiplier)
+
+            # let a retry of this hit through dedup, since it wasn't recorded
+            self.tracker.event.forget(self.request)
+
             # thoroughly log error, re-raise in debug mode
             # exceptions should almost never bubble-up this far
             context = (self.__class__.__name__, e.__class__.__name__, str(e))
             self.logging.error('Encountered unhandled exception in `%s` handler class: %s("%s").' % context)
 
-            if config.debug:
+            if config.debug and not deferred:
                 raise  # re-raise in debug, in production the show must go on
 
         else:
+            return raw, event
 
-            # store tracked event, then publish
-            evkey, pipe = self.tracker.engine.persist(event, pipeline=pipe)
+        finally:
+            self.tracker.admission.release()
 
-            # underlying storage doesn't support pipelining, publish key
-            pipe = self.tracker.stream.publish(evkey, execute=False, pipeline=pipe, propagate=True)
+    def entrypoint(self, explicit=False, legacy=False, policy=base.EventProfile):
 
-            # if we have an active pipeline, it's time to flush...
-            if pipe:
-                pipe.execute()
+        ''' HTTP GET
+            :returns: Response to a tracker hit. '''
+
+        # sampling: sampled-out hits get a cheap response, and are never processed
+        multiplier = self.tracker.admission.sample(self.request, policy, legacy)
+        if not multiplier:
+            return self.respond(policy)
+
+        # response-first dispatch: respond now, process later
+        if not explicit:
+            self.request.params  # preload params before the request body goes away
+
+            if self.tracker.defer(self.process, policy, legacy, True, multiplier):
+                return self.respond(policy)
+
+        result = self.process(policy, legacy, multiplier=multiplier)
+
+        # shed, duplicate or failed hits still get the response configured for them
+        if result is None and not explicit:
+            return self.respond(policy)
+
+        if result is not None:
 
             # return everything or nothing according to settings
             if explicit:
-                return policy, raw, event
+                return (policy,) + result
             return ''
 
     get = post = put = entrypoint
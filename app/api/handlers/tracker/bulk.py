@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+'''
+Handlers for the ``EventTracker`` subsystem. These handlers
+deal with batches of hits sent server-to-server, and produce/
+yield ``RawEvent`` models for each.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import json
+import urllib
+import urlparse
+
+# webapp2
+import webapp2
+
+# Policy Base
+from policy import base
+
+# Tracker Exceptions
+from api.platform.tracker import exceptions
+
+# Tracker Endpoints
+from api.handlers.tracker.legacy import LegacyEndpoint
+
+
+## BulkEndpoint - handles batches of tracker hits.
+class BulkEndpoint(LegacyEndpoint):
+
+    ''' Handles batches of `EventTracker` hits, sent by
+        server-side partners in one request. The body is
+        either a JSON array or newline-delimited JSON, where
+        each item is a ``dict`` of hit parameters (or a query
+        string). Items carrying ``ref`` are legacy hits.
+
+        Each item runs through :py:meth:`PolicyEngine.enforce`
+        like a regular hit, but writes and publishes for a chunk
+        of items are queued onto one pipeline and flushed in one
+        round-trip. The response holds a status for each item,
+        in order.
+
+        Items may carry their own event ID under ``id`` (or
+        ``XAF-Hash``), which is sent on as the hit's ``XAF-Hash``.
+        With dedup enabled, items whose ID was already recorded
+        (see :py:meth:`EventBuilder.duplicate`) are reported as
+        ``ok``, flagged ``duplicate``, so partners can retry whole
+        batches safely. '''
+
+    _config_path = 'handlers.tracker.BulkEndpoint'
+
+    _identifiers = ('XAF-Hash', 'id')  # item keys that may carry the hit's own event ID
+
+    def parse(self):
+
+        ''' Parse the request body into items.
+
+            :raises ValueError: If the body is a JSON array
+            that can't be decoded.
+
+            :returns: ``list`` of items, with an ``Exception``
+            in place of any line that couldn't be decoded. '''
+
+        body = self.request.body.strip()
+        if body.startswith('['):
+            return json.loads(body)
+
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
+        return items
+
+    def inflate(self, item):
+
+        ''' Build a hit request for ``item``, so it can be
+            processed exactly like a hit sent on its own. An
+            event ID carried by the item is sent as ``XAF-Hash``.
+
+            :param item: ``dict`` of hit parameters, or a query
+            string (or URL with one).
+
+            :raises TypeError: If ``item`` is of an unknown type.
+
+            :returns: Tuple of ``(request, policy, legacy)``. '''
+
+        if isinstance(item, basestring):
+            params = dict(urlparse.parse_qsl(item.split('?', 1)[-1], keep_blank_values=True))
+        elif isinstance(item, dict):
+            params = dict(((k, v.encode('utf-8') if isinstance(v, unicode) else v) for k, v in item.iteritems()))
+        else:
+            raise TypeError('Bulk hits must be a `dict` of parameters or a query string. Got: "%s".' % item)
+
+        headers = {}
+        for identifier in self._identifiers:
+            value = params.pop(identifier, None)
+            if value and 'XAF-Hash' not in headers:
+                headers['XAF-Hash'] = str(value)
+
+        legacy = 'ref' in params and 'ix' not in params
+        request = webapp2.Request.blank('%s?%s' % (
+            '/__legacy' if legacy else '/__tracker', urllib.urlencode(params)), headers=headers)
+        return request, (self.resolve(params['ref']) if legacy else base.EventProfile), legacy
+
+    def entrypoint(self, explicit=False):
+
+        ''' HTTP POST
+            :returns: Per-item status for a batch of hits. '''
+
+        _bulk = self.tracker.config.get('bulk', {})
+        self.response.headers['Content-Type'] = 'application/json'
+
+        try:
+            items = self.parse()
+        except ValueError as e:
+            self.response.set_status(400)
+            return self.response.write(json.dumps({'error': 'Invalid JSON body: %s' % str(e)}))
+
+        if len(items) > _bulk.get('max_items', 5000):
+            self.response.set_status(413)
+            return self.response.write(json.dumps({'error': 'Too many items in batch: %s (limit is %s).' % (
+                len(items), _bulk.get('max_items', 5000))}))
+
+        engine, chunk, results = self.tracker.engine, _bulk.get('chunk', 200), []
+        for offset in xrange(0, len(items), chunk):
+
+            pipe, queued = engine.pipeline(), []
+            for index, item in enumerate(items[offset:offset + chunk], offset):
+                mark, request = engine.mark(pipe), None
+
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+
+                    request, policy, legacy = self.inflate(item)
+                    raw, tracker, event, pipe = self.tracker.policy.enforce(request, policy, legacy=legacy, pipeline=pipe)
+                    if pipe is not None:
+                        evkey, pipe = engine.persist(event, pipeline=pipe)
+                        pipe = self.tracker.stream.publish(evkey, execute=False, pipeline=pipe, propagate=True)
+                    else:
+                        self.tracker.stream.publish(engine.persist(event), propagate=True)
+
+                except exceptions.DuplicateHit:
+
+                    # already recorded within the dedup window: write nothing for it
+                    engine.rollback(pipe, mark)
+                    results.append({'index': index, 'status': 'ok', 'duplicate': True})
+
+                except Exception as e:
+
+                    # drop this item's queued writes, but keep the rest of the chunk
+                    engine.rollback(pipe, mark)
+                    if request is not None:
+                        self.tracker.event.forget(request)
+                    results.append({'index': index, 'status': 'error', 'code': e.__class__.__name__, 'message': str(e)})
+
+                else:
+                    queued.append((len(results), request))
+                    results.append({'index': index, 'status': 'ok', 'id': raw.key.id})
+
+            # flush the whole chunk in one round-trip
+            if pipe is not None and queued:
+                try:
+                    engine.execute(pipe)
+                except Exception as e:
+                    context = (e.__class__.__name__, str(e))
+                    self.logging.error('Failed to flush bulk chunk: %s("%s").' % context)
+                    for position, request in queued:
+                        self.tracker.event.forget(request)
+                        results[position].update({'status': 'error', 'code': context[0], 'message': context[1]})
+
+        failed = len([result for result in results if result['status'] != 'ok'])
+        return self.response.write(json.dumps({
+            'count': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results
+        }))
+
+    get = None  # batches are only accepted in a request body
+    post = put = entrypoint
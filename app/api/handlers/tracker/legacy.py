@@ -46,6 +46,11 @@ class LegacyEndpoint(TrackerEndpoint):
             :raises InvalidTracker: In the case of an unknown ``ref``.
             :returns: Matched profile for the given ``ref``. '''
 
+        # match against the legacy "ref" index, built at import time
+        profile = core.Profile.refcodes.get(core.Profile.normalize_refcode(ref))
+        if profile is not None:
+            return profile
+
         # force-fail number-like stuff
         for i in (float, int):
             try:
@@ -55,22 +60,6 @@ class LegacyEndpoint(TrackerEndpoint):
             else:
                 raise exceptions.InvalidRefcode('Received number-like object as `ref`: "%s".' % str(ref))
 
-        # otherwise, match against legacy "ref" names
-        for id, profile in core.Profile.registry.iteritems():
-
-            if hasattr(profile, 'refcode'):
-
-                if isinstance(profile.refcode, (frozenset, set, tuple, list)):
-                    # make absolutely sure basestrings don't make it through...
-                    # because then our `in` check would be a substring search
-                    if ref.lower().strip() in profile.refcode:
-                        return profile
-                    continue
-
-                # if the refcode matches, it's what we wanted
-                if ref.lower().strip() == profile.refcode.lower().strip():
-                    return profile
-
         raise exceptions.UnknownRefcode('Failed to resolve tracker by refcode: "%s".' % ref)
 
     def entrypoint(self, explicit=False):
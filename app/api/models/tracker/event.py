@@ -45,6 +45,9 @@ class TrackedEvent(TrackerModel):
         :param attributions: Lists *attribution groups* that this :py:class:`TrackedEvent` was linked to.
         Aggregation groups listed in this area have already linked and considered this :py:class:`TrackedEvent`.
 
+        :param multiplier: Sampling multiplier (``int``) for this :py:class:`TrackedEvent`. Sampled-in
+        hits stand for this many hits, and their aggregation increments are scaled by it.
+
         :param modified: Timestamp ``datetime`` of the last time this :py:class:`TrackedEvent` was modified.
 
         :param created: Timestamp ``datetime`` of when this :py:class:`TrackedEvent` was recorded. '''
@@ -57,6 +60,7 @@ class TrackedEvent(TrackerModel):
     error = bool, {'required': False, 'indexed': True}  # error flag: flipped to ``True`` if an error was detected
     tracker = basestring, {'required': False, 'indexed': True}  # provisioned tracker that this event came through
     profile = basestring, {'required': True, 'indexed': True}  # policy used to process this event
+    multiplier = int, {'required': False, 'indexed': False, 'default': 1}  # sampling multiplier for aggregations
 
     ## == Messages == ##
     errors = basestring, {'repeated': True, 'indexed': False}  # error messages encountered processing this event
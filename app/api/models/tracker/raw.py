@@ -11,8 +11,6 @@ into full `TrackedEvent` entities.
 '''
 
 # stdlib
-import uuid
-import hashlib
 import datetime
 
 # 3rd party
@@ -22,6 +20,9 @@ import webob
 from apptools import model
 from api.models import TrackerModel
 
+# event IDs
+from util import eventid
+
 
 ## Globals / Constants
 _HASH_HEADER = 'XAF-Hash'
@@ -51,6 +52,9 @@ class Event(TrackerModel):
     legacy = bool, {'indexed': True, 'default': False}  # flag indicating this is a legacy tracker hit
     processed = bool, {'indexed': False, 'default': False}  # whether this `RawEvent` has been processed yet
 
+    # == Sampling == #
+    multiplier = int, {'indexed': False, 'default': 1}  # sampling multiplier: this hit stands for this many hits
+
     @classmethod
     def inflate(cls, data, policy=None, legacy=False, timestamp=None):
 
@@ -87,7 +91,7 @@ class Event(TrackerModel):
 
             # resolve unique event ID
             eid = data.headers.get(_HASH_HEADER, data.headers.get(_RQID_HEADER))
-            if not eid: eid = hashlib.sha256(str(uuid.uuid4())).hexdigest()
+            if not eid: eid = eventid.generate(timestamp)
 
             url, method = data.url, data.method  # full HTTP request URL & method
 
@@ -96,8 +100,8 @@ class Event(TrackerModel):
 
         elif isinstance(data, dict):
 
-            # resolve unique event ID (generate a random one via ``uuid4`` if we can't find a good one)
-            eid = data.get('id', hashlib.sha256(str(uuid.uuid4())).hexdigest())
+            # resolve unique event ID (generate a time-ordered one if we can't find a good one)
+            eid = data.get('id') or eventid.generate(timestamp)
             url = data.get('url', None)  # try to grab URL
             method = data.get('method', None)  # try to grab method
             cookie = data.get('fingerprint', data.get('cookie', None))  # try to grab cookie
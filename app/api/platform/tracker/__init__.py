@@ -18,6 +18,7 @@ from protorpc import messages
 
 # Protocol Suite
 from protocol import timedelta
+from protocol import timewindow
 
 # Platform Parent
 from api.platform import Platform
@@ -29,11 +30,28 @@ from apptools.util import decorators
 # Tracker Models
 from api.models.tracker import endpoint
 
+# Utilities
+from util import eventid
+
 # Platform Bridges
 from api.platform.tracker import event
 from api.platform.tracker import stream
+from api.platform.tracker import codec
 from api.platform.tracker import engine
+from api.platform.tracker import buffer
+from api.platform.tracker import rollup
 from api.platform.tracker import policy
+from api.platform.tracker import planner
+from api.platform.tracker import cache
+from api.platform.tracker import queue
+from api.platform.tracker import spool
+from api.platform.tracker import admission
+
+# detect gevent support
+try:
+    from gevent import pool; _GEVENT = True
+except ImportError:
+    _GEVENT = False
 
 
 ## Tracker - version one of the `EventTracker` platform
@@ -45,6 +63,9 @@ class Tracker(Platform):
     vesion = (0, 1)
     _config_path = 'platform.tracker.Tracker'
 
+    # Deferred Work
+    deferred = None  # bounded pool of greenlets running deferred hit processing
+
     def initialize(self):
 
         ''' Initialize the ``Tracker`` platform, and attach
@@ -56,7 +77,24 @@ class Tracker(Platform):
         self.event = event.EventBuilder(self)  # event inflator/intake
         self.stream = stream.EventStream(self)  # eventstream pubsub tools
         self.engine = engine.EventEngine(self)  # low-level IO engine
+        self.codec = codec.KeyCodec(self)  # compact bucket names
+        self.buffer = buffer.CounterBuffer(self)  # coalescing counter buffer
+        self.rollup = rollup.RollupEngine(self)  # aggregation window rollups
         self.policy = policy.PolicyEngine(self)  # policy enforcement engine
+        self.planner = planner.QueryPlanner(self)  # indexed query planner
+        self.cache = cache.ResultCache(self)  # aggregation result cache
+        self.queue = queue.WorkQueue(self)  # split ingestion work queue
+        self.spool = spool.Spool(self)  # circuit breaker and outage journal
+        self.admission = admission.AdmissionController(self)  # priority-aware load shedding
+
+        # lease event ID worker IDs, unless one is configured
+        if self.engine._REDIS_ENABLED:
+            eventid.register(self.engine.lease)
+
+        # bounded pool for response-first dispatch
+        _deferred = self.config.get('deferred', {})
+        if _GEVENT and _deferred.get('enabled', False):
+            self.deferred = pool.Pool(_deferred.get('max_inflight', 500))
 
         return self
 
@@ -110,89 +148,85 @@ class Tracker(Platform):
         return inject_tracker
 
     ## == Utilities == ##
-    def resolve_timewindow(self, window, delta, scope=None):
+    def resolve_timewindow(self, window, delta, scope=None, epoch=False):
 
-        ''' Resolves a timewindow. '''
+        ''' Resolves a timewindow.
 
-        if not isinstance(window, int):
-            window = int(window)
+            :param window: Interval (enumerated at :py:class:`timedelta.TimeWindow`)
+            of the bucket, as an ``int`` or string.
 
-        # decode window: special cases first
+            :param delta: Window identifier of the bucket.
 
-        # day-level window
-        if window is timedelta.TimeWindow.ONE_DAY:
-            _day_ts = int(int(delta) * 1e2)
-            delta_begin = datetime.datetime.fromtimestamp(_day_ts)
-            delta_end = delta_begin + datetime.timedelta(days=1)
+            :param scope: Optional ``WindowScope`` enum to express the
+            resulting identifier with.
 
-            if scope:
-                identifier = (scope.DAY, 1)
+            :param epoch: Flag (``bool``) to return bounds as local epoch
+            timestamps instead of ``datetime`` objects. Defaults to ``False``.
 
-        # year-level window
-        elif window is timedelta.TimeWindow.YEAR:
-            _year_ts = int(delta)
-            delta_begin = datetime.datetime(year=_year_ts, month=1, day=1)
-            delta_end = delta_begin + datetime.timedelta(days=365)
+            :raises ValueError: If ``window`` or ``delta`` is invalid.
 
-            if scope:
-                identifier = (scope.YEAR, 1)
+            :returns: Tupled ``(identifier, (begin, end))``. '''
 
-        # global window
-        elif window is timedelta.TimeWindow.FOREVER:
-            delta_begin, delta_end = None, None
-
-            if scope:
-                identifier = (scope.FOREVER, 1)
-
-        # hour-level window
-        elif timedelta.TimeWindow.ONE_DAY < window < timedelta.TimeWindow.ONE_WEEK:
-
-            _hour_ts = (window - (timedelta.TimeWindow.ONE_HOUR - 1))
-            delta_begin = datetime.datetime.fromtimestamp(int(int(delta) * 1e2))
-            delta_end = delta_begin + datetime.timedelta(hours=_hour_ts)
+        if not isinstance(window, int):
+            window = int(window)
 
-            if scope:
-                identifier = (scope.HOUR, _hour_ts)
+        try:
+            delta_begin, delta_end = timewindow.bounds(window, delta)
+        except ValueError:
+            raise ValueError('Invalid window `%s` provided to `resolve_timewindow`.' % window)
 
-        # week-level window
-        elif timedelta.TimeWindow.SIX_HOURS < window < timedelta.TimeWindow.MONTH:
+        if not scope:
+            identifier = window
+        else:
+            granularity, span = timewindow.resolve(window)
+            identifier = ({
+                timewindow.HOUR: scope.HOUR,
+                timewindow.DAY: scope.DAY,
+                timewindow.WEEK: scope.WEEK,
+                timewindow.MONTH: scope.MONTH,
+                timewindow.YEAR: scope.YEAR,
+                timewindow.FOREVER: scope.FOREVER
+            }[granularity], span)
+
+        if not epoch and delta_begin is not None:
+            delta_begin, delta_end = (datetime.datetime.fromtimestamp(delta_begin),
+                                      datetime.datetime.fromtimestamp(delta_end))
 
-            _week_ts = window - (timedelta.TimeWindow.ONE_WEEK - 1)
-            split = delta.split(self.engine._chunk_separator)
-            year, week = int(split[0]), int(split[1])
+        return identifier, (delta_begin, delta_end)
 
-            delta_begin = datetime.datetime.strptime("%04d-%02d-1" % (year, week), "%Y-%W-%w")
-            delta_end = delta_begin + (datetime.timedelta(days=(7 * _week_ts)))
+    ## == Tracker Internals == ##
+    def defer(self, func, *args, **kwargs):
 
-            if scope:
-                identifier = (scope.WEEK, _week_ts)
+        ''' Schedule hit processing to run after the response
+            has been written, if response-first dispatch is
+            enabled via the ``deferred`` config block.
 
-        # month-level window
-        elif timedelta.TimeWindow.SIX_WEEKS < window < timedelta.TimeWindow.YEAR:
+            Work is spawned into a bounded pool of greenlets,
+            sized by ``max_inflight``.
 
-            split = delta.split(self.engine._chunk_separator)
-            year, month = int(split[0]), int(split[1])
+            :param func: Callable that processes the hit.
 
-            delta_begin = datetime.datetime(year=year, month=month, day=1)
+            :param *args: Positional arguments for ``func``.
 
-            month_delta = (window - (timedelta.TimeWindow.MONTH - 1))
-            if month + month_delta > 12:
-                delta_end = datetime.datetime(year=(year + 1), month=((month + month_delta) - 12))
-            else:
-                delta_end = datetime.datetime(year=year, month=(month + month_delta))
+            :param **kwargs: Keyword arguments for ``func``.
 
-            if scope:
-                identifier = (scope.MONTH, month_delta)
+            :returns: ``True`` if the work was deferred, ``False``
+            if it must be run inline (deferral is disabled or the
+            pool is at its ``max_inflight`` bound). '''
 
-        else:
-            raise ValueError('Invalid window `%s` provided to `resolve_timewindow`.' % window)
+        _deferred = self.config.get('deferred', {})
+        if not _deferred.get('enabled', False):
+            return False
 
-        if not scope:
-            identifier = window
+        if self.deferred is None or self.deferred.full():
+            if self.deferred is not None:
+                self.logging.warning('Deferred hit processing is at capacity (%s in-flight). Processing '
+                                     'inline.' % len(self.deferred))
+            return False
 
-        return identifier, (delta_begin, delta_end)
+        self.deferred.spawn(func, *args, **kwargs)
+        return True
 
-    ## == Tracker Internals == ##
     def resolve(self, raw, base_policy=None, legacy=False):
 
         ''' Resolves a ``model.Tracker`` for a given
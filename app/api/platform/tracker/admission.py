@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`AdmissionController` class sheds load under
+overload, degrading lower-priority hits first, so that a flood
+of impressions never slows down conversions. It also samples
+high-volume hits (like impressions) at configured rates.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import random
+
+# Protocol
+from protocol import event
+from protocol import builtin
+from protocol import parameter
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+
+# Globals
+FULL = 0x0  # admit: enforce and aggregate
+PARTIAL = 0x1  # degrade: enforce, but skip aggregations
+RAW = 0x2  # degrade: record the raw event only
+DROP = 0x3  # shed: sampled out, not recorded at all
+
+
+## AdmissionController - priority-aware load shedding in front of enforcement.
+class AdmissionController(PlatformBridge):
+
+    ''' Decides how much work each hit gets, ahead of policy
+        enforcement. Load is measured as the larger of in-flight
+        hits in this worker (against ``depth``) and the smoothed
+        pipeline round-trip time reported by
+        :py:meth:`EventEngine.execute` (against ``latency``), such
+        that ``1.0`` is full load.
+
+        Each hit is ranked by :py:class:`protocol.event.EventTypePriority`
+        for its event type. Under overload, lower priorities are
+        degraded first, at the loads listed for them in ``shed``:
+        first aggregations are skipped, then only the raw event is
+        recorded, then hits are sampled (keeping ``sample`` of them,
+        raw only). Hits carrying every ``PREFERRED`` parameter in
+        their profile are ranked one step higher, short of
+        conversions. Conversions are never degraded.
+
+        Independently of load, hits may also be sampled at a fixed
+        rate per profile or event type (see :py:meth:`sample`), with
+        aggregations for sampled-in hits scaled to compensate. '''
+
+    _config_path = 'tracker.admission.AdmissionController'
+
+    _inflight = 0  # hits admitted and not yet released
+    _latency = 0.0  # smoothed pipeline round-trip time, in seconds
+    _shedding = False  # whether hits were being degraded, for logging transitions
+    _profiles = None  # profile => (type identifier, fixed type, preferred identifiers)
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`AdmissionController`.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(AdmissionController, self).__init__(bus)
+        self._profiles = {}
+
+    ## === Internal Methods === ##
+    def _profile(self, policy):
+
+        ''' Resolve (and cache) the parameters of ``policy``
+            that admission depends on, from its match plan.
+
+            :returns: Tuple of ``(identifier, value, preferred)``,
+            where ``identifier`` is the request parameter holding
+            the event type, ``value`` is the type fixed by the
+            profile (if any), and ``preferred`` is a ``tuple`` of
+            identifiers for ``PREFERRED`` parameters. '''
+
+        if policy not in self._profiles:
+            identifier, value, preferred = builtin.TrackerProtocol.TYPE, None, []
+            for name, (prm, converter) in policy.plan.http[0].iteritems():
+                if prm.config.get('name') == builtin.TrackerProtocol.TYPE:
+                    identifier, value = name, prm.basevalue
+                elif prm.config.get('policy') == parameter.ParameterPolicy.PREFERRED:
+                    preferred.append(name)
+            self._profiles[policy] = (identifier, value, tuple(preferred))
+        return self._profiles[policy]
+
+    def _type(self, request, policy, legacy=False):
+
+        ''' Resolve the :py:class:`EventType` name of a hit:
+            fixed by its profile, or carried by the request.
+            Legacy hits are always conversions, and unknown
+            types are considered impressions.
+
+            :returns: ``str`` name, like ``IMPRESSION``. '''
+
+        if legacy:
+            return 'CONVERSION'
+
+        identifier, value, preferred = self._profile(policy)
+        try:
+            return event.EventType.reverse_resolve(value or request.params.get(identifier))
+        except KeyError:
+            return 'IMPRESSION'  # unknown types rank lowest
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether admission control is enabled.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    @property
+    def load(self):
+
+        ''' Current load on this worker, where ``1.0`` is full.
+
+            :returns: ``float`` load factor. '''
+
+        return max(float(self._inflight) / self.config.get('depth', 500),
+                   self._latency / self.config.get('latency', 0.05))
+
+    ## === Public Methods === ##
+    def priority(self, request, policy, legacy=False):
+
+        ''' Rank a hit by its event type.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit. Legacy
+            hits are always conversions.
+
+            :returns: Value from :py:class:`EventTypePriority`. '''
+
+        rank = getattr(event.EventTypePriority, self._type(request, policy, legacy))
+        preferred = self._profile(policy)[2]
+        if rank > event.EventTypePriority.CUSTOM and preferred and all(i in request.params for i in preferred):
+            rank -= 1  # boost hits that carry every preferred parameter
+        return rank
+
+    def sample(self, request, policy, legacy=False):
+
+        ''' Sample a hit, at the rate configured for its profile
+            (by definition path) or else for its event type, under
+            ``sampling``. A rate of ``N`` records 1 in ``N`` hits,
+            each standing for ``N`` hits. Conversions are never
+            sampled.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit.
+
+            :returns: Multiplier for the hit (``int``), or ``0``
+            if it was sampled out. '''
+
+        name = self._type(request, policy, legacy)
+        if name == 'CONVERSION':
+            return 1
+
+        _sampling = self.config.get('sampling', {})
+        rate = _sampling.get('profiles', {}).get(policy.__definition__)
+        if rate is None:
+            rate = _sampling.get('types', {}).get(name, 1)
+
+        if rate <= 1:
+            return 1
+        return rate if random.random() * rate < 1 else 0
+
+    def admit(self, request, policy, legacy=False):
+
+        ''' Decide how much work a hit gets, given current load.
+            Hits that aren't dropped count as in-flight until
+            :py:meth:`release` is called for them.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit.
+
+            :returns: Admission level: ``FULL``, ``PARTIAL``,
+            ``RAW`` or ``DROP``. '''
+
+        level = FULL
+        if self.enabled:
+            rank = self.priority(request, policy, legacy)
+            if rank != event.EventTypePriority.CONVERSION:
+                load = self.load
+                thresholds = self.config.get('shed', {}).get(event.EventTypePriority.reverse_resolve(rank), ())
+                level = len([threshold for threshold in thresholds if load >= threshold])
+
+                if level == DROP and random.random() < self.config.get('sample', 0.1):
+                    level = RAW  # sampled in: record raw only
+
+                if bool(level) != self._shedding:
+                    self._shedding = bool(level)
+                    if level:
+                        self.logging.warning('Overloaded (load %.2f), degrading lower-priority hits.' % load)
+                    else:
+                        self.logging.info('Load recovered (load %.2f), admitting hits in full.' % load)
+
+        if level != DROP:
+            self._inflight += 1
+        return level
+
+    def release(self):
+
+        ''' Mark an admitted hit as done. '''
+
+        self._inflight = max(self._inflight - 1, 0)
+
+    def observe(self, elapsed):
+
+        ''' Record a pipeline round-trip time.
+
+            :param elapsed: Round-trip time, in seconds. '''
+
+        weight = self.config.get('smoothing', 0.2)
+        self._latency = (weight * elapsed) + ((1 - weight) * self._latency)
+
+    def record(self, request, policy, legacy=False, multiplier=1):
+
+        ''' Record only the raw event for a degraded hit, in one
+            round-trip. The raw event is left unprocessed.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit.
+
+            :param multiplier: Sampling multiplier for the hit.
+
+            :returns: Tupled ``(raw, None)``, as there is no
+            tracked event. '''
+
+        raw_ev, pipe = self.bus.event.raw(request, policy=policy, legacy=legacy, pipeline=self.bus.engine.pipeline())
+        raw_ev.multiplier = multiplier
+        if pipe is None:
+            self.bus.engine.persist(raw_ev)
+            return raw_ev, None
+
+        rkey, pipe = self.bus.engine.persist(raw_ev, pipeline=pipe)
+        self.bus.engine.execute(pipe)
+        return raw_ev, None
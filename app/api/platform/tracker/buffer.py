@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`CounterBuffer` class coalesces aggregation counter
+increments in-process, summing deltas for identical buckets and
+flushing them to storage in a single pipeline.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import time
+import atexit
+import threading
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# detect gevent support
+try:
+    import gevent; _GEVENT = True
+except ImportError:
+    _GEVENT = False
+
+
+## CounterBuffer - coalesces counter increments between flushes.
+class CounterBuffer(PlatformBridge):
+
+    ''' Per-worker buffer for aggregation counter increments.
+        Deltas for identical buckets are summed in memory and
+        written with one pipeline when a size or time threshold
+        is reached, and once more at interpreter shutdown.
+
+        At most ``max_deltas`` increments, or ``interval``
+        seconds of increments, are held in memory at any
+        given time - that is the most that can be lost if
+        the worker dies before a flush. After a failed flush,
+        flushes back off (see ``backoff``). While backing off,
+        the buffer is capped at ``max_buckets`` and ``max_deltas``:
+        increments past either are dropped, counted at
+        :py:attr:`dropped`, and logged when flushing recovers. '''
+
+    _config_path = 'tracker.buffer.CounterBuffer'
+
+    pending = None  # bucket => summed delta
+    deltas = 0  # count of increments held in ``pending``
+    dropped = 0  # count of increments dropped while backing off, since startup
+    flushed = None  # timestamp of the last flush
+    _retry = 0  # earliest time to flush again, after a failed flush
+    _backoff = 0  # current delay (in seconds) between failed flushes
+    _lost = 0  # count of increments dropped since the last successful flush
+    _lock = None  # guards swaps of ``pending``
+    _timer = None  # flusher greenlet, if running
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`CounterBuffer`, and
+            register a flush at interpreter shutdown.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(CounterBuffer, self).__init__(bus)
+        self.pending, self.deltas, self.flushed, self._lock = {}, 0, time.time(), threading.Lock()
+        atexit.register(self.flush)
+
+    ## === Internal Methods === ##
+    def _run(self):
+
+        ''' Flush loop, run in a dedicated greenlet while
+            buffering is enabled.
+
+            :returns: Nothing, loops forever. '''
+
+        while True:
+            gevent.sleep(self.interval)
+            if self.pending and time.time() >= self._retry:
+                self.flush()
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether counter buffering is enabled in config.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    @property
+    def interval(self):
+
+        ''' Maximum time (in seconds) between flushes.
+
+            :returns: ``float`` interval, defaulting to ``0.05``. '''
+
+        return self.config.get('interval', 0.05)
+
+    ## === Public Methods === ##
+    def increment(self, bucket, delta=1):
+
+        ''' Buffer an increment of ``delta`` against the counter
+            at ``bucket``, flushing if a threshold is reached.
+
+            :param bucket: Name (``str``) of the counter bucket.
+
+            :param delta: Value (``int`` or ``float``) to add to
+            the running total of the target counter.
+
+            :raises TypeError: In the case of a ``delta`` that is
+            not an ``int`` or ``float``.
+
+            :raises ValueError: In the case of a negative ``delta``.
+
+            :returns: ``self``, for chainability (whether or not the
+            increment was dropped while backing off). '''
+
+        # validate up front, so a bad delta can't poison a flush
+        if not isinstance(delta, (float, int)):
+            raise TypeError('`delta` value for buffered counter increment on '
+                            'bucket "%s" must be an integer or float, got %s.' % (bucket, type(delta)))
+        if delta < 0:
+            raise ValueError('`delta` value for buffered counter increment must '
+                             'not be negative. Got: "%s".' % delta)
+
+        max_buckets, max_deltas = self.config.get('max_buckets', 1000), self.config.get('max_deltas', 5000)
+
+        with self._lock:
+
+            # while backing off, hold no more than the configured limits
+            if time.time() < self._retry and (self.deltas >= max_deltas or (
+                    bucket not in self.pending and len(self.pending) >= max_buckets)):
+                if not self._lost:
+                    self.logging.warning('Counter buffer is full while flushes back off. Dropping increments.')
+                self._lost += 1
+                self.dropped += 1
+                return self
+
+            self.pending[bucket] = self.pending.get(bucket, 0) + delta
+            self.deltas += 1
+            size, deltas = len(self.pending), self.deltas
+
+        # lazily start the flusher greenlet
+        if _GEVENT and self._timer is None:
+            self._timer = gevent.spawn(self._run)
+
+        if time.time() >= self._retry and (size >= max_buckets or deltas >= max_deltas or (
+                not _GEVENT and (time.time() - self.flushed) >= self.interval)):
+            self.flush()
+        return self
+
+    def flush(self):
+
+        ''' Write all buffered deltas with a single pipeline.
+            Deltas that fail to write are merged back into the
+            buffer, to be retried on the next flush, and flushes
+            back off exponentially until one succeeds.
+
+            :returns: Count of buckets written. '''
+
+        with self._lock:
+            pending, held, self.pending, self.deltas, self.flushed = self.pending, self.deltas, {}, 0, time.time()
+
+        if not pending:
+            return 0
+
+        try:
+            pipe = self.bus.engine.pipeline()
+            if self.bus.engine.config.get('scripting', {}).get('enabled', False):
+                pipe = self.bus.engine.increment_multi(pending.iteritems(), pipe)
+            else:
+                for bucket, delta in pending.iteritems():
+                    pipe = self.bus.engine.increment(bucket, delta, pipe)
+            if pipe:
+                self.bus.engine.execute(pipe)
+
+        except Exception as e:
+            _backoff = self.config.get('backoff', {})
+            self._backoff = min(max(self._backoff * 2, _backoff.get('initial', 0.1)), _backoff.get('max', 5.0))
+            self._retry = time.time() + self._backoff
+
+            context = (len(pending), e.__class__.__name__, str(e), self._backoff)
+            self.logging.error('Failed to flush %s buffered counter buckets: %s("%s"). Retrying in %.2fs.' % context)
+
+            with self._lock:
+                for bucket, delta in pending.iteritems():
+                    self.pending[bucket] = self.pending.get(bucket, 0) + delta
+                self.deltas += held
+            return 0
+
+        if self._lost:
+            self.logging.error('Dropped %s counter increments while flushes backed off.' % self._lost)
+        self._backoff, self._retry, self._lost = 0, 0, 0
+        return len(pending)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`ResultCache` class keeps aggregation values
+read by the Event Data API, so that closed time windows are
+read (and described) only once per worker.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import time
+import collections
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+
+## ResultCache - read-through cache for aggregation query results.
+class ResultCache(PlatformBridge):
+
+    ''' Read-through cache for aggregation buckets, keyed by
+        bucket name. Once a bucket's window has closed (plus a
+        ``grace`` period, for late hits and pending rollups) its
+        value can't change, so it's kept until evicted. Open
+        windows are kept for ``ttl`` seconds. Entries are evicted
+        least-recently-used first, past ``size`` entries.
+
+        Each entry also holds the bucket's description, as built
+        by the caller, so bucket names are parsed once per worker
+        even while their window is open.
+
+        Disabled by default: closed windows can still change after
+        ``grace`` when writes land late, as when the :py:class:`Spool`
+        replays a journal, the :py:class:`WorkQueue` lags, the
+        :py:class:`CounterBuffer` backs off, or the :py:class:`RollupEngine`
+        falls behind. A cached closed window would then stay stale until
+        evicted. Only enable it where ``grace`` covers the worst of those
+        delays, or where :py:meth:`clear` is called after them. '''
+
+    _config_path = 'tracker.cache.ResultCache'
+
+    _entries = None  # bucket => (description, end, value, expires, modified), least-recently-used first
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`ResultCache`.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(ResultCache, self).__init__(bus)
+        self._entries = collections.OrderedDict()
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether results are cached.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    ## === Public Methods === ##
+    def read(self, buckets, describe):
+
+        ''' Read the values of ``buckets``, from cache where
+            possible, and from :py:meth:`EventEngine.get_counters`
+            (in one batch) otherwise.
+
+            :param buckets: Iterable of aggregation bucket names.
+
+            :param describe: Callable that describes a bucket for
+            the caller, returning a ``(description, end)`` pair,
+            where ``end`` is the end of the bucket's window in epoch
+            seconds (``None`` if it never closes).
+
+            :returns: ``list`` of ``(description, value, modified)``
+            tuples, in input order, where ``modified`` is the epoch
+            time the value was last known to change: the end of its
+            window if closed, or the time it was read otherwise. '''
+
+        now, enabled, entries = time.time(), self.enabled, self._entries
+        buckets, results, missing = list(buckets), {}, []
+
+        for bucket in buckets:
+            entry = entries.get(bucket) if enabled else None
+            if entry is not None and (entry[3] is None or entry[3] > now):
+                entries[bucket] = entries.pop(bucket)  # mark as recently used
+                results[bucket] = entry
+                continue
+
+            # unknown or expired: re-read the value, reusing the description if we have it
+            missing.append((bucket,) + (entry[:2] if entry is not None else describe(bucket)))
+
+        if missing:
+            grace, ttl = self.config.get('grace', 300), self.config.get('ttl', 5)
+            values = self.bus.engine.get_counters([bucket for bucket, description, end in missing])
+
+            for (bucket, description, end), value in zip(missing, values):
+                if end is not None and end + grace <= now:
+                    entry = (description, end, value, None, end)  # closed: final until evicted
+                else:
+                    entry = (description, end, value, now + ttl, now)
+
+                results[bucket] = entry
+                if enabled:
+                    entries.pop(bucket, None)
+                    entries[bucket] = entry
+
+            # evict least-recently-used entries past ``size``
+            if enabled:
+                size = self.config.get('size', 100000)
+                while len(entries) > size:
+                    entries.popitem(last=False)
+
+        return [(results[bucket][0], results[bucket][2], results[bucket][4]) for bucket in buckets]
+
+    def clear(self):
+
+        ''' Drop every cached result held by this worker.
+
+            :returns: Count of entries dropped. '''
+
+        count = len(self._entries)
+        self._entries.clear()
+        return count
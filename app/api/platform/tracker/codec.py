@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`KeyCodec` class encodes aggregation bucket
+names into a compact form, and decodes them back.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import base64
+import string
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# Protocol
+from protocol import special
+from protocol import timedelta
+from protocol import timewindow
+
+
+# Globals
+_B36 = string.digits + string.ascii_lowercase  # alphabet for small integer IDs
+
+
+def _b36(number):
+
+    ''' Encode a non-negative ``int`` in base 36. '''
+
+    digits = []
+    while True:
+        number, digit = divmod(number, 36)
+        digits.append(_B36[digit])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def _varint(number):
+
+    ''' Encode a non-negative ``int`` as an LEB128 varint. '''
+
+    out = []
+    while number > 0x7f:
+        out.append(chr((number & 0x7f) | 0x80))
+        number >>= 7
+    out.append(chr(number))
+    return ''.join(out)
+
+
+def _unvarint(data, offset):
+
+    ''' Decode an LEB128 varint from ``data`` at ``offset``.
+
+        :returns: Tuple of ``(number, next offset)``. '''
+
+    number, shift = 0, 0
+    while True:
+        byte = ord(data[offset])
+        number |= (byte & 0x7f) << shift
+        offset += 1
+        if not byte & 0x80:
+            return number, offset
+        shift += 7
+
+
+## KeyCodec - compact encoding for aggregation bucket names.
+class KeyCodec(PlatformBridge):
+
+    ''' Encodes aggregation bucket names like
+        ``__aggregation__::Base.tracker::<b64>::Base.type::<b64>::3::<window>``
+        into three short chunks::
+
+            ~<prefix id>::<path id>::<packed>
+
+        Prefixes and ``group.name`` paths are dictionary-encoded into
+        small integer IDs (base 36), kept in a registry hash shared by
+        all workers. ``<packed>`` is URL-safe base64 (unpadded) of a
+        byte string holding the interval (one byte) and the window
+        (as a varint), followed by the remaining paths (as IDs) and
+        raw values.
+
+        The first two chunks form the hash key in hash mode, so each
+        dimension still lives in one small hash. Names that aren't
+        encoded pass through :py:meth:`decode` untouched, so encoded
+        and plain buckets can coexist. '''
+
+    _config_path = 'tracker.codec.KeyCodec'
+
+    _registry_key = '__codec:registry__'  # name => ID, ``#<ID>`` => name, and the ID sequence
+    _sequence_field = '__sequence__'  # registry field holding the last-allocated ID
+    _marker = '~'  # leading character of encoded bucket names
+
+    _ids = {}  # name => ID (per-worker)
+    _names = {}  # ID => name (per-worker)
+    _encoded = {}  # bucket => encoded name (per-worker, bounded)
+    _decoded = {}  # encoded name => bucket (per-worker, bounded)
+
+    ## === Internal Methods === ##
+    def _channel(self):
+
+        ''' Acquire a low-level Redis channel for registry access. '''
+
+        return self.bus.engine.Datastore.redis.channel(None)
+
+    def _id(self, name):
+
+        ''' Resolve the registry ID for ``name``, allocating
+            one if this is the first time it has been seen.
+
+            :param name: Prefix or property path (``str``).
+
+            :returns: Registry ID (``int``). '''
+
+        if name not in self._ids:
+            channel = self._channel()
+            identifier = channel.hget(self._registry_key, name)
+
+            if identifier is None:
+                candidate = channel.hincrby(self._registry_key, self._sequence_field, 1)
+                channel.hset(self._registry_key, '#%s' % candidate, name)
+                if not channel.hsetnx(self._registry_key, name, candidate):
+                    identifier = channel.hget(self._registry_key, name)  # lost a race, use the winner
+                else:
+                    identifier = candidate
+
+            self._ids[name], self._names[int(identifier)] = int(identifier), name
+        return self._ids[name]
+
+    def _name(self, identifier):
+
+        ''' Resolve the name registered at ``identifier``.
+
+            :param identifier: Registry ID (``int``).
+
+            :raises KeyError: If ``identifier`` is not registered.
+
+            :returns: Prefix or property path (``str``). '''
+
+        if identifier not in self._names:
+            name = self._channel().hget(self._registry_key, '#%s' % identifier)
+            if name is None:
+                raise KeyError('Unknown codec registry ID %s.' % identifier)
+            self._names[identifier], self._ids[name] = name, identifier
+        return self._names[identifier]
+
+    def _remember(self, cache, key, value):
+
+        ''' Store ``value`` in a bounded ``cache``. '''
+
+        if len(cache) >= self.config.get('cache', 65536):
+            cache.clear()
+        cache[key] = value
+        return value
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether new bucket names are encoded.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    ## === Public Methods === ##
+    def encode(self, bucket):
+
+        ''' Encode ``bucket`` into its compact form, if the
+            codec is enabled.
+
+            :param bucket: Plain bucket name (``str``).
+
+            :returns: Encoded bucket name, or ``bucket`` if the
+            codec is disabled. '''
+
+        if not self.enabled:
+            return bucket
+
+        if bucket in self._encoded:
+            return self._encoded[bucket]
+
+        chunks = bucket.split(special.Separators.HASH_CHUNK)
+        interval, window = int(chunks[-2]), chunks[-1]
+
+        # remaining paths and values: paths always contain a ``.``, base64 values never do
+        packed = []
+        for chunk in chunks[2:-2]:
+            if special.Separators.PATH in chunk:
+                packed.append(_varint(self._id(chunk) << 1))
+            else:
+                value = base64.b64decode(chunk)
+                packed.append(_varint((len(value) << 1) | 1) + value)
+
+        granularity = timewindow.resolve(interval)[0]
+        if granularity is timewindow.FOREVER:
+            window = 0
+        elif granularity in (timewindow.WEEK, timewindow.MONTH):
+            year, period = window.split(special.Separators.HASH_KEY_VALUE)
+            window = int(year) * 100 + int(period)
+        else:
+            window = int(window)
+
+        packed.insert(0, chr(interval) + _varint(window))
+        return self._remember(self._encoded, bucket, special.Separators.HASH_CHUNK.join((
+            self._marker + _b36(self._id(chunks[0])),
+            _b36(self._id(chunks[1])),
+            base64.urlsafe_b64encode(''.join(packed)).rstrip('='))))
+
+    def decode(self, key):
+
+        ''' Decode an encoded bucket name back to its plain form.
+
+            :param key: Bucket name, encoded or not.
+
+            :raises KeyError: If ``key`` references an unknown
+            registry ID.
+
+            :returns: Plain bucket name (``str``). '''
+
+        if not key.startswith(self._marker):
+            return key
+
+        if key in self._decoded:
+            return self._decoded[key]
+
+        prefix, path, packed = key.split(special.Separators.HASH_CHUNK)
+        packed = base64.urlsafe_b64decode(packed + '=' * (-len(packed) % 4))
+        chunks = [self._name(int(prefix[1:], 36)), self._name(int(path, 36))]
+
+        interval = ord(packed[0])
+        window, offset = _unvarint(packed, 1)
+
+        while offset < len(packed):
+            token, after = _unvarint(packed, offset)
+            if token & 1:
+                length = token >> 1
+                chunks.append(base64.b64encode(packed[after:after + length]))
+                offset = after + length
+            else:
+                chunks.append(self._name(token >> 1))
+                offset = after
+
+        granularity = timewindow.resolve(interval)[0]
+        if granularity is timewindow.FOREVER:
+            window = timedelta._GLOBAL_WINDOW_POSTFIX
+        elif granularity in (timewindow.WEEK, timewindow.MONTH):
+            window = special.Separators.HASH_KEY_VALUE.join(map(unicode, divmod(window, 100)))
+        else:
+            window = str(window)
+
+        chunks += [str(interval), window]
+        return self._remember(self._decoded, key, special.Separators.HASH_CHUNK.join(chunks))
@@ -10,13 +10,21 @@ underlying storage mechanisms.
           embedded licenses and other legalese, see `LICENSE.md`.
 '''
 
-# apptools util
+# stdlib
+import os
+import time
+import base64
+import random
+import socket
 import logging
+import datetime
+import collections
 
 # Platform Parent
 from api.platform import PlatformBridge
 
-# apptools util
+# apptools
+from apptools import model
 from apptools.util import datastructures
 
 # Model Adapters
@@ -25,7 +33,7 @@ from apptools.model.adapter import inmemory
 
 # detect redis support
 try:
-    from redis import client; _REDIS = True
+    from redis import client, exceptions; _REDIS = True
 except ImportError:
     _REDIS = False
     logging.warning('Redis not found. Tracker engine falling back to `InMemory` storage - pubsub will be unavailable.')
@@ -34,6 +42,87 @@ except ImportError:
 # Globals
 _connection = None
 
+# Lua: applies increments to the keys in ``KEYS``, starting at index ``start``, with a matching
+# `<field>, <delta>` pair in ``ARGV`` for each (from index ``offset``). Keys and fields are resolved
+# by ``EventEngine._locate`` - an empty field means a top-level counter.
+_INCREMENT_LOOP = """
+for i = start, #KEYS do
+    local key, field, delta = KEYS[i], ARGV[offset + ((i - start) * 2)], ARGV[offset + ((i - start) * 2) + 1]
+    local float = string.find(delta, '[%.eE]') ~= nil
+    if field ~= '' then
+        if float then
+            redis.call('HINCRBYFLOAT', key, field, delta)
+        else
+            redis.call('HINCRBY', key, field, delta)
+        end
+    elseif float then
+        redis.call('INCRBYFLOAT', key, delta)
+    else
+        redis.call('INCRBY', key, delta)
+    end
+end
+return #KEYS - start + 1
+"""
+
+# Lua: applies a full set of counter increments in one call.
+# KEYS: counter keys. ARGV: `<field>, <delta>` pairs, one per key.
+_AGGREGATE_SCRIPT = "local start, offset = 1, 1" + _INCREMENT_LOOP
+
+# Lua: applies increments only if ``member`` is still in sorted set ``key`` (removing it), exactly once.
+# KEYS: guard key, then counter keys. ARGV: guard member, then `<field>, <delta>` pairs, one per counter key.
+_GUARDED_SCRIPT = """
+local start, offset = 2, 2
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+""" + _INCREMENT_LOOP
+
+# Lua: rolls one pending grain window up into its coarse buckets, exactly once per registration. Only
+# the amount not yet rolled up is applied, so windows written to after a rollup can be rolled up again.
+# KEYS: pending key, rolled key, source keys, target keys, then one pending set key per target.
+# ARGV: pending member, rolled key TTL, source count, target count, source fields, then target fields.
+_ROLLUP_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+local ttl, sources, targets = ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4])
+
+local current, float = 0, false
+for i = 1, sources do
+    local key, field, value = KEYS[2 + i], ARGV[4 + i], nil
+    if field ~= '' then
+        value = redis.call('HGET', key, field)
+    else
+        value = redis.call('GET', key)
+    end
+    if value then
+        float = float or string.find(value, '[%.eE]') ~= nil
+        current = current + tonumber(value)
+    end
+end
+
+local rolled = redis.call('GET', KEYS[2])
+if rolled then
+    float = float or string.find(rolled, '[%.eE]') ~= nil
+end
+local delta = current - (tonumber(rolled) or 0)
+local format = function (value) return string.format(float and '%.17g' or '%d', value) end
+redis.call('SET', KEYS[2], format(current), 'EX', ttl)
+
+for i = 1, targets do
+    local key, field = KEYS[2 + sources + i], ARGV[4 + sources + i]
+    if delta > 0 then
+        if field ~= '' then
+            redis.call(float and 'HINCRBYFLOAT' or 'HINCRBY', key, field, format(delta))
+        else
+            redis.call(float and 'INCRBYFLOAT' or 'INCRBY', key, format(delta))
+        end
+    end
+    redis.call('SREM', KEYS[2 + sources + targets + i], ARGV[1])
+end
+return 1
+"""
+
 
 ## EventEngine - handles low-level propagation and IO.
 class EventEngine(PlatformBridge):
@@ -42,9 +131,19 @@ class EventEngine(PlatformBridge):
         propagation of data to underlying
         storage mechanisms. '''
 
+    _config_path = 'tracker.engine.EventEngine'
+
     # flags
     _REDIS_ENABLED = _REDIS
 
+    # server-side scripts
+    _scripts = {  # script name => Lua source
+        'aggregate': _AGGREGATE_SCRIPT,
+        'guarded': _GUARDED_SCRIPT,
+        'rollup': _ROLLUP_SCRIPT
+    }
+    _script_shas = {}  # script name => SHA1 loaded on the server
+
     # magic string identifiers
     _id_prefix = redis.RedisAdapter._id_prefix
     _meta_prefix = redis.RedisAdapter._meta_prefix
@@ -56,6 +155,19 @@ class EventEngine(PlatformBridge):
     # magic keys
     _asid_map_key = '__asid:map__'  # associates ASID's with tracker IDs
     _adgroup_map_key = '__adgroup:map__'  # associates adgroup ID's with tracker IDs
+    _shard_map_key = '__shard:map__'  # associates sharded counter buckets with their shard count
+    _worker_key = '__eventid:worker:%s__'  # leases event ID worker IDs, by worker ID
+    _worker_counter_key = '__eventid:workers__'  # rotates the first worker ID tried for a new lease
+    _cursor_separator = '|'  # separates score and member in timeline cursors
+
+    # counter sharding state (per-worker)
+    _sharded = collections.OrderedDict()  # bucket => registered shard count, least-recently-used first
+    _heat = {}  # bucket => increments seen in the current detection window
+    _heat_window = 0  # start of the current detection window
+
+    # index retention state (per-worker)
+    _trimmed = set()  # index keys trimmed in the current trim window
+    _trim_window = 0  # start of the current trim window
 
     ## Datastore - static, encapsulated adapter import.
     class Datastore(object):
@@ -90,6 +202,223 @@ class EventEngine(PlatformBridge):
 
         raise NotImplementedError('Method `_spawn` is not yet supported.')
 
+    def _script(self, name, reload=False):
+
+        ''' Resolve the server-side SHA for the Lua script
+            registered at ``name``, loading it if it hasn't
+            been loaded yet (or if ``reload`` is set).
+
+            :param name: Name of the script, as registered in
+            :py:attr:`EventEngine._scripts`.
+
+            :param reload: Flag (``bool``) to force loading the
+            script again, i.e. after a ``NOSCRIPT`` error.
+
+            :returns: SHA1 (``str``) of the loaded script. '''
+
+        if reload or name not in self._script_shas:
+            self._script_shas[name] = self.Datastore.redis.channel(None).script_load(self._scripts[name])
+        return self._script_shas[name]
+
+    def _evaluate(self, name, keys, args, pipeline=None):
+
+        ''' Run the Lua script registered at ``name`` against
+            ``keys``, with ``args``, reloading it if the server
+            has lost it (``NOSCRIPT``).
+
+            :param name: Name of the script, as registered in
+            :py:attr:`EventEngine._scripts`.
+
+            :param keys: ``list`` of every key the script touches.
+
+            :param args: ``list`` of other script arguments.
+
+            :param pipeline: Existing pipeline to queue the call
+            onto. Scripted calls queued onto a pipeline are replayed
+            by :py:meth:`execute` after a ``NOSCRIPT``. Defaults to
+            ``None``.
+
+            :returns: The script's result, or ``pipeline`` if a
+            valid pipeline was presented. '''
+
+        keys, args = list(keys), list(args)
+        if pipeline is not None:
+            pipeline.evalsha(self._script(name), len(keys), *(keys + args))
+            if not hasattr(pipeline, '_scripted'):
+                pipeline._scripted = []
+            pipeline._scripted.append((name, keys, args))
+            return pipeline
+
+        try:
+            return self.Datastore.redis.channel(None).evalsha(self._script(name), len(keys), *(keys + args))
+        except exceptions.ResponseError as e:
+            if not self._noscript(e):
+                raise
+            return self.Datastore.redis.channel(None).evalsha(self._script(name, reload=True), len(keys), *(
+                keys + args))
+
+    def _shard_name(self, bucket, index):
+
+        ''' Build the name of shard ``index`` of ``bucket``, by
+            suffixing its property path chunk, so that each shard
+            lands in a distinct key in both hash and top-level mode.
+
+            :param bucket: Logical (unsharded) bucket name.
+
+            :param index: Shard index (``int``).
+
+            :returns: Sharded bucket name (``str``). '''
+
+        from protocol.special import Separators
+
+        chunks = bucket.split(Separators.HASH_CHUNK)
+        chunks[1] = Separators.HASH_KEY_NAME.join((chunks[1], str(index)))
+        return Separators.HASH_CHUNK.join(chunks)
+
+    def _locate(self, bucket, hashed=True, slots=True):
+
+        ''' Resolve where the counter for ``bucket`` is stored.
+
+            In hash mode, a bucket lives in the hash named by its
+            first two chunks (prefix and property path), under the
+            rest of its name. With ``slots`` enabled, hour-level
+            aggregation buckets instead share one hash per dimension
+            and day (named like the bucket, with the day identifier
+            in place of the hour), under their hour slot, in both
+            hash and top-level mode.
+
+            :param bucket: Physical bucket name.
+
+            :param hashed: Flag (``bool``) indicating hash mode.
+            Defaults to ``True``.
+
+            :param slots: Flag (``bool``) to pack hour slots, if
+            ``slots`` is enabled. Pass ``False`` for the location
+            used before slots were enabled. Defaults to ``True``.
+
+            :returns: Tuple of ``(key, field)``, where ``field`` is
+            empty (``''``) for a top-level counter. '''
+
+        from protocol import timewindow
+        from protocol.special import Prefixes, Separators
+
+        chunks = bucket.split(Separators.HASH_CHUNK)
+
+        # packed hour slots: `<prefix>::<path>::...::<interval>::<day>` => `<slot>`
+        if (slots and len(chunks) > 3 and chunks[0] == Prefixes.AGGREGATION and chunks[-2].isdigit() and (
+                self.config.get('slots', {}).get('enabled', False))):
+            if timewindow.resolve(int(chunks[-2]))[0] is timewindow.HOUR:
+                day, slot = timewindow.slot(int(chunks[-2]), chunks[-1])
+                return Separators.HASH_CHUNK.join(chunks[:-1] + [day]), str(slot)
+
+        if hashed and len(chunks) > 2:
+            return Separators.HASH_CHUNK.join(chunks[:2]), Separators.HASH_CHUNK.join(chunks[2:])
+        return bucket, ''
+
+    def _timeline_key(self, kind, scope=None):
+
+        ''' Build the name of the time index for ``kind``.
+
+            :param kind: Model kind name (``str``).
+
+            :param scope: Optional ``(property, value)`` pair, for
+            the index of entities with that value only.
+
+            :returns: Sorted set key (``str``). '''
+
+        from protocol.special import Prefixes, Separators
+
+        if scope is None:
+            return Separators.HASH_CHUNK.join((Prefixes.TIMELINE, kind))
+
+        prop, value = scope
+        if isinstance(value, bool):
+            value = '1' if value else '0'  # so ``True`` and ``1`` share an index
+        return Separators.HASH_CHUNK.join((Prefixes.TIMELINE, kind, prop, unicode(value)))
+
+    def _page(self, key, low, high, limit=0, offset=0, cursor=None, reverse=False):
+
+        ''' Page through the sorted set at ``key`` by score,
+            between ``low`` and ``high`` (``ZRANGEBYSCORE`` syntax).
+            See :py:meth:`timeline` for the rest of the parameters.
+
+            :raises ValueError: If ``cursor`` is invalid.
+
+            :returns: Tuple of ``(ids, cursor)``. '''
+
+        # resume at the cursor's score, skipping members up to and including the cursor's member
+        after = None
+        if cursor:
+            try:
+                score, member = base64.urlsafe_b64decode(str(cursor)).split(self._cursor_separator, 1)
+                after = float(score), member
+            except (TypeError, ValueError):
+                raise ValueError('Invalid timeline cursor `%s`.' % cursor)
+            if reverse:
+                high = repr(after[0])
+            else:
+                low = repr(after[0])
+
+        channel = self.Datastore.redis.channel(None)
+        wanted, matched, position = (offset + limit) if limit else None, [], 0
+
+        while True:
+            window = {'start': position, 'num': wanted, 'withscores': True} if wanted else {'withscores': True}
+            if reverse:
+                page = channel.zrevrangebyscore(key, high, low, **window)
+            else:
+                page = channel.zrangebyscore(key, low, high, **window)
+
+            for member, score in page:
+                if after is not None and score == after[0] and (member >= after[1] if reverse else member <= after[1]):
+                    continue  # at or before the cursor
+                matched.append((member, score))
+
+            position += len(page)
+            if not wanted or len(page) < wanted or len(matched) >= wanted:
+                break
+
+        matched = matched[offset:wanted]
+        if not (limit and len(matched) == limit):
+            return [member for member, score in matched], None
+
+        last = matched[-1]
+        return [member for member, score in matched], base64.urlsafe_b64encode(
+            self._cursor_separator.join((repr(last[1]), last[0])))
+
+    @staticmethod
+    def _sum(values):
+
+        ''' Sum raw counter values as read from storage,
+            skipping missing shards.
+
+            :param values: Iterable of raw values (``str``,
+            ``int``, ``float`` or ``None``).
+
+            :returns: Summed value, or ``None`` if every value
+            was missing. '''
+
+        total = None
+        for value in values:
+            if value is None:
+                continue
+            if isinstance(value, basestring):
+                value = float(value) if ('.' in value or 'e' in value) else int(value)
+            total = value if total is None else total + value
+        return total
+
+    @staticmethod
+    def _noscript(error):
+
+        ''' Check whether ``error`` indicates that a script
+            SHA is unknown to the server (``NOSCRIPT``).
+
+            :param error: Exception raised by ``redis``.
+
+            :returns: ``bool`` indicating a ``NOSCRIPT`` error. '''
+
+        return isinstance(error, exceptions.ResponseError) and str(error).startswith('NOSCRIPT')
+
     ## === Bindings === ##
     def adapter(self, engine, kind=None, **kwargs):
 
@@ -166,10 +495,67 @@ class EventEngine(PlatformBridge):
             if not isinstance(pipeline, (client.StrictPipeline, client.Pipeline)):
                 # and put the entity, using the pipeline... then return it
                 batch = self.pipeline()
-            return entity.key, entity.put(pipeline=batch)
+            result = entity.put(pipeline=batch)
+            self.index(entity, batch)  # index in the same pipeline
+            return entity.key, result
 
         # otherwise, put the entity normally and return the written key
-        return entity.put()
+        key = entity.put()
+        self.index(entity)
+        return key
+
+    def index(self, entity, pipeline=None):
+
+        ''' Add ``entity`` to the time indexes for its kind, as
+            configured in the ``indexing`` config block: one sorted
+            set per kind, plus one per value of each ``scopes``
+            property, all scored by the entity's time ``property``
+            (in epoch seconds) with its key ID as the member.
+
+            Entries older than ``retention`` seconds are trimmed from
+            each index written to, at most once per ``trim`` seconds
+            per worker, and each index expires ``retention`` seconds
+            after its last trim, so indexes for values that stop
+            appearing go away.
+
+            :param entity: Entity that is being persisted.
+
+            :param pipeline: Existing low-level pipeline to queue
+            the writes onto. Defaults to ``None``.
+
+            :returns: ``pipeline``, if a valid pipeline was presented. '''
+
+        indexing = self.config.get('indexing', {})
+        spec = indexing.get('kinds', {}).get(entity.__class__.__name__)
+        if not (_REDIS and indexing.get('enabled', False) and spec and entity.key and entity.key.id):
+            return pipeline
+
+        stamp = getattr(entity, spec.get('property', 'created'), None) or datetime.datetime.now()
+        score = time.mktime(stamp.timetuple()) + (stamp.microsecond / 1e6)
+
+        kind, now = entity.__class__.__name__, time.time()
+        keys = [self._timeline_key(kind)] + [self._timeline_key(kind, (prop, getattr(entity, prop))) for prop in (
+            spec.get('scopes', ())) if getattr(entity, prop, None) is not None]
+
+        target = pipeline if pipeline is not None else self.Datastore.redis.channel(None).pipeline(transaction=False)
+        for key in keys:
+            self.index_add(key, entity.key.id, target, score)
+
+        # trim each index to ``retention``, once per ``trim`` window
+        retention = indexing.get('retention', 0)
+        if retention:
+            if (now - EventEngine._trim_window) >= indexing.get('trim', 60):
+                EventEngine._trimmed, EventEngine._trim_window = set(), now
+
+            for key in keys:
+                if key not in self._trimmed:
+                    self._trimmed.add(key)
+                    target.zremrangebyscore(key, '-inf', '(%r' % (now - retention))
+                    target.expire(key, retention)
+
+        if pipeline is None:
+            target.execute()
+        return pipeline
 
     def publish(self, channels, value, execute=True, pipeline=None):
 
@@ -287,8 +673,6 @@ class EventEngine(PlatformBridge):
             operation, or ``pipeline`` if a valid pipeline was
             presented. '''
 
-        from protocol.special import Separators
-
         # check delta type
         if not isinstance(delta, (float, int)):
             raise TypeError('`delta` value for counter increment operation on '
@@ -305,14 +689,10 @@ class EventEngine(PlatformBridge):
 
         if _REDIS:
 
-            # resolve whether we're going to be hashing our value
-            use_hash = True
-            if force_toplevel or (self.redis.EngineConfig.mode is redis.RedisMode.toplevel_blob):
-                use_hash = False
-            else:
-                bucket_split = bucket.split(Separators.HASH_CHUNK)
-                key_prefix = Separators.HASH_CHUNK.join(bucket_split[:2])
-                key_postfix = Separators.HASH_CHUNK.join(bucket_split[2:])
+            # resolve whether we're going to be hashing our value, and where
+            key_prefix, key_postfix = self._locate(bucket, not (
+                force_toplevel or (self.redis.EngineConfig.mode is redis.RedisMode.toplevel_blob)))
+            use_hash = bool(key_postfix)
 
             # resolve write method
             if isinstance(delta, int):
@@ -336,6 +716,237 @@ class EventEngine(PlatformBridge):
         else:
             raise NotImplementedError('Local datastore is not yet supported for raw counters.')
 
+    def shard(self, bucket, shards=0):
+
+        ''' Resolve the physical bucket to write an increment for
+            ``bucket`` to, spreading hot counters across shards if
+            sharding is enabled in the ``sharding`` config block.
+
+            A bucket is sharded if it is declared hot (``shards``) or
+            if automatic detection sees more than ``threshold``
+            increments for it within ``window`` seconds. Sharded
+            buckets are registered at :py:attr:`_shard_map_key`, so
+            readers know to sum their shards - the first registration
+            wins, and every writer uses the registered shard count.
+            Each worker remembers up to ``max_buckets`` registrations.
+
+            :param bucket: Logical bucket name.
+
+            :param shards: Declared shard count for ``bucket`` (see
+            :py:meth:`Aggregation.shards_for`). Defaults to ``0``.
+
+            :returns: Name of the bucket to increment (``str``). '''
+
+        sharding = self.config.get('sharding', {})
+        if not sharding.get('enabled', False):
+            return bucket
+
+        count = self._sharded.pop(bucket, None)
+        if count is None:
+
+            if shards < 2 and sharding.get('auto', {}).get('enabled', False):
+
+                # automatic detection: count increments per bucket, per window
+                auto, now = sharding['auto'], time.time()
+                if (now - EventEngine._heat_window) >= auto.get('window', 1.0):
+                    EventEngine._heat, EventEngine._heat_window = {}, now
+
+                self._heat[bucket] = self._heat.get(bucket, 0) + 1
+                if self._heat[bucket] > auto.get('threshold', 1000):
+                    shards = sharding.get('shards', 8)
+
+            if shards < 2:
+                return bucket
+
+            # register once per worker - the first registration wins, so use whatever was registered
+            count = shards
+            if _REDIS:
+                with self.Datastore.redis.channel(None).pipeline(transaction=False) as pipe:
+                    pipe.hsetnx(self._shard_map_key, bucket, shards)
+                    pipe.hget(self._shard_map_key, bucket)
+                    count = int(pipe.execute()[1] or shards)
+
+            while len(self._sharded) >= sharding.get('max_buckets', 10000):
+                self._sharded.popitem(last=False)
+
+        self._sharded[bucket] = count  # (re)insert as most-recently-used
+
+        if sharding.get('strategy', 'worker') == 'random':
+            return self._shard_name(bucket, random.randrange(count))
+        return self._shard_name(bucket, os.getpid() % count)
+
+    def lease(self, held=None, ttl=300):
+
+        ''' Lease a worker ID for :py:mod:`util.eventid`, so
+            that no two live processes embed the same one. Leases
+            are held at :py:attr:`_worker_key` and expire after
+            ``ttl`` seconds unless renewed.
+
+            :param held: Worker ID currently held by this process,
+            to renew. Defaults to ``None``.
+
+            :param ttl: Lease TTL, in seconds. Defaults to ``300``.
+
+            :raises RuntimeError: If every worker ID is leased.
+
+            :returns: Leased worker ID (``int``). '''
+
+        channel, owner = self.Datastore.redis.channel(None), '%s:%s' % (socket.gethostname(), os.getpid())
+
+        # renew our lease, or retake it if it lapsed and nobody else has
+        if held is not None:
+            if channel.get(self._worker_key % held) == owner:
+                channel.expire(self._worker_key % held, ttl)
+                return held
+            if channel.set(self._worker_key % held, owner, ex=ttl, nx=True):
+                return held
+
+        start = channel.incr(self._worker_counter_key)
+        for offset in xrange(1024):
+            candidate = (start + offset) % 1024
+            if channel.set(self._worker_key % candidate, owner, ex=ttl, nx=True):
+                return candidate
+        raise RuntimeError('No event ID worker IDs left to lease.')
+
+    def increment_multi(self, increments, pipeline=None, force_toplevel=False, guard=None):
+
+        ''' Apply a full set of counter increments (usually
+            every aggregation bucket for a single event) in one
+            atomic call to a server-side Lua script. Hash and
+            top-level storage are resolved inside the script.
+
+            :param increments: Iterable of ``(bucket, delta)``
+            pairs, validated like :py:meth:`increment`.
+
+            :param pipeline: Existing pipeline buffer to queue the
+            script call onto. Defaults to ``None``, in which case
+            the script is called immediately. Pipelines should be
+            run with :py:meth:`execute` to recover from ``NOSCRIPT``.
+
+            :param force_toplevel: Flag (``bool``) indicating that
+            we wish to force all storage operations to occur in the
+            top-level datastore namespace (disables hash bucketing).
+
+            :param guard: Optional ``(key, member)`` pair. If given,
+            increments are only applied if ``member`` can be removed
+            from the sorted set at ``key``, so they apply exactly once.
+
+            :raises TypeError: In the case of an invalid ``bucket``
+            or ``delta`` type.
+
+            :raises ValueError: In the case of a negative ``delta``.
+
+            :returns: Count of increments applied (``-1`` if ``guard``
+            was already consumed), or ``pipeline`` if a valid pipeline
+            was presented. '''
+
+        args = []
+        for bucket, delta in increments:
+
+            if not isinstance(delta, (float, int)):
+                raise TypeError('`delta` value for counter increment operation on '
+                                'bucket "%s" must be an integer or float, got %s.' % (bucket, type(delta)))
+
+            if delta < 0:
+                raise ValueError('`delta` value for counter increment must be '
+                                 'greater than 1. Got: "%s".' % delta)
+
+            if not isinstance(bucket, basestring):
+                raise TypeError('`bucket` key for counter increment operation must '
+                                'be a string. Received: "%s" of type "%s".' % (bucket, type(bucket)))
+
+            args.append((bucket, repr(delta) if isinstance(delta, float) else str(delta)))
+
+        if not args and guard is None:
+            return pipeline if pipeline is not None else 0
+
+        if not _REDIS:
+            raise NotImplementedError('Local datastore is not yet supported for raw counters.')
+
+        # resolve storage locations up front, so the script and single increments always agree
+        hashed, keys, fields = not (force_toplevel or (
+            self.redis.EngineConfig.mode is redis.RedisMode.toplevel_blob)), [], []
+        for bucket, delta in args:
+            key, field = self._locate(bucket, hashed)
+            keys.append(key)
+            fields.extend((field, delta))
+
+        if guard is None:
+            return self._evaluate('aggregate', keys, fields, pipeline)
+        return self._evaluate('guarded', [guard[0]] + keys, [guard[1]] + fields, pipeline)
+
+    def execute(self, pipeline):
+
+        ''' Execute ``pipeline``, reloading scripts and replaying
+            any scripted calls if the server reports ``NOSCRIPT``
+            (for instance, after a restart or ``SCRIPT FLUSH``).
+            Outcomes are reported to the circuit breaker (see
+            :py:class:`Spool`), and round-trip times to admission
+            control (see :py:class:`AdmissionController`).
+
+            :param pipeline: Pipeline to execute.
+
+            :returns: Results of executing ``pipeline``. '''
+
+        scripted = getattr(pipeline, '_scripted', None)
+        if scripted:
+            pipeline._scripted = []
+
+        start = time.time()
+        try:
+            results = pipeline.execute()
+        except exceptions.ResponseError as e:
+            if not (scripted and self._noscript(e)):
+                raise
+
+            # every other command went through - replay only the scripted calls
+            self.logging.warning('Script cache miss (NOSCRIPT), reloading and replaying %s call(s).' % len(scripted))
+            replay = self.Datastore.redis.channel(None).pipeline()
+            for name in set(name for name, keys, args in scripted):
+                self._script(name, reload=True)
+            for name, keys, args in scripted:
+                replay.evalsha(self._script(name), len(keys), *(keys + args))
+            results = replay.execute()
+        except self.bus.spool.outages as e:
+            self.bus.spool.failure(e)  # feed the circuit breaker
+            raise
+
+        self.bus.spool.success()
+        self.bus.admission.observe(time.time() - start)  # feed admission control
+        return results
+
+    def mark(self, pipeline):
+
+        ''' Mark the current position of ``pipeline``, so that
+            commands queued after it can be dropped with
+            :py:meth:`rollback`. Lets one pipeline be shared by
+            a batch of units of work that may fail independently.
+
+            :param pipeline: Pipeline to mark, or ``None``.
+
+            :returns: Opaque mark for :py:meth:`rollback`. '''
+
+        if pipeline is None:
+            return None
+        return len(pipeline.command_stack), len(getattr(pipeline, '_scripted', ()))
+
+    def rollback(self, pipeline, mark):
+
+        ''' Drop every command queued on ``pipeline`` since
+            ``mark``, as returned by :py:meth:`mark`.
+
+            :param pipeline: Pipeline to roll back, or ``None``.
+
+            :param mark: Mark returned by :py:meth:`mark`.
+
+            :returns: ``pipeline``, for chainability. '''
+
+        if pipeline is not None and mark is not None:
+            del pipeline.command_stack[mark[0]:]
+            if hasattr(pipeline, '_scripted'):
+                del pipeline._scripted[mark[1]:]
+        return pipeline
+
     def get(self, address, pipeline=None):
 
         ''' Read the entity value, if any, at key
@@ -375,6 +986,195 @@ class EventEngine(PlatformBridge):
             return results
         return [self.adapter(self.Datastore.inmemory).get(address) for address in iterable]
 
+    def get_entities(self, kind, keys, join=None, chunk=None):
+
+        ''' Read the entities at ``keys`` in one round-trip (a
+            single ``MGET``), instead of one read per key. Large
+            reads are split into chunks of at most ``chunk``
+            addresses, one ``MGET`` (and round-trip) each.
+
+            :param kind: Model class of the entities at ``keys``.
+
+            :param keys: Iterable of :py:class:`model.Key` objects.
+
+            :param join: Optional model class to join each entity
+            with, by key ID, in the same round-trip. For instance,
+            :py:class:`raw.Event` for :py:class:`TrackedEvent` keys.
+
+            :param chunk: Most addresses to read per round-trip,
+            clamped to between ``1`` and the ``chunk`` option of the
+            ``reads`` config block (``0`` for no limit). Defaults to
+            ``None``, meaning the configured ``chunk``.
+
+            :returns: ``list`` of entities (``None`` where missing),
+            in input order, or ``(entity, joined)`` pairs if ``join``
+            is given. '''
+
+        keys = list(keys)
+        joined = [model.Key(join, key.id) for key in keys] if join is not None else []
+
+        if not keys:
+            return []
+
+        if not _REDIS:
+            entities = [kind.get(key) for key in keys]
+            if join is None:
+                return entities
+            return zip(entities, [join.get(key) for key in joined])
+
+        # one ``MGET`` for every entity (and its join) per chunk, then inflate
+        addresses = [key.flatten(True)[0] for key in keys + joined]
+        limit = self.config.get('reads', {}).get('chunk', 0)
+        chunk = limit if chunk is None else max(int(chunk), 1)
+        if limit:
+            chunk = min(chunk, limit)
+        if not chunk or len(addresses) <= chunk:
+            blobs = self.Datastore.redis.channel(None).mget(addresses)
+        else:
+            blobs, channel = [], self.Datastore.redis.channel(None)
+            for offset in xrange(0, len(addresses), chunk):
+                blobs.extend(channel.mget(addresses[offset:offset + chunk]))
+
+        entities = []
+        for i, (key, blob) in enumerate(zip(keys + joined, blobs)):
+            if blob is None:
+                entities.append(None)
+                continue
+            entities.append((kind if i < len(keys) else join)(key=key, **self.Datastore.redis.serializer.loads(blob)))
+
+        if join is None:
+            return entities
+        return zip(entities[:len(keys)], entities[len(keys):])
+
+    def locate(self, buckets, force_toplevel=False, sharded=True):
+
+        ''' Resolve every storage location holding part of the
+            counter for each of ``buckets``: the bucket itself, plus
+            its shards if it's sharded (see :py:meth:`shard`). With
+            ``slots`` enabled, the location each one had before slots
+            were enabled is included too (unless ``legacy`` is off),
+            so values written before the switch still count.
+
+            :param buckets: ``list`` of logical ``str`` bucket names.
+
+            :param force_toplevel: Flag (``bool``) indicating that
+            buckets were written in the top-level datastore namespace
+            (disables hash bucketing).
+
+            :param sharded: Flag (``bool``) to include shards. Defaults
+            to ``True``. Without it, no round-trip is needed.
+
+            :returns: ``list`` of ``(key, field)`` location lists (see
+            :py:meth:`_locate`), one per bucket, in input order. '''
+
+        hashed = not (force_toplevel or (self.redis.EngineConfig.mode is redis.RedisMode.toplevel_blob))
+
+        # resolve shard counts for sharded counter buckets
+        shards = None
+        if sharded and buckets and self.config.get('sharding', {}).get('enabled', False):
+            shards = self.Datastore.redis.channel(None).hmget(self._shard_map_key, buckets)
+
+        _slots = self.config.get('slots', {})
+        legacy = _slots.get('enabled', False) and _slots.get('legacy', True)
+
+        located = []
+        for i, bucket in enumerate(buckets):
+            count = int(shards[i]) if shards and shards[i] else 0
+
+            locations = []
+            for physical in [bucket] + [self._shard_name(bucket, index) for index in xrange(count)]:
+                locations.append(self._locate(physical, hashed))
+                if legacy:
+                    previous = self._locate(physical, hashed, slots=False)
+                    if previous != locations[-1]:
+                        locations.append(previous)
+            located.append(locations)
+        return located
+
+    def get_counters(self, buckets, force_toplevel=False, rollup=True):
+
+        ''' Read multiple counter buckets, as written by
+            :py:meth:`increment`, in as few round-trips as
+            possible. Hashed buckets are grouped by hash key
+            (see :py:meth:`_locate`) and each group is read with
+            one ``HMGET``, so a day of packed hour slots costs one
+            call. Top-level buckets are read with one ``MGET``, all
+            in a single pipeline. Sharded buckets (see :py:meth:`shard`)
+            are summed across their shards.
+
+            :param buckets: Iterable of logical ``str`` bucket names.
+
+            :param force_toplevel: Flag (``bool``) indicating that
+            buckets were written in the top-level datastore namespace
+            (disables hash bucketing).
+
+            :param rollup: Flag (``bool``) to add still-pending partial
+            windows when rollup mode is enabled (see
+            :py:class:`RollupEngine`). Defaults to ``True``.
+
+            :returns: ``list`` of raw values, where each value
+            corresponds to the bucket at the same index in
+            ``buckets`` (or ``None`` if it could not be found). '''
+
+        buckets = list(buckets)
+        if not buckets:
+            return []
+
+        if not _REDIS:
+            return [self.adapter(self.Datastore.inmemory).get(address) for address in buckets]
+
+        channel = self.Datastore.redis.channel(None)
+
+        # expand to physical locations: each bucket, followed by its shards
+        located = self.locate(buckets, force_toplevel)
+        physical = [location for locations in located for location in locations]
+
+        if not any(field for key, field in physical):
+            values = channel.mget([key for key, field in physical])
+
+        else:
+
+            # group fields by hash key, remembering where each value belongs
+            groups, order, toplevel = {}, [], []
+            for position, (key, field) in enumerate(physical):
+                if not field:
+                    toplevel.append((key, position))
+                    continue
+                if key not in groups:
+                    groups[key] = ([], [])
+                    order.append(key)
+                groups[key][0].append(field)
+                groups[key][1].append(position)
+
+            with channel.pipeline(transaction=False) as pipeline:
+                for key in order:
+                    pipeline.hmget(key, groups[key][0])
+                if toplevel:
+                    pipeline.mget([key for key, position in toplevel])
+                fetched = pipeline.execute()
+
+            values = [None] * len(physical)
+            if toplevel:
+                for (key, position), value in zip(toplevel, fetched.pop()):
+                    values[position] = value
+            for key, result in zip(order, fetched):
+                for position, value in zip(groups[key][1], result):
+                    values[position] = value
+
+        # fold shards (plus any value written before sharding) into one value per bucket
+        if len(physical) > len(buckets):
+            folded, cursor = [], 0
+            for locations in located:
+                width = len(locations)
+                folded.append(self._sum(values[cursor:cursor + width]) if width > 1 else values[cursor])
+                cursor += width
+            values = folded
+
+        # add partial windows that haven't been rolled up yet
+        if rollup and self.bus is not None and self.bus.rollup.enabled:
+            values = self.bus.rollup.combine(buckets, values)
+        return values
+
     def set_item(self, hash, key, value, pipeline=None):
 
         ''' Set a ``key`` in a ``hash`` to a certain
@@ -418,7 +1218,7 @@ class EventEngine(PlatformBridge):
             ), target=pipeline)
         raise NotImplementedError('`InMemoryAdapter` does not yet support hash structures.')
 
-    def index_add(self, bucket, value, pipeline=None):
+    def index_add(self, bucket, value, pipeline=None, score=0):
 
         ''' Add the value at ``value`` to the container index
             specified at ``bucket``.
@@ -426,18 +1226,108 @@ class EventEngine(PlatformBridge):
             :param bucket: Bucket identifier (``str``) that specifies
             the index we wish to write to.
 
-            :param value: Value to add to the index. How the value
-            is written and what structure is used depends on the
-            adapter selected for the write.
+            :param value: Value to add to the index. In Redis, indexes
+            are sorted sets and ``value`` is added as a member.
 
             :param pipeline: Existing low-level pipeline to execute
             the write(s) against, in place of the mainline adapter.
             Defaults to ``None``.
 
-            :raises NotImplementedError: Always, as this method is
-            currently stubbed.
+            :param score: Sort score (``int`` or ``float``) for
+            ``value``, usually a timestamp. Defaults to ``0``.
+
+            :raises NotImplementedError: If Redis is not available.
 
             :returns: Result of the low-level write operation, or
             ``pipeline`` if a valid pipeline was presented. '''
 
-        raise NotImplementedError('`EventTracker` does not yet support compound key indexes.')
+        if not _REDIS:
+            raise NotImplementedError('`InMemoryAdapter` does not yet support sorted indexes.')
+
+        if pipeline is not None:
+            pipeline.execute_command('ZADD', bucket, score, value)
+            return pipeline
+        return self.Datastore.redis.channel(None).execute_command('ZADD', bucket, score, value)
+
+    def timeline(self, kind, start=None, end=None, scope=None, limit=0, offset=0, cursor=None, reverse=False):
+
+        ''' Page through the time index for ``kind`` (see
+            :py:meth:`index`), without touching the rest of
+            the keyspace.
+
+            :param kind: Model kind name (``str``).
+
+            :param start: Exclusive lower bound, in epoch seconds.
+            Defaults to ``None`` (unbounded).
+
+            :param end: Exclusive upper bound, in epoch seconds.
+            Defaults to ``None`` (unbounded).
+
+            :param scope: Optional ``(property, value)`` pair, to
+            page through a per-value index instead.
+
+            :param limit: Maximum count of IDs to return. Defaults
+            to ``0`` (no limit).
+
+            :param offset: Count of IDs to skip, after ``cursor``.
+            Defaults to ``0``.
+
+            :param cursor: Cursor returned by a previous call, to
+            continue after. Stable while new entries are indexed.
+
+            :param reverse: Flag (``bool``) to page newest-first.
+            Defaults to ``False``.
+
+            :raises ValueError: If ``cursor`` is invalid.
+
+            :returns: Tuple of ``(ids, cursor)``, where ``cursor``
+            is ``None`` unless a full page (``limit``) was returned. '''
+
+        if not _REDIS:
+            raise NotImplementedError('`InMemoryAdapter` does not yet support sorted indexes.')
+
+        low = '(%r' % start if start is not None else '-inf'
+        high = '(%r' % end if end is not None else '+inf'
+        return self._page(self._timeline_key(kind, scope), low, high, limit, offset, cursor, reverse)
+
+    def scan(self, kind, cursor=0, count=None):
+
+        ''' Walk the entities of ``kind`` stored in Redis with
+            ``SCAN``, one batch at a time. Unlike ``KEYS``, each
+            call does a bounded amount of work, so walking the whole
+            keyspace never blocks other clients. Prefer
+            :py:meth:`timeline` for kinds with a time index.
+
+            :param kind: Model class to walk entities of.
+
+            :param cursor: ``SCAN`` cursor returned by a previous
+            call. Defaults to ``0``, to start a new walk.
+
+            :param count: ``SCAN`` batch size hint. Defaults to the
+            ``batch`` option of the ``reads`` config block.
+
+            :raises NotImplementedError: If Redis is not available.
+
+            :returns: Tuple of ``(ids, cursor)``, where ``cursor``
+            is ``0`` once the walk is complete. A walk may return
+            an ID more than once, so consumers should tolerate
+            duplicates. '''
+
+        if not _REDIS:
+            raise NotImplementedError('`InMemoryAdapter` does not yet support keyspace scans.')
+
+        # derive the address pattern for ``kind`` from a sample key
+        sentinel = '__scan__'
+        head, tail = model.Key(kind, sentinel).flatten(True)[0].split(sentinel, 1)
+
+        count = count or self.config.get('reads', {}).get('batch', 500)
+        cursor, addresses = self.Datastore.redis.channel(None).scan(int(cursor or 0), match=head + '*' + tail, count=count)
+
+        ids = []
+        for address in addresses:
+            if not address.endswith(tail) or len(address) <= len(head) + len(tail):
+                continue
+            identifier = address[len(head):len(address) - len(tail)]
+            if self._magic_separator not in identifier:  # skip meta and other derived keys
+                ids.append(identifier)
+        return ids, cursor
@@ -13,11 +13,21 @@ is enforced by :py:class:`platform.ampush.tracker.policy.PolicyEngine`.
           embedded licenses and other legalese, see `LICENSE.md`.
 '''
 
+# stdlib
+import time
+import collections
+
+# 3rd party
+import webob
+
 # Tracker Models
 from api.models.tracker.raw import Event
+from api.models.tracker.raw import _HASH_HEADER
+from api.models.tracker.raw import _RQID_HEADER
 
 # Platform Parent
 from api.platform import PlatformBridge
+from api.platform.tracker import exceptions
 
 # detect redis support
 try:
@@ -30,9 +40,108 @@ except:
 class EventBuilder(PlatformBridge):
 
     ''' Manages the inflation, construction, and
-        interpretation of ``TrackedEvent`` entities. '''
+        interpretation of ``TrackedEvent`` entities.
+
+        With ``dedup`` enabled, hits carrying their own ID (via
+        the ``XAF-Hash`` or ``XAF-Request-ID`` headers) are dropped
+        before any writes if that ID was seen within ``window``
+        seconds (see :py:meth:`duplicate`). '''
+
+    _config_path = 'tracker.event.EventBuilder'
+
+    _dedup_key = '__dedup__'  # prefix for dedup markers in Redis, by event ID
+    _seen = None  # event ID => expiry of its dedup marker, least-recently-used first
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`EventBuilder`.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(EventBuilder, self).__init__(bus)
+        self._seen = collections.OrderedDict()
+
+    ## === Internal Methods === ##
+    @staticmethod
+    def _identity(request):
+
+        ''' Resolve the ID a hit carries itself, if any, from
+            its headers (or its ``id``, for ``dict`` hits).
+
+            :returns: ``str`` event ID, or ``None``. '''
+
+        if isinstance(request, webob.Request):
+            return request.headers.get(_HASH_HEADER, request.headers.get(_RQID_HEADER))
+        if isinstance(request, dict):
+            return request.get('id')
+        return None
+
+    def _marker(self, identifier):
+
+        ''' Name the dedup marker for event ID ``identifier``. '''
+
+        return self.bus.engine._magic_separator.join((self._dedup_key, identifier))
 
-    def raw(self, request, propagate=True, policy=None, legacy=False):
+    ## === Public Methods === ##
+    def duplicate(self, identifier):
+
+        ''' Check whether a hit with ID ``identifier`` was already
+            seen within the dedup ``window``, marking it as seen if
+            not. Recently-seen IDs are remembered in-process (up to
+            ``size`` of them), which answers repeat hits without a
+            round-trip; otherwise, a marker is set in Redis with
+            ``SET NX`` and a TTL of ``window``, which is authoritative
+            across workers.
+
+            :param identifier: Event ID carried by the hit.
+
+            :returns: ``True`` if the hit is a duplicate. '''
+
+        _dedup = self.config.get('dedup', {})
+        now, window, seen = time.time(), _dedup.get('window', 300), self._seen
+
+        expires = seen.get(identifier)
+        if expires is not None and expires > now:
+            return True
+
+        marked = True
+        if _REDIS:
+            marked = self.bus.engine.Datastore.redis.channel(None).set(self._marker(identifier), 1, ex=window, nx=True)
+
+        # remember the ID either way, evicting least-recently-used IDs past ``size``
+        seen.pop(identifier, None)
+        seen[identifier] = now + window
+        while len(seen) > _dedup.get('size', 100000):
+            seen.popitem(last=False)
+
+        return not marked
+
+    def forget(self, request):
+
+        ''' Clear the dedup marker for a hit that failed to
+            record, so that a retry of it isn't dropped.
+
+            :param request: Request (or ``dict``) for the hit.
+
+            :returns: ``True`` if a marker was cleared. '''
+
+        identifier = self._identity(request)
+        if not (identifier and self.config.get('dedup', {}).get('enabled', False)):
+            return False
+
+        self._seen.pop(identifier, None)
+        if _REDIS:
+            try:
+                self.bus.engine.Datastore.redis.channel(None).delete(self._marker(identifier))
+            except Exception as e:
+                context = (identifier, e.__class__.__name__, str(e))
+                self.logging.warning('Failed to clear dedup marker for hit "%s": %s("%s").' % context)
+                return False
+        return True
+
+    def raw(self, request, propagate=True, policy=None, legacy=False, pipeline=None):
 
         ''' Entrypoint for recording raw events and producing
             :py:class:`model.raw.Event`.
@@ -55,15 +164,24 @@ class EventBuilder(PlatformBridge):
             :keyword legacy: Flag indicating this hit is a legacy event,
             and will not have an attached tracker.
 
+            :keyword pipeline: Existing pipeline to queue the publish
+            onto, in place of a new one. Defaults to ``None``.
+
             :returns: Published (and possibly new) :py:class:`model.raw.Event`,
                       and, if requested via ``live``, a guess about how to
                       handle the request, like: ``tuple(<event>, <guess>)``. '''
 
+        # drop duplicates (by the ID the hit carries) before any writes
+        if self.config.get('dedup', {}).get('enabled', False):
+            identifier = self._identity(request)
+            if identifier and self.duplicate(identifier):
+                raise exceptions.DuplicateHit('Dropping duplicate hit "%s".' % identifier)
+
         # inflate raw event & publish to pubsub
         ev = Event.inflate(request, policy, legacy)
         result = self.bus.stream.publish(ev, **{
             'execute': False,
-            'pipeline': None,
+            'pipeline': pipeline,
             'propagate': propagate
         })
 
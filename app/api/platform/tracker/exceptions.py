@@ -58,3 +58,11 @@ class InvalidParameterValue(ParamsetException): pass
 
 # DuplicateParameterName - raised when two parameters have the same target name.
 class DuplicateParameterName(InvalidParamName): pass
+
+
+# EventBuilderException - parent exception for problems in the ``EventBuilder`` subsystem.
+class EventBuilderException(EngineSubsystemException): pass
+
+
+# DuplicateHit - raised when a hit was already recorded within the dedup window.
+class DuplicateHit(EventBuilderException): pass
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`QueryPlanner` class serves filtered event
+queries from the per-value time indexes written by
+:py:meth:`EventEngine.index`.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import hashlib
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# Protocol
+from protocol import special
+
+
+## QueryPlan - a resolved plan for one query.
+class QueryPlan(object):
+
+    ''' Resolved plan for an indexed query, built by
+        :py:meth:`QueryPlanner.plan` and run by
+        :py:meth:`QueryPlanner.execute`.
+
+        ``steps`` are ``(operation, destination, sources)``
+        set operations (``union`` or ``intersect``) that build
+        the sorted set at ``source``, which is then paged by
+        score between ``low`` and ``high``. '''
+
+    __slots__ = ('kind', 'source', 'steps', 'low', 'high', 'reverse', 'notes', 'empty')
+
+    def __init__(self, kind, source, steps, low, high, reverse, notes, empty=False):
+
+        ''' Initialize this :py:class:`QueryPlan`. '''
+
+        self.kind, self.source, self.steps, self.low, self.high = kind, source, steps, low, high
+        self.reverse, self.notes, self.empty = reverse, notes, empty
+
+    def explain(self):
+
+        ''' Describe this plan, step by step.
+
+            :returns: ``list`` of human-readable ``str`` lines. '''
+
+        lines = list(self.notes)
+        for operation, destination, sources in self.steps:
+            lines.append('%s %s into %s' % (operation, ', '.join(sources), destination))
+        lines.append('range %s .. %s over %s, %s' % (
+            self.low,
+            self.high,
+            self.source,
+            'newest first' if self.reverse else 'oldest first'))
+        if self.empty:
+            lines.append('short-circuit: an index in this plan is empty')
+        return lines
+
+
+## QueryPlanner - plans and runs indexed event queries.
+class QueryPlanner(PlatformBridge):
+
+    ''' Plans event queries against the time indexes kept by
+        :py:meth:`EventEngine.index`. ``==`` filters on indexed
+        properties resolve to one per-value index each, ``IN``
+        filters to a union of them. Range filters on the time
+        property narrow the score range. Indexes are intersected
+        (most selective first) and the result is paged by time,
+        so a query costs about as much as its most selective
+        filter matches, not as much as the kind holds.
+
+        Filters that can't be served (unindexed properties,
+        ``!=``, or ranges on other properties) make :py:meth:`plan`
+        return ``None``, so callers can fall back to a full query. '''
+
+    _config_path = 'tracker.planner.QueryPlanner'
+
+    _plan_marker = '__plan__'  # marks temporary result sets built by a plan
+
+    _ranges = {
+        '>': (0, False),
+        '>=': (0, True),
+        '<': (1, False),
+        '<=': (1, True)
+    }
+
+    ## === Internal Methods === ##
+    @staticmethod
+    def _tighter(current, candidate, upper):
+
+        ''' Pick the tighter of two ``(value, inclusive)`` bounds. '''
+
+        if current is None:
+            return candidate
+        if candidate[0] == current[0]:
+            return candidate if not candidate[1] else current
+        if upper:
+            return candidate if candidate[0] < current[0] else current
+        return candidate if candidate[0] > current[0] else current
+
+    @staticmethod
+    def _bound(bound, upper):
+
+        ''' Render a ``(value, inclusive)`` bound for ``ZRANGEBYSCORE``. '''
+
+        if bound is None:
+            return '+inf' if upper else '-inf'
+        return ('%r' if bound[1] else '(%r') % float(bound[0])
+
+    def _temporary(self, kind, operation, sources):
+
+        ''' Name the temporary result set for a plan step. Names
+            are stable, so later pages can reuse the result. '''
+
+        digest = hashlib.sha1('|'.join((operation,) + tuple(sources))).hexdigest()[:16]
+        return special.Separators.HASH_CHUNK.join((special.Prefixes.TIMELINE, kind, self._plan_marker, digest))
+
+    ## === Public Methods === ##
+    def plan(self, kind, filters=(), start=None, end=None, sort=None):
+
+        ''' Plan a query over ``kind``.
+
+            :param kind: Model kind name (``str``).
+
+            :param filters: Iterable of ``(property, operator, value)``
+            filters, where ``operator`` is one of ``==``, ``in``, ``>``,
+            ``>=``, ``<`` or ``<=`` (``value`` is a list for ``in``).
+
+            :param start: Exclusive lower time bound, in epoch seconds.
+
+            :param end: Exclusive upper time bound, in epoch seconds.
+
+            :param sort: Optional ``(property, descending)`` pair.
+
+            :returns: :py:class:`QueryPlan`, or ``None`` if the query
+            can't be served from indexes. '''
+
+        indexing = self.bus.engine.config.get('indexing', {})
+        spec = indexing.get('kinds', {}).get(kind)
+        if not (indexing.get('enabled', False) and spec):
+            return None
+
+        timeprop, scopes = spec.get('property', 'created'), spec.get('scopes', ())
+        if sort is not None and sort[0] != timeprop:
+            return None
+
+        low = (start, False) if start is not None else None
+        high = (end, False) if end is not None else None
+
+        groups = []
+        for prop, operator, value in filters:
+            if prop == timeprop and operator in self._ranges:
+                side, inclusive = self._ranges[operator]
+                if side:
+                    high = self._tighter(high, (value, inclusive), True)
+                else:
+                    low = self._tighter(low, (value, inclusive), False)
+            elif prop in scopes and operator == '==':
+                groups.append(('%s == %r' % (prop, value), [self.bus.engine._timeline_key(kind, (prop, value))]))
+            elif prop in scopes and operator == 'in':
+                groups.append(('%s IN %r' % (prop, list(value)), sorted(set((
+                    self.bus.engine._timeline_key(kind, (prop, item)) for item in value)))))
+            else:
+                return None
+
+        reverse = bool(sort and sort[1])
+        low, high = self._bound(low, False), self._bound(high, True)
+        if not groups:
+            return QueryPlan(kind, self.bus.engine._timeline_key(kind), [], low, high, reverse, [
+                'scan time index for %s' % kind])
+
+        # estimate selectivity: entries per group (an ``IN`` group is the sum of its indexes)
+        with self.bus.engine.Datastore.redis.channel(None).pipeline(transaction=False) as pipeline:
+            for label, keys in groups:
+                for key in keys:
+                    pipeline.zcard(key)
+            counts = iter(pipeline.execute())
+
+        estimates = [(sum((next(counts) for key in keys)), label, keys) for label, keys in groups]
+        estimates.sort(key=lambda estimate: estimate[0])
+
+        notes = ['filter %s (~%s entries)' % (label, count) for count, label, keys in estimates]
+        notes[0] += ', most selective'
+
+        # resolve each group to one sorted set (unions for ``IN``), then intersect, most selective first
+        steps, sources = [], []
+        for count, label, keys in estimates:
+            if len(keys) == 1:
+                sources.append(keys[0])
+            else:
+                destination = self._temporary(kind, 'union', keys)
+                steps.append(('union', destination, keys))
+                sources.append(destination)
+
+        if len(sources) > 1:
+            destination = self._temporary(kind, 'intersect', sources)
+            steps.append(('intersect', destination, sources))
+            source = destination
+        else:
+            source = sources[0]
+
+        return QueryPlan(kind, source, steps, low, high, reverse, notes, empty=(estimates[0][0] == 0))
+
+    def execute(self, plan, limit=0, offset=0, cursor=None):
+
+        ''' Run ``plan``, returning a page of matching IDs.
+
+            :param plan: :py:class:`QueryPlan` built by :py:meth:`plan`.
+
+            :param limit: Maximum count of IDs to return. Defaults
+            to ``0`` (no limit).
+
+            :param offset: Count of IDs to skip. Defaults to ``0``.
+
+            :param cursor: Cursor from a previous page, if any.
+
+            :returns: Tuple of ``(ids, cursor)``, like
+            :py:meth:`EventEngine.timeline`. '''
+
+        if plan.empty:
+            return [], None
+
+        if plan.steps:
+            channel = self.bus.engine.Datastore.redis.channel(None)
+
+            # later pages reuse the result set built for the first one, while it lasts
+            if not (cursor and channel.exists(plan.source)):
+                ttl = self.config.get('ttl', 30)
+                with channel.pipeline(transaction=False) as pipeline:
+                    for operation, destination, sources in plan.steps:
+                        if operation == 'union':
+                            pipeline.zunionstore(destination, sources, aggregate='MAX')
+                        else:
+                            pipeline.zinterstore(destination, sources, aggregate='MAX')
+                        pipeline.expire(destination, ttl)
+                    pipeline.execute()
+
+        return self.bus.engine._page(plan.source, plan.low, plan.high, limit, offset, cursor, plan.reverse)
@@ -21,7 +21,6 @@ from apptools import model
 
 # Protocol Suite
 from protocol import http
-from protocol import parameter
 
 # Event Models
 from api.models.tracker import event
@@ -191,82 +190,37 @@ class PolicyEngine(PlatformBridge):
             multiple :py:class:`Profile` descendents,
             starting with ``policy``.
 
+            Names, categories and converters are resolved
+            ahead of time, at class-construction time, into
+            a :py:class:`policy.core.MatchPlan` (available at
+            ``policy.plan``), so matching here is reduced to a
+            flat pass over the request.
+
             :param data:
             :param policy:
             :param legacy:
 
-            :raises InvalidParamName: In the case of
-            an invalid or empty parameter name.
-
-            :raises DuplicateParameterName: In the case
-            of a property name that occurred more than
-            once, which is not allowed.
-
             :raises StopIteration: When available parameter
             specs have been completely exhausted.
 
             :returns: Recursively yields matched parameter
             classes. '''
 
-        # initialize vars
-        paramset, artifacts, converters, _mappers = [], {}, {}, set()
-
-        # gather parameter artifacts and long-form identifiers
-        for prm in policy.parameters:
-            prefix = prm.config.get('category', '')  # grab category prefix
-            name = prm.config.get('name', False)
-
-            if name is False:  # default to using parameter full name
-                name = prm.name
-
-            if name in (None, False, '', [], set(), tuple(), frozenset()) or not isinstance(name, (
-                    basestring, list, set, tuple, frozenset)):
-
-                raise exceptions.InvalidParamName("Invalid property name for parameter '%s'."
-                                                  " Found name of type '%s'." % (parameter, type(name)))
-
-            if isinstance(name, (set, tuple, list, frozenset)):
-                if isinstance(name, (set, frozenset)):
-                    name = tuple(name)
-                name = name[0]  # start with first available name
-
-            # resolve value converter
-            if prm.basetype is not None:
-                if prm.basetype == basestring:
-                    converter = unicode
-                else:
-                    converter = prm.basetype
-            else:
-                converter = lambda x: x
-
-            if prm.mapper:
-                converter = (prm.mapper, converter)
+        plan = policy.plan
 
-            # http.DataSlot.PARAM == 1 (all special slots are >1)
-            # http.DataSlot.PATH == 0x5 (maximum, anything above this bound is invalid)
-            if isinstance(data, webob.Request) and prm.config.get('source', 0) > 1 < 0x5:
-
-                # it's an HTTP request with a special extractor. extract the value, yield with param and converter.
-                yield prm, converter, self._http_extractors[prm.config['source']](self, data, name)
-                continue  # advance parameter processing loop
-
-            # compute identifier
-            identifier = prm.config.get('separator', '').join([prefix, name]) if prefix else name
+        if isinstance(data, webob.Request):
 
-            # add to artifacts to look for
-            if name in artifacts:
-                if artifacts[name] is not prm:
-                    raise exceptions.DuplicateParameterName("Encountered more than one parameter with the name "
-                                                            "'%s' (violating property was '%s'." % (identifier, name))
+            # it's an HTTP request: extract special values, yield with param and converter.
+            for prm, converter, source, name in plan.special:
+                yield prm, converter, self._http_extractors[source](self, data, name)
 
-            artifacts[identifier], converters[identifier] = prm, converter  # add to artifacts, converters
+            # special HTTP stuff should be extracted by now, so it's okay to overwrite
+            # the request with params, a ``dict``-like object.
+            (artifacts, expected, aliases), data = plan.http, data.params
 
-        # special HTTP stuff should be extracted by now, so it's okay to overwrite
-        # the request with params, a ``dict``-like object.
-        if isinstance(data, webob.Request):
-            data = data.params
+        else:
+            artifacts, expected, aliases = plan.mapping
 
-        expected = set(artifacts.keys())  # properties are gathered, build lookup list
         parameters = set(data.keys())  # grab and freeze data parameters
 
         valid = expected & parameters  # match all valid parameters via set intersection
@@ -276,61 +230,47 @@ class PolicyEngine(PlatformBridge):
         _done = set()
         for i in valid:  # process valid parameters
             _done.add(i)
-            yield artifacts[i], converters[i], data[i]  # grab parameter, converter and value
+            prm, converter = artifacts[i]
+            yield prm, converter, data[i]  # grab parameter, converter and value
 
         # check for iterable names
-        for _id, prm_permutation in artifacts.iteritems():
-            if isinstance(prm_permutation.config.get('name', name), (set, tuple, list, frozenset)):
-                for next in prm_permutation.config.get('name', name):
-                    if next in _done:
-                        continue
-                    if next in parameters:
-                        _done.add(_id)
-                        valid.add(_id)
-                        if _id in no_value: no_value.remove(_id)
-                        if _id in no_schema: no_value.remove(_id)
-                        yield artifacts[_id], converters[_id], data[next]
+        for _id, names in aliases:
+            for next in names:
+                if next in _done:
+                    continue
+                if next in parameters:
+                    _done.add(_id)
+                    no_value.discard(_id)
+                    no_schema.discard(next)
+                    prm, converter = artifacts[_id]
+                    yield prm, converter, data[next]
 
         if no_value or no_schema:  # process invalid parameters, if any
 
             for i in no_value:
 
-                param = artifacts[i]  # grab parameter
+                param, context = plan.missing[i]  # grab parameter and prebuilt context
 
                 if param.basevalue is not None:
                     yield param, param.basetype, param.basevalue
-                else:
-
-                    if isinstance(param.config.get('name'), (list, set, frozenset, tuple)):
-                        prm_n = param.config.get('name')
-                        context = [
-                            "Expected property \"%s\" with primary name \"%s\" (and name options %s) was not found.",
-                            param.name,
-                            i,
-                            ', '.join(map(lambda s: '"%s"' % s, prm_n))
-                        ]
-
-                    else:
-                        context = ["Expected property \"%s\" (at name \"%s\") was not found.", param.name, i]
 
-                    # check if this is an enforced/required property
-                    if param.config.get('policy', parameter.ParameterPolicy.OPTIONAL) in (
-                            parameter.ParameterPolicy.REQUIRED, parameter.ParameterPolicy.ENFORCED):
-                        yield param, exceptions.MissingParameter, context
+                # check if this is an enforced/required property
+                elif i in plan.enforced:
+                    yield param, exceptions.MissingParameter, context
 
-                    else:
-                        # if it's not a strict field, don't except
-                        yield param, None, context
+                else:
+                    # if it's not a strict field, don't except
+                    yield param, None, context
 
             for i in no_schema:
                 if i == 'ref' and legacy:
                     continue  # special case: ``ref`` property
                 message = 'Received unexpected parameter "%s" with value "%s".'
-                yield param, exceptions.UnexpectedParameter, (message, i, data.get(i))
+                yield None, exceptions.UnexpectedParameter, (message, i, data.get(i))
 
         raise StopIteration()  # we're done here
 
-    def enforce(self, data, base_policy, legacy=False):
+    def enforce(self, data, base_policy, legacy=False, pipeline=None, raw=None, aggregate=True, multiplier=1):
 
         ''' Gather, build, enforce and map policy for the
             given :py:class:`model.tracker.Tracker` and
@@ -342,9 +282,22 @@ class PolicyEngine(PlatformBridge):
 
             :param legacy: Mark this as a legacy hit.
 
-            :raises InvalidParamName: In the case of a property name
-            (that should be a string) with an invalid type, will *always*
-            raise.
+            :param pipeline: Existing pipeline to queue this hit's
+            writes and publishes onto, so a batch of hits can share
+            one round-trip. Defaults to ``None``, for a new pipeline.
+
+            :param raw: Existing, already-persisted :py:class:`raw.Event`
+            for this hit, as in split ingestion (see :py:class:`WorkQueue`).
+            Defaults to ``None``, to build and persist a new one.
+
+            :param aggregate: Flag indicating that aggregations should
+            be written for this hit. Defaults to ``True``; skipped for
+            hits degraded by :py:class:`AdmissionController`.
+
+            :param multiplier: Sampling multiplier for this hit (see
+            :py:meth:`AdmissionController.sample`), which scales its
+            aggregation increments. Defaults to ``1``. Ignored if
+            ``raw`` is passed, in favor of the multiplier it carries.
 
             :raises MissingParameter: In the case of a parameter that is
             expected to exist (*ParameterPolicy.REQUIRED* or even
@@ -365,12 +318,19 @@ class PolicyEngine(PlatformBridge):
             applies properly, and the ``raw`` event and ``tracker``
             associated with it, in the form of: ``tuple(<raw>, <tracker>, <event>)``. '''
 
-        # resolve tracker, build raw event
-        raw, pipe = self.bus.event.raw(data, policy=base_policy, legacy=legacy)
-        tracker = self.bus.resolve(raw, base_policy, legacy)
+        if raw is None:
+
+            # resolve tracker, build raw event
+            raw, pipe = self.bus.event.raw(data, policy=base_policy, legacy=legacy, pipeline=pipeline)
+            raw.multiplier = multiplier
+            tracker = self.bus.resolve(raw, base_policy, legacy)
 
-        # persist raw entity
-        rkey, pipe = self.bus.engine.persist(raw, pipeline=pipe)
+            # persist raw entity
+            rkey, pipe = self.bus.engine.persist(raw, pipeline=pipe)
+
+        else:
+            tracker, pipe = self.bus.resolve(raw, base_policy, legacy), pipeline
+            multiplier = raw.multiplier or 1
 
         # by this point, raw event has already been ``put`` and ``published``. start building tracked event.
         ev = event.TrackedEvent(**{
@@ -380,8 +340,9 @@ class PolicyEngine(PlatformBridge):
             'warnings': [],
             'errors': [],
             'profile': base_policy.__definition__,
+            'multiplier': multiplier,
             'modified': datetime.datetime.now(),
-            'created': datetime.datetime.now()
+            'created': raw.timestamp or datetime.datetime.now()  # time of the hit, even if enforced later
         })
 
         # first, process parameters
@@ -455,53 +416,75 @@ class PolicyEngine(PlatformBridge):
             keys = (raw.key.urlsafe(), ev.key.urlsafe())
             self.logging.error('Marking RAW and FULL events as errors, committing at keys "%s" and "%s".' % keys)
 
-            try:
-                raw.put()
-            except:
-                self.logging.critical('Critical persistence failure for raw event at key: "%s"' % raw.key)
-                self.logging.critical('Event<%s>' % str(raw))
-                self.logging.critical('Data<%s>' % str(data))
+            saved = False
+            if self.bus.spool.tripped:
+
+                # datastore is down: don't block on writes that are bound to fail
+                self.logging.critical('Datastore unavailable, skipping persistence for error events at keys "%s" and "%s".' % keys)
+
             else:
-                self.logging.info('RAW event saved successfully.')
-                self.logging.info('Publishing RAW event as error.')
 
-                # publish RAW event
+                # save raw, publish it as an error and save tracked, in one round-trip where possible
                 try:
-                    self.bus.stream.publish(raw, error=True, execute=True, pipeline=False, propagate=True)
-                except:
-                    self.logging.critical('Failed to publush RAW error event.')
-                else:
-                    self.logging.info('RAW error event published.')
-
-                    # if RAW event was saved and published, attempt to save FULL event
-                    try:
+                    batch = self.bus.engine.pipeline()
+                    if batch is None:
+                        raw.put()
+                        self.bus.stream.publish(raw, error=True, execute=True, pipeline=False, propagate=True)
                         ev.put()
-                    except:
-                        self.logging.error('Failed to persist FULL event at key: "%s".' % ev.key)
-                        self.logging.error('TrackedEvent<%s>' % ev)
                     else:
-                        self.logging.info('FULL event saved successfully.')
-
-                raise  # re-raise
+                        rkey, batch = self.bus.engine.persist(raw, pipeline=batch)
+                        batch = self.bus.stream.publish(raw, error=True, execute=False, pipeline=batch, propagate=True)
+                        evkey, batch = self.bus.engine.persist(ev, pipeline=batch)
+                        self.bus.engine.execute(batch)
+                except:
+                    self.logging.critical('Critical persistence failure for error events at keys: "%s" and "%s"' % keys)
+                    self.logging.critical('Event<%s>' % str(raw))
+                    self.logging.critical('TrackedEvent<%s>' % ev)
+                    self.logging.critical('Data<%s>' % str(data))
+                else:
+                    saved = True
+                    self.logging.info('RAW and FULL error events saved, RAW error event published.')
 
-            # if we're in strict mode, re-raise errors
-            if self.config.get('strict', True):
-                raise  # re-raise
+            # if events were saved, or we're in strict mode, re-raise errors
+            if saved or self.config.get('strict', True):
+                raise e
 
         else:
 
             # everything worked I guess! copy over parameters.
             ev.params = data_parameters
 
-            # calculate aggregation specs
-            ev.aggregations = []
-            for aggr_policy in base_policy.aggregations:
-                for delta, spec in aggr_policy.build(base_policy, ev):
-                    for subspec in spec:
+            # calculate aggregation specs (unless degraded by admission control)
+            ev.aggregations, increments = [], []
+            scripted = self.bus.engine.config.get('scripting', {}).get('enabled', False)
+            rollup = self.bus.rollup.enabled
+            plan = base_policy.aggregation_plan.build(ev, detail=True) if aggregate else ()
+            for delta, spec, details in plan:
+                delta *= multiplier  # a sampled-in hit stands for ``multiplier`` hits
+                ev.aggregations.extend(self.bus.codec.encode(s) for s in spec)  # the event records every bucket
+
+                # in rollup mode, only write finest-grain buckets - coarser ones are derived later
+                if rollup:
+                    writes, pipe = self.bus.rollup.select(spec, details, pipe)
+                else:
+                    writes = zip(spec, details)
+
+                for subspec, (interval, infix, count) in writes:
+
+                    # compact the bucket name, then spread hot buckets across shards, if enabled
+                    bucket = self.bus.engine.shard(self.bus.codec.encode(subspec), count)
+
+                    # write each aggregation increment, coalescing via the counter buffer if enabled
+                    if self.bus.buffer.enabled:
+                        self.bus.buffer.increment(bucket, delta)
+                    elif scripted:
+                        increments.append((bucket, delta))
+                    else:
+                        pipe = self.bus.engine.increment(bucket, delta, pipe)
 
-                        # write each aggregation increment
-                        pipe = self.bus.engine.increment(subspec, delta, pipe)
-                        ev.aggregations.append(subspec)
+            # apply all of this event's increments in one scripted call
+            if increments:
+                pipe = self.bus.engine.increment_multi(increments, pipe)
 
             # calculate attribution specs
             #for spec in base_policy.attributions:
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`WorkQueue` class splits hit ingestion in two:
+web workers persist raw events and queue them, and a pool of
+enforcement workers (on any node) runs policy enforcement and
+aggregation for them, in batches.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import time
+import socket
+
+# webapp2
+import webapp2
+
+# apptools
+from apptools import model
+
+# Policy
+from policy import core
+from policy import base
+
+# Raw Models
+from api.models.tracker import raw
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# detect redis support
+try:
+    from redis import exceptions; _REDIS = True
+except ImportError:
+    _REDIS = False
+
+# detect gevent support
+try:
+    import gevent; _GEVENT = True
+except ImportError:
+    _GEVENT = False
+
+
+# Lua: atomically moves up to ``count`` queued items onto a worker's claim list, returning them.
+# KEYS: queue key, claim list key. ARGV: count.
+_CLAIM_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+
+## WorkQueue - split ingestion via a queue of raw events awaiting enforcement.
+class WorkQueue(PlatformBridge):
+
+    ''' Split ingestion mode. When enabled, hits only build and
+        persist a :py:class:`raw.Event` and push its ID onto a
+        queue in Redis (see :py:meth:`submit`). Enforcement workers
+        (see :py:meth:`run`) claim queued events in batches, run
+        :py:meth:`PolicyEngine.enforce` and aggregation for each,
+        and mark them ``processed``. Each batch is written in one
+        pipeline.
+
+        Claimed events move to a per-worker claim list until their
+        batch is written, so a worker that dies mid-batch picks its
+        batch back up when restarted under the same name. Events
+        that fail enforcement outright are moved to a failed list,
+        for inspection and replay.
+
+        Workers rebuild each hit from the raw event's URL, method
+        and cookie, so other request headers aren't available to
+        policies enforced this way. '''
+
+    _config_path = 'tracker.queue.WorkQueue'
+
+    _queue_key = '__queue:enforce__'  # list of raw event IDs awaiting enforcement
+    _claim_key = '__queue:enforce:claimed__'  # prefix for per-worker lists of claimed raw event IDs
+    _failed_key = '__queue:enforce:failed__'  # list of raw event IDs that failed enforcement
+
+    _claim_sha = None  # SHA of the loaded claim script
+
+    ## === Internal Methods === ##
+    def _channel(self):
+
+        ''' Acquire a low-level Redis channel for queue access. '''
+
+        return self.bus.engine.Datastore.redis.channel(None)
+
+    def _claimed(self, worker):
+
+        ''' Name the claim list for ``worker``. '''
+
+        return self.bus.engine._magic_separator.join((self._claim_key, worker))
+
+    def _claim(self, worker, count):
+
+        ''' Atomically claim up to ``count`` queued raw event IDs
+            for ``worker``, reloading the claim script if the
+            server has lost it (``NOSCRIPT``).
+
+            :returns: ``list`` of claimed raw event IDs. '''
+
+        channel = self._channel()
+        if self._claim_sha is None:
+            self._claim_sha = channel.script_load(_CLAIM_SCRIPT)
+
+        try:
+            return channel.evalsha(self._claim_sha, 2, self._queue_key, self._claimed(worker), count)
+        except exceptions.ResponseError as e:
+            if not self.bus.engine._noscript(e):
+                raise
+            self._claim_sha = channel.script_load(_CLAIM_SCRIPT)
+            return channel.evalsha(self._claim_sha, 2, self._queue_key, self._claimed(worker), count)
+
+    @staticmethod
+    def _policy(definition):
+
+        ''' Resolve a profile by its ``__definition__`` path, as
+            recorded on :py:class:`raw.Event` at ``policy``.
+
+            :raises LookupError: If no such profile is registered.
+
+            :returns: Matching :py:class:`Profile` descendent. '''
+
+        if not definition:
+            return base.EventProfile
+
+        path, name = definition.rsplit('.', 1)
+        profile = core.Profile.registry.get((path, name))
+        if profile is None:
+            raise LookupError('Unknown policy "%s".' % definition)
+        return profile
+
+    @staticmethod
+    def _sleep(seconds):
+
+        ''' Yield for ``seconds``, cooperatively if possible. '''
+
+        if _GEVENT:
+            gevent.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether split ingestion is enabled. Requires Redis.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return _REDIS and self.config.get('enabled', False)
+
+    ## === Public Methods === ##
+    def submit(self, request, policy, legacy=False, multiplier=1):
+
+        ''' Ingest a hit in split mode: build and persist its
+            :py:class:`raw.Event` and queue it for enforcement,
+            in one round-trip.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit.
+
+            :param multiplier: Sampling multiplier for the hit,
+            kept on the raw event for enforcement.
+
+            :returns: Tupled ``(raw, None)``, as there is no
+            tracked event yet. '''
+
+        raw_ev, pipe = self.bus.event.raw(request, policy=policy, legacy=legacy, pipeline=self.bus.engine.pipeline())
+        raw_ev.multiplier = multiplier
+        rkey, pipe = self.bus.engine.persist(raw_ev, pipeline=pipe)
+        pipe.rpush(self._queue_key, raw_ev.key.id)
+        self.bus.engine.execute(pipe)
+        return raw_ev, None
+
+    def process(self, raw_ev, pipeline):
+
+        ''' Run enforcement and aggregation for a queued (or
+            journaled, see :py:class:`Spool`) raw event, queueing
+            all writes onto ``pipeline``.
+
+            :param raw_ev: Persisted :py:class:`raw.Event`.
+
+            :param pipeline: Pipeline to queue writes onto.
+
+            :returns: ``pipeline``. '''
+
+        headers = {}
+        if raw_ev.cookie:
+            headers['Cookie'] = '%s=%s' % (base._DEFAULT_COOKIE_NAME, raw_ev.cookie)
+        request = webapp2.Request.blank(raw_ev.url, headers=headers, environ={'REQUEST_METHOD': raw_ev.method or 'GET'})
+
+        raw_ev, tracker, event, pipe = self.bus.policy.enforce(*(
+            request,
+            self._policy(raw_ev.policy)), legacy=raw_ev.legacy, pipeline=pipeline, raw=raw_ev)
+
+        evkey, pipe = self.bus.engine.persist(event, pipeline=pipe)
+        pipe = self.bus.stream.publish(evkey, execute=False, pipeline=pipe, propagate=True)
+
+        raw_ev.processed = True
+        rkey, pipe = self.bus.engine.persist(raw_ev, pipeline=pipe)
+        return pipe
+
+    def work(self, worker, count=None):
+
+        ''' Claim and process one batch of queued raw events.
+
+            :param worker: Name of this worker (``str``), which
+            identifies its claim list.
+
+            :param count: Batch size. Defaults to the ``batch``
+            config option.
+
+            :returns: Count of raw events claimed. '''
+
+        engine = self.bus.engine
+        ids = self._claim(worker, count or self.config.get('batch', 100))
+        if not ids:
+            return 0
+
+        pipe, failed = engine.pipeline(), []
+        for identifier, raw_ev in zip(ids, engine.get_entities(raw.Event, [model.Key(raw.Event, i) for i in ids])):
+
+            if raw_ev is None:
+                self.logging.warning('Queued raw event "%s" could not be found. Skipping.' % identifier)
+                continue
+
+            if raw_ev.processed:
+                continue  # already enforced, i.e. by a worker that died before clearing its claims
+
+            mark = engine.mark(pipe)
+            try:
+                pipe = self.process(raw_ev, pipe)
+            except Exception as e:
+                engine.rollback(pipe, mark)
+                failed.append(identifier)
+                context = (identifier, e.__class__.__name__, str(e))
+                self.logging.error('Failed to enforce queued raw event "%s": %s("%s").' % context)
+
+        # write the batch, and clear its claims, in one round-trip
+        if failed:
+            pipe.rpush(self._failed_key, *failed)
+        pipe.delete(self._claimed(worker))
+        engine.execute(pipe)
+        return len(ids)
+
+    def recover(self, worker):
+
+        ''' Return raw events claimed by a previous run of
+            ``worker`` (that never finished its batch) to the
+            head of the queue.
+
+            :param worker: Name of the worker to recover.
+
+            :returns: Count of raw events recovered. '''
+
+        channel, recovered = self._channel(), 0
+        while channel.rpoplpush(self._claimed(worker), self._queue_key) is not None:
+            recovered += 1
+
+        if recovered:
+            self.logging.warning('Recovered %s unfinished raw event(s) claimed by worker "%s".' % (recovered, worker))
+        return recovered
+
+    def run(self, worker=None):
+
+        ''' Run an enforcement worker, forever. Batches are
+            claimed back-to-back, waiting ``pause`` seconds between
+            batches (to throttle enforcement) and ``idle`` seconds
+            when the queue is empty.
+
+            :param worker: Name of this worker. Names should be
+            unique and stable across restarts. Defaults to the
+            hostname.
+
+            :returns: Nothing, loops forever. '''
+
+        worker = worker or socket.gethostname()
+        self.recover(worker)
+        self.logging.info('Enforcement worker "%s" started.' % worker)
+
+        while True:
+            try:
+                count = self.work(worker)
+            except Exception as e:
+                count, context = 0, (worker, e.__class__.__name__, str(e))
+                self.logging.error('Enforcement worker "%s" failed: %s("%s"). Retrying.' % context)
+                try:
+                    self.recover(worker)  # put the failed batch back, so it's retried
+                except Exception:
+                    pass  # still failing - claims stay put until the next recovery
+
+            if not count:
+                self._sleep(self.config.get('idle', 0.5))
+            elif self.config.get('pause', 0):
+                self._sleep(self.config['pause'])
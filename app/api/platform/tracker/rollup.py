@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`RollupEngine` class lets hits write only
+finest-grain (hour or day) aggregation buckets, and folds
+closed windows into coarser buckets in the background.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import time
+import datetime
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# Protocol
+from protocol import special
+from protocol import timedelta
+from protocol import timewindow
+
+# detect gevent support
+try:
+    import gevent; _GEVENT = True
+except ImportError:
+    _GEVENT = False
+
+
+## RollupEngine - derives coarse aggregation windows from fine ones.
+class RollupEngine(PlatformBridge):
+
+    ''' Rollup mode for aggregation counters. When enabled, an
+        aggregation that includes the configured ``grain`` interval
+        only writes buckets at that grain (and finer). Coarser
+        buckets are derived: every write to a grain bucket registers
+        it in a pending sorted set, scored by the end of its window
+        (and in a pending set per coarse bucket it rolls up into),
+        and :py:meth:`run` folds closed windows into every coarser
+        bucket. Each rollup applies only the amount written since
+        the last one (tracked in a per-window "rolled" counter, kept
+        for ``retention`` seconds), so late writes - like replayed or
+        queued hits - are rolled up exactly once, too.
+
+        Readers use :py:meth:`combine` (via
+        :py:meth:`EventEngine.get_counters`) to add the unrolled part
+        of pending windows on top of rolled-up values, so results stay
+        complete. Bucket
+        names are unchanged, and pending members always hold plain
+        names - they're passed through :py:class:`KeyCodec` on the
+        way to and from the engine. '''
+
+    _config_path = 'tracker.rollup.RollupEngine'
+
+    _pending_key = '__rollup:pending__'  # sorted set of grain buckets awaiting rollup, by window end
+    _target_key = '__rollup:pending:%s__'  # set of pending members awaiting rollup, by coarse bucket
+    _rolled_key = '__rollup:rolled:%s__'  # amount of a grain bucket already rolled up, by pending member
+    _member_separator = '|'  # separates rolled intervals from the grain bucket in pending members
+
+    _grains = {
+        'hour': timedelta.TimeWindow.ONE_HOUR,
+        'day': timedelta.TimeWindow.ONE_DAY
+    }
+
+    _parsed = None  # pending member => (grain bucket, coarse buckets)
+    _timer = None  # background rollup greenlet, if running
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`RollupEngine`.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(RollupEngine, self).__init__(bus)
+        self._parsed = {}
+
+    ## === Internal Methods === ##
+    def _loop(self):
+
+        ''' Rollup loop, run in a dedicated greenlet while
+            rollup mode is enabled.
+
+            :returns: Nothing, loops forever. '''
+
+        while True:
+            gevent.sleep(self.config.get('interval', 30))
+            try:
+                self.run()
+            except Exception as e:
+                context = (e.__class__.__name__, str(e))
+                self.logging.error('Aggregation rollup failed: %s("%s"). Retrying next run.' % context)
+
+    def _parse(self, member):
+
+        ''' Decode a pending ``member`` into its grain bucket and
+            the coarse buckets that bucket rolls up into.
+
+            :param member: Pending member, as written by :py:meth:`select`.
+
+            :returns: Tuple of ``(grain bucket, coarse buckets)``. '''
+
+        if member not in self._parsed:
+            intervals, bucket = member.split(self._member_separator, 1)
+            chunks = bucket.split(special.Separators.HASH_CHUNK)
+            base, interval, window = special.Separators.HASH_CHUNK.join(chunks[:-2]), int(chunks[-2]), chunks[-1]
+            stamp = datetime.datetime.fromtimestamp(timewindow.bounds(interval, window)[0])
+
+            if len(self._parsed) >= self.config.get('cache', 4096):
+                self._parsed.clear()
+
+            self._parsed[member] = bucket, tuple((special.Separators.HASH_CHUNK.join((
+                base, str(target), timewindow.identifier(target, stamp, cache=False))) for (
+                    target) in map(int, intervals.split(','))))
+
+        return self._parsed[member]
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether rollup mode is enabled in config.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    @property
+    def grain(self):
+
+        ''' Interval that hits write directly, from the ``grain``
+            config option (``hour`` or ``day``).
+
+            :returns: Interval enumerated at :py:class:`timedelta.TimeWindow`. '''
+
+        return self._grains[self.config.get('grain', 'hour')]
+
+    ## === Public Methods === ##
+    def select(self, specs, details, pipeline=None):
+
+        ''' Select which of an aggregation's bucket ``specs``
+            a hit should write, registering the grain bucket for
+            rollup into the rest (on every write, so that writes
+            after a rollup are rolled up again).
+
+            :param specs: Bucket specs for one aggregation, as
+            yielded by :py:meth:`AggregationPlan.build`.
+
+            :param details: Matching ``(interval, infix, shards)``
+            details for each spec.
+
+            :param pipeline: Existing pipeline to queue tracking
+            writes onto. Defaults to ``None``.
+
+            :returns: Tuple of ``(writes, pipeline)``, where ``writes``
+            is a list of ``(spec, detail)`` pairs to write directly. '''
+
+        pairs = zip(specs, details)
+        grain = self.grain
+        if grain not in (detail[0] for detail in details):
+            return pairs, pipeline  # nothing to derive from
+
+        level = timewindow.resolve(grain)[0]
+        writes, rolled, source = [], [], None
+        for spec, detail in pairs:
+            if detail[0] == grain:
+                source = spec
+            if timewindow.resolve(detail[0])[0] > level:
+                rolled.append(str(detail[0]))
+            else:
+                writes.append((spec, detail))
+
+        if not rolled:
+            return pairs, pipeline
+
+        # register the grain bucket, scored by the end of its window
+        member = self._member_separator.join((','.join(rolled), source))
+        score = timewindow.bounds(grain, source.rsplit(special.Separators.HASH_CHUNK, 1)[-1])[1]
+        target = pipeline if pipeline is not None else self.bus.engine.Datastore.redis.channel(None)
+        target.execute_command('ZADD', self._pending_key, score, member)
+        for bucket in self._parse(member)[1]:
+            target.sadd(self._target_key % bucket, member)
+
+        # lazily start the rollup greenlet
+        if _GEVENT and self._timer is None:
+            self._timer = gevent.spawn(self._loop)
+
+        return writes, pipeline
+
+    def run(self):
+
+        ''' Fold closed grain windows into their coarse buckets.
+            Windows are rolled up ``delay`` seconds after they
+            close, at most ``batch`` at a time. Each registration
+            is applied once, guarded by its pending member, and
+            only adds what was written since the last rollup.
+
+            :returns: Count of windows rolled up. '''
+
+        channel = self.bus.engine.Datastore.redis.channel(None)
+        members = channel.zrangebyscore(*(
+            self._pending_key,
+            '-inf',
+            time.time() - self.config.get('delay', 60)), start=0, num=self.config.get('batch', 500))
+
+        if not members:
+            return 0
+
+        engine, encode, retention = self.bus.engine, self.bus.codec.encode, self.config.get('retention', 35 * 86400)
+        parsed = [self._parse(member) for member in members]
+        located = engine.locate([encode(source) for source, targets in parsed])
+
+        # read and roll each window in one script call, so writes can't slip in between
+        pipeline = channel.pipeline(transaction=False)
+        for member, (source, targets), sources in zip(members, parsed, located):
+            destinations = [locations[0] for locations in engine.locate(map(encode, targets), sharded=False)]
+            locations = sources + destinations
+
+            keys = [self._pending_key, self._rolled_key % member] + [key for key, field in locations]
+            keys.extend((self._target_key % target for target in targets))
+            args = [member, retention, len(sources), len(destinations)] + [field for key, field in locations]
+            pipeline = engine._evaluate('rollup', keys, args, pipeline)
+            self._parsed.pop(member, None)
+
+        engine.execute(pipeline)
+        return len(members)
+
+    def combine(self, buckets, values):
+
+        ''' Add the unrolled part of pending grain windows to
+            the values read for coarse ``buckets``.
+
+            :param buckets: ``list`` of logical bucket names,
+            encoded or not.
+
+            :param values: ``list`` of values read for ``buckets``.
+
+            :returns: ``list`` of combined values, in input order. '''
+
+        requested = {}
+        for index, bucket in enumerate(buckets):
+            requested.setdefault(self.bus.codec.decode(bucket), []).append(index)
+
+        # look up pending windows for the requested buckets only
+        with self.bus.engine.Datastore.redis.channel(None).pipeline(transaction=False) as pipeline:
+            for bucket in requested:
+                pipeline.smembers(self._target_key % bucket)
+            pending = pipeline.execute()
+
+        matches = {}
+        for bucket, members in zip(requested, pending):
+            for member in members:
+                matches.setdefault(member, []).extend(requested[bucket])
+
+        if not matches:
+            return values
+        members, hits = zip(*matches.iteritems())
+
+        engine, values = self.bus.engine, list(values)
+        sources = [self.bus.codec.encode(self._parse(member)[0]) for member in members]
+        current = engine.get_counters(sources, rollup=False)
+        rolled = engine.Datastore.redis.channel(None).mget([self._rolled_key % member for member in members])
+
+        for value, done, matched in zip(current, rolled, hits):
+            value = (engine._sum((value,)) or 0) - (engine._sum((done,)) or 0)
+            if value <= 0:
+                continue
+            for index in matched:
+                values[index] = engine._sum((values[index], value))
+        return values
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+'''
+The :py:class:`Spool` class keeps hits from being dropped
+while Redis is unavailable: a circuit breaker trips on
+datastore outages, hits are journaled to local disk while
+it's open, and journals are replayed once Redis recovers.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+# stdlib
+import os
+import json
+import time
+import errno
+import socket
+import datetime
+
+# apptools
+from apptools import model
+
+# Raw Models
+from api.models.tracker import raw
+
+# Platform Parent
+from api.platform import PlatformBridge
+
+# detect redis support
+try:
+    from redis import exceptions; _REDIS = True
+except ImportError:
+    _REDIS = False
+
+# detect gevent support
+try:
+    import gevent; _GEVENT = True
+except ImportError:
+    _GEVENT = False
+
+
+# Globals
+_OUTAGES = (socket.error,)  # errors that indicate the datastore is unavailable
+if _REDIS:
+    _OUTAGES += (exceptions.ConnectionError, getattr(exceptions, 'TimeoutError', exceptions.ConnectionError))
+
+
+## Spool - circuit breaker and local journal for datastore outages.
+class Spool(PlatformBridge):
+
+    ''' Circuit breaker around :py:class:`EventEngine`, with a
+        local journal for hits received while it's open.
+
+        The breaker trips after ``threshold`` consecutive outage
+        errors (connection failures and timeouts, as reported by
+        :py:meth:`EventEngine.execute`). While it's tripped, hits
+        skip Redis entirely and are appended to a journal on local
+        disk (see :py:meth:`append`) - one JSON record per line,
+        ``fsync``-ed in batches, in segments rotated by size. After
+        ``cooldown`` seconds, hits are let through again, and the
+        first success closes the breaker.
+
+        A background replayer (started with the bridge, so segments
+        left by earlier processes are picked up without waiting for a
+        new outage) probes Redis while the breaker is tripped, and drains
+        closed segments once it recovers, enforcing ``batch`` hits
+        per pipeline. Replay is at-least-once: a segment interrupted
+        mid-replay resumes at its last written batch. '''
+
+    _config_path = 'tracker.spool.Spool'
+
+    _active = '.open'  # suffix for the segment being written by a process
+    _closed = '.journal'  # suffix for segments ready for replay
+    _claimed = '.replay-'  # suffix prefix for segments claimed for replay, by PID
+
+    _failures = 0  # consecutive outage errors
+    _opened = None  # time the breaker last tripped, if tripped
+    _handle = None  # active segment file, if open
+    _unsynced = 0  # records written since the last ``fsync``
+    _synced = 0  # time of the last ``fsync``
+    _timer = None  # background replayer greenlet, if running
+    _sequence = 0  # segments opened by this process
+
+    def __init__(self, bus=None):
+
+        ''' Initialize this :py:class:`Spool`, starting the
+            replayer if the journal is enabled.
+
+            :param bus: Parent ``Platform``.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        super(Spool, self).__init__(bus)
+        if self.enabled:
+            self._start()
+
+    ## === Internal Methods === ##
+    def _start(self):
+
+        ''' Start the replayer greenlet, if it isn't running. '''
+
+        if _GEVENT and self._timer is None:
+            self._timer = gevent.spawn(self._loop)
+
+    def _directory(self):
+
+        ''' Resolve (and create, if needed) the journal directory. '''
+
+        path = self.config.get('path', '/ns/runtime/spool/tracker')
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        return path
+
+    def _open(self):
+
+        ''' Open a new active segment for this process. '''
+
+        self._sequence += 1
+        name = 'segment-%s-%s-%s' % (os.getpid(), int(time.time() * 1000), self._sequence)
+        self._handle = open(os.path.join(self._directory(), name + self._active), 'a')
+        self._unsynced, self._synced = 0, time.time()
+        return self._handle
+
+    def _rotate(self):
+
+        ''' Close the active segment, if it holds any records,
+            making it available for replay. '''
+
+        if self._handle is None:
+            return
+        handle, self._handle = self._handle, None
+
+        self._sync(handle)
+        handle.close()
+        if os.path.getsize(handle.name):
+            os.rename(handle.name, handle.name[:-len(self._active)] + self._closed)
+        else:
+            os.remove(handle.name)
+
+    def _sync(self, handle=None):
+
+        ''' Flush and ``fsync`` the active segment. '''
+
+        handle = handle or self._handle
+        if handle is not None and self._unsynced:
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._unsynced, self._synced = 0, time.time()
+
+    @staticmethod
+    def _alive(pid):
+
+        ''' Check whether the process at ``pid`` is alive. '''
+
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+        return True
+
+    def _segments(self):
+
+        ''' Claim every segment ready for replay: closed ones,
+            plus those left active or mid-replay by processes
+            that have died.
+
+            :returns: ``list`` of claimed segment paths, oldest first. '''
+
+        directory, claimed, mine = self._directory(), [], self._claimed + str(os.getpid())
+        for name in sorted(os.listdir(directory), key=lambda name: map(int, name.split('.')[0].split('-')[2:])):
+            base, suffix = name.split('.', 1)
+            suffix = '.' + suffix
+
+            if suffix == self._closed:
+                pass
+            elif suffix == self._active and not self._alive(int(base.split('-')[1])):
+                pass
+            elif suffix.startswith(self._claimed) and (suffix == mine or (
+                    not self._alive(int(suffix[len(self._claimed):])))):
+                pass
+            else:
+                continue
+
+            # claim by renaming - only one process wins
+            path = os.path.join(directory, base + mine)
+            try:
+                os.rename(os.path.join(directory, name), path)
+            except OSError:
+                continue
+            claimed.append(path)
+        return claimed
+
+    def _inflate(self, record):
+
+        ''' Rebuild a journaled hit's :py:class:`raw.Event`. '''
+
+        return raw.Event(**{
+            'key': model.Key(raw.Event, record['id']),
+            'policy': record['policy'],
+            'legacy': record['legacy'],
+            'url': record['url'],
+            'method': record['method'],
+            'cookie': record['cookie'],
+            'timestamp': datetime.datetime.fromtimestamp(record['timestamp']),
+            'multiplier': record.get('multiplier', 1)
+        })
+
+    def _drain(self, path):
+
+        ''' Replay the journaled hits in segment ``path``, in
+            batches, then remove it. If Redis fails mid-replay,
+            unreplayed hits are written back as a closed segment.
+
+            :returns: Count of hits replayed. '''
+
+        engine, batch, replayed = self.bus.engine, self.config.get('batch', 200), 0
+        with open(path) as segment:
+            lines = [line for line in segment if line.strip()]
+
+        for offset in xrange(0, len(lines), batch):
+            pipe, count = engine.pipeline(), 0
+            for line in lines[offset:offset + batch]:
+                mark = engine.mark(pipe)
+                try:
+                    pipe = self.bus.queue.process(self._inflate(json.loads(line)), pipe)
+                    count += 1
+                except _OUTAGES:
+                    raise
+                except Exception as e:
+                    engine.rollback(pipe, mark)
+                    context = (e.__class__.__name__, str(e), line.strip())
+                    self.logging.critical('Dropping journaled hit that failed replay: %s("%s"). Record: %s' % context)
+
+            try:
+                engine.execute(pipe)
+            except _OUTAGES:
+
+                # put the rest back for the next replay
+                remainder = path[:path.rindex(self._claimed)] + self._closed
+                with open(remainder + '.tmp', 'w') as segment:
+                    segment.writelines(lines[offset:])
+                    segment.flush()
+                    os.fsync(segment.fileno())
+                os.rename(remainder + '.tmp', remainder)
+                os.remove(path)
+                raise
+
+            replayed += count
+
+        os.remove(path)
+        return replayed
+
+    def _loop(self):
+
+        ''' Replayer loop, run in a dedicated greenlet from
+            bridge initialization (or the first journaled hit).
+
+            :returns: Nothing, loops forever. '''
+
+        last = 0
+        while True:
+            gevent.sleep(self.config.get('sync', {}).get('interval', 1.0))
+            try:
+                self._sync()
+                if time.time() - last >= self.config.get('interval', 5):
+                    last = time.time()
+                    self.replay()
+            except Exception as e:
+                context = (e.__class__.__name__, str(e))
+                self.logging.error('Journal replay failed: %s("%s"). Retrying next run.' % context)
+
+    ## === Properties === ##
+    @property
+    def enabled(self):
+
+        ''' Whether the breaker and journal are enabled.
+
+            :returns: ``bool`` flag, defaulting to ``False``. '''
+
+        return self.config.get('enabled', False)
+
+    @property
+    def outages(self):
+
+        ''' Exception classes that indicate a datastore outage. '''
+
+        return _OUTAGES
+
+    @property
+    def tripped(self):
+
+        ''' Whether the breaker is open: hits should be journaled
+            instead of written to Redis.
+
+            :returns: ``bool`` flag. '''
+
+        return self.enabled and self._opened is not None and (
+            time.time() - self._opened < self.config.get('cooldown', 10))
+
+    ## === Public Methods === ##
+    def success(self):
+
+        ''' Record a successful datastore operation, closing
+            the breaker if it was open. '''
+
+        if self._opened is not None:
+            self.logging.info('Datastore recovered. Closing circuit breaker.')
+        self._failures, self._opened = 0, None
+
+    def failure(self, error):
+
+        ''' Record a failed datastore operation, tripping the
+            breaker if it's an outage and there have been
+            ``threshold`` of them in a row.
+
+            :param error: Exception raised by the operation.
+
+            :returns: ``bool`` indicating whether ``error`` was
+            an outage. '''
+
+        if not isinstance(error, _OUTAGES):
+            return False
+
+        self._failures += 1
+        if self.enabled and self._failures >= self.config.get('threshold', 5):
+            if not self.tripped:
+                context = (self._failures, error.__class__.__name__, str(error))
+                self.logging.critical('Tripping circuit breaker after %s datastore failures: %s("%s").' % context)
+            self._opened = time.time()
+        return True
+
+    def append(self, request, policy, legacy=False, multiplier=1):
+
+        ''' Journal a hit to local disk, to be replayed once
+            the datastore recovers.
+
+            :param request: Current :py:class:`webapp2.Request`.
+
+            :param policy: Matched :py:class:`EventProfile`
+            descendent for the hit.
+
+            :param legacy: Flag indicating a legacy hit.
+
+            :param multiplier: Sampling multiplier for the hit.
+
+            :returns: Tupled ``(raw, None)``, as there is no
+            tracked event yet. '''
+
+        raw_ev = raw.Event.inflate(request, policy, legacy)
+        raw_ev.multiplier = multiplier
+        handle = self._handle or self._open()
+        handle.write(json.dumps({
+            'id': raw_ev.key.id,
+            'policy': raw_ev.policy,
+            'legacy': raw_ev.legacy,
+            'url': raw_ev.url,
+            'method': raw_ev.method,
+            'cookie': raw_ev.cookie,
+            'timestamp': time.mktime(raw_ev.timestamp.timetuple()) + (raw_ev.timestamp.microsecond / 1e6),
+            'multiplier': multiplier
+        }) + '\n')
+
+        # ``fsync`` in batches, and rotate by size
+        _sync = self.config.get('sync', {})
+        self._unsynced += 1
+        if self._unsynced >= _sync.get('records', 100) or time.time() - self._synced >= _sync.get('interval', 1.0):
+            self._sync()
+        if handle.tell() >= self.config.get('segment', 16 * 1024 * 1024):
+            self._rotate()
+
+        # start the replayer, if it isn't running yet
+        self._start()
+
+        return raw_ev, None
+
+    def replay(self):
+
+        ''' Replay journaled hits, if the datastore is available.
+            While the breaker is tripped, probe the datastore and
+            close it if it has recovered.
+
+            :returns: Count of hits replayed. '''
+
+        if self.tripped:
+            try:
+                self.bus.engine.Datastore.redis.channel(None).ping()
+            except _OUTAGES:
+                return 0
+            self.success()
+
+        self._rotate()
+
+        replayed, segments = 0, self._segments()
+        for index, path in enumerate(segments):
+            try:
+                replayed += self._drain(path)
+            except _OUTAGES as e:
+                self.failure(e)
+
+                # release segments we haven't gotten to, for the next run
+                for path in segments[index + 1:]:
+                    os.rename(path, path[:path.rindex(self._claimed)] + self._closed)
+                break
+
+        if replayed:
+            self.logging.info('Replayed %s journaled hit(s).' % replayed)
+        return replayed
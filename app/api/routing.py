@@ -29,6 +29,7 @@ def get_rules():
         routes.HandlerPrefixRoute('api.handlers.', [
             Route('/__tracker', name='tracker-root', handler='tracker.TrackerEndpoint'),
             Route('/__legacy', name='tracker-legacy', handler='tracker.legacy.LegacyEndpoint'),
+            Route('/__bulk', name='tracker-bulk', handler='tracker.bulk.BulkEndpoint'),
             Route('/%s/sandbox' % _VERSION_PREFIX, name='harness-sandbox', handler='harness.Sandbox'),
             Route('/%s/sandbox/harness' % _VERSION_PREFIX, name='harness-landing', handler='harness.Landing')
         ])
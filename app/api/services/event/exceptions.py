@@ -15,3 +15,6 @@ from api.services import exceptions
 
 ## Error - generic top-level exception for all `EventDataService` errors.
 class Error(exceptions.Error): ''' Root, abstract `EventDataService` error class. '''
+class InvalidFilter(Error): ''' Raised for filter directives that can't be applied to a query. '''
+class InvalidKey(Error): ''' Raised in the case of an invalid or missing `model.Key`. '''
+class NotFound(Error): ''' Raised when an event could not be found. '''
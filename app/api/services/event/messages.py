@@ -17,6 +17,7 @@ from apptools import model
 from api.messages import edge
 
 # event models
+from api.models.tracker import raw
 from api.models.tracker import event
 
 
@@ -38,6 +39,8 @@ class EventQuery(rpc.messages.Message):
         offset = rpc.messages.IntegerField(4, default=0)
         projection = rpc.messages.StringField(5, repeated=True)
         cursor = rpc.messages.StringField(6)
+        explain = rpc.messages.BooleanField(7, default=False)
+        etag = rpc.messages.StringField(8)  # ``etag`` of a previous result, to skip it if unchanged
 
     class SortDirective(rpc.messages.Message):
 
@@ -59,7 +62,8 @@ class EventQuery(rpc.messages.Message):
     class FilterDirective(rpc.messages.Message):
 
         ''' Directs the query engine to filter results with
-            an arbitrary tuple of ``(property, operator, value)``. '''
+            an arbitrary tuple of ``(property, operator, value)``.
+            ``IN`` filters take their candidates in ``values``. '''
 
         class FilterOperator(rpc.messages.Enum):
 
@@ -77,7 +81,8 @@ class EventQuery(rpc.messages.Message):
 
         property = rpc.messages.StringField(1, required=True)
         operator = rpc.messages.EnumField(FilterOperator, 2, default=FilterOperator.EQUALS)
-        value = rpc.messages.VariantField(3, required=True)
+        value = rpc.messages.VariantField(3)
+        values = rpc.messages.VariantField(4, repeated=True)  # candidate values, for `IN` filters
 
     # builtin query parameters
     owner = rpc.messages.StringField(1)
@@ -100,6 +105,7 @@ class EventKeys(rpc.messages.Message):
     count = rpc.messages.IntegerField(1)
     keys = rpc.messages.MessageField(model.Key.to_message_model(), 2, repeated=True)
     range = rpc.messages.IntegerField(3, repeated=True)  # 2-member array of timestamp ints, like: ``[start, end]``
+    join = rpc.messages.BooleanField(4, default=False)  # also fetch the raw event behind each tracked event
 
 
 ## EventRange
@@ -118,12 +124,25 @@ class EventRange(rpc.messages.Message):
     aggregations = rpc.messages.MessageField(edge.AggregationGroup, 4, repeated=True)
     attributions = rpc.messages.MessageField(edge.AttributionGroup, 5, repeated=True)
 
+    # paging
+    cursor = rpc.messages.StringField(6)  # cursor for the next page, if results were served from the time index
+    plan = rpc.messages.StringField(7, repeated=True)  # query plan, if ``explain`` was requested
+
+    # caching
+    etag = rpc.messages.StringField(8)  # tag for this result, which changes whenever it does
+    modified = rpc.messages.IntegerField(9)  # epoch time this result was last known to change
+    unchanged = rpc.messages.BooleanField(10, default=False)  # result matches the requested ``etag``, and was omitted
+
 
 ## Events
 # Container for a set of related :py:class:`event.TrackedEvent` entities.
 class Events(rpc.messages.Message):
 
     ''' Container for expressing multiple :py:class:`event.TrackedEvent`
-        entities. '''
+        entities. Missing events are returned as key-only placeholders,
+        at the same position as their key. '''
 
-    pass
+    count = rpc.messages.IntegerField(1)  # count of events that were found
+    events = rpc.messages.MessageField(event.TrackedEvent.to_message_model(), 2, repeated=True)
+    raw = rpc.messages.MessageField(raw.Event.to_message_model(), 3, repeated=True)  # joined raw events, if requested
+    cursor = rpc.messages.StringField(4)  # cursor for the next page of a range
@@ -12,6 +12,7 @@ Event Data API: Service
 # stdlib
 import time
 import base64
+import hashlib
 import datetime
 
 # Local Imports
@@ -29,6 +30,7 @@ from apptools.model import query
 from api.messages import edge
 
 # API Models
+from api.models.tracker import raw
 from api.models.tracker import endpoint
 from api.models.tracker.event import TrackedEvent
 
@@ -37,6 +39,45 @@ from api.models.tracker.event import TrackedEvent
 Direction = messages.EventQuery.SortDirective.SortOperator
 Operator = messages.EventQuery.FilterDirective.FilterOperator
 
+_PLANNED_OPERATORS = {
+    Operator.EQUALS: '==',
+    Operator.IN: 'in',
+    Operator.GREATER_THAN: '>',
+    Operator.GREATER_THAN_EQUAL_TO: '>=',
+    Operator.LESS_THAN: '<',
+    Operator.LESS_THAN_EQUAL_TO: '<='
+}
+
+_RANGE_LIMIT = 1000  # maximum events returned per page by ``get_range``
+
+
+def collect(keys, results, join=False):
+
+    ''' Collect entities read by :py:meth:`EventEngine.get_entities`
+        into a :py:class:`messages.Events` response, with key-only
+        placeholders for missing events.
+
+        :param keys: ``list`` of requested :py:class:`model.Key` objects.
+
+        :param results: Entities read for ``keys`` (``(event, raw)``
+        pairs if ``join`` is set).
+
+        :param join: Flag (``bool``) indicating joined results.
+
+        :returns: :py:class:`messages.Events`. '''
+
+    events, raws, count = [], [], 0
+    for key, result in zip(keys, results):
+        entity, raw_entity = result if join else (result, None)
+        if entity is not None:
+            count += 1
+
+        events.append((entity if entity is not None else TrackedEvent(key=key)).to_message())
+        if join:
+            raws.append((raw_entity if raw_entity is not None else raw.Event(key=model.Key(raw.Event, key.id))).to_message())
+
+    return messages.Events(count=count, events=events, raw=raws)
+
 
 ## EventDataService - exposes methods for extracting data from `EventTracker`.
 @rpc.service
@@ -48,7 +89,10 @@ class EventDataService(rpc.Service):
     _config_path = 'hermes.api.tracker.EventDataAPI'
 
     exceptions = rpc.Exceptions(**{
-        'generic': exceptions.Error
+        'generic': exceptions.Error,
+        'invalid_filter': exceptions.InvalidFilter,
+        'invalid_key': exceptions.InvalidKey,
+        'not_found': exceptions.NotFound
     })
 
     @staticmethod
@@ -70,37 +114,188 @@ class EventDataService(rpc.Service):
         _queries.append(q)
         return q
 
+    def _key(self, message):
+
+        ''' Decode a :py:class:`model.Key` message into a
+            :py:class:`TrackedEvent` key.
+
+            :raises InvalidKey: If ``message`` has neither an
+            encoded key nor an ID. '''
+
+        if message.encoded:
+            return model.Key.from_urlsafe(message.encoded)
+        if message.id:
+            return model.Key(TrackedEvent, message.id)
+        raise self.exceptions.invalid_key('Must provide either a URLsafe-encoded '
+                                          '`model.Key` or valid `model.Key` ID.')
+
+    @staticmethod
+    def _timestamp(value):
+
+        ''' Normalize a timestamp passed to the Event Data API
+            (in seconds or milliseconds) to epoch seconds. '''
+
+        return int(value / 1e3) if len(str(value)) > 10 else value
+
+    def _describe(self, bucket):
+
+        ''' Describe an aggregation ``bucket`` for the response
+            to a query: its group, window and window bounds. Used
+            with :py:meth:`ResultCache.read`, which keeps the result.
+
+            :param bucket: Aggregation bucket name, encoded or not.
+
+            :returns: Tuple of ``(description, end)``, where
+            ``description`` is ``(group, scope, delta, start, end)``. '''
+
+        # split aggregation key and extract metadata
+        match_split = self.tracker.codec.decode(bucket).split(self.tracker.engine._magic_separator)
+        path, window, identifier = match_split[1:-2], match_split[-2], match_split[-1]
+
+        # extract name and data from path
+        if len(path) > 1:
+            nm, data = path[0], path[1:]
+            main_value, auxilliary = (nm, data[0]), dict(zip(data[1::2], data[2::2])) if len(data) > 1 else {}
+        else:
+            nm, data = path[0], []
+            main_value, auxilliary = None, {}
+
+        aux = tuple(auxilliary.items())  # make lookup list of all pairs
+
+        # calculate window
+        wire_window, trange = self.tracker.resolve_timewindow(*(
+            window,
+            identifier,
+            edge.Timewindow.WindowScope
+        ), epoch=True)
+
+        window_type, window_delta = wire_window  # extract window values
+        window_begin, window_end = trange  # extract beginning and end of window
+
+        return ((nm, (main_value, aux)), window_type, window_delta, window_begin, window_end), window_end
+
+    @staticmethod
+    def _value(value):
+
+        ''' Coerce a raw aggregation value read from storage
+            to a number, where possible. '''
+
+        try:
+            if isinstance(value, basestring):
+                if '.' in value:
+                    return float(value)
+                return int(value)
+            return value
+        except ValueError:
+            try:
+                return int(value)
+            except ValueError:
+                return value
+
+    def _plan(self, request, _opts, start, end):
+
+        ''' Plan ``request`` against the event indexes (see
+            :py:class:`QueryPlanner`), if it can be served by them.
+
+            :param request: :py:class:`messages.EventQuery`.
+
+            :param _opts: Query options for ``request``.
+
+            :param start: Exclusive start timestamp, or ``None``.
+
+            :param end: Exclusive end timestamp, or ``None``.
+
+            :raises InvalidFilter: If a filter is malformed, like an
+            ``IN`` filter without ``values``.
+
+            :returns: :py:class:`QueryPlan`, or ``None`` if the query
+            must run through the regular query engine. '''
+
+        for directive in (request.filter or []):
+            if directive.operator is Operator.IN:
+                if not directive.values:
+                    raise self.exceptions.invalid_filter('`IN` filters take a list of `values`. '
+                                                         'Got none for: "%s".' % directive.property)
+            elif directive.value is None:
+                raise self.exceptions.invalid_filter('Missing `value` for filter on: "%s".' % directive.property)
+            elif directive.property == 'created' and not isinstance(directive.value, (int, long, float)):
+                raise self.exceptions.invalid_filter('Filters on `created` take a numeric '
+                                                     'timestamp. Got: "%s".' % directive.value)
+
+        sort = request.sort or []
+        if _opts.ancestor or _opts.projection or len(sort) > 1:
+            return None
+
+        filters = []
+        for directive in (request.filter or []):
+            if directive.operator not in _PLANNED_OPERATORS:
+                return None
+
+            if directive.operator is Operator.IN:
+                value = list(directive.values)
+            elif directive.property == 'created':
+                value = self._timestamp(directive.value)
+            else:
+                value = directive.value
+            filters.append((directive.property, _PLANNED_OPERATORS[directive.operator], value))
+
+        return self.tracker.planner.plan(TrackedEvent.__name__, filters, start, end, **{
+            'sort': (sort[0].property, sort[0].operator is Direction.DESCENDING) if sort else None
+        })
+
     @rpc.method(model.Key, TrackedEvent)
     def get(self, request):
 
         ''' Retrieve a :py:class:`event.TrackedEvent` model
             by its associated :py:class:`model.Key`. '''
 
-        pass
+        key = self._key(request)
+        entity = TrackedEvent.get(key)
+
+        if entity is None:
+            raise self.exceptions.not_found('No event found at key: "%s".' % key.urlsafe())
+        return entity
 
     @rpc.method(messages.EventKeys, messages.Events)
     def get_multi(self, request):
 
         ''' Retrieve multiple :py:class:`event.TrackedEvent`
             models by their associated :py:class:`model.Key`
-            objects. '''
+            objects, in one round-trip. With ``join``, the raw
+            event behind each is fetched in the same round-trip. '''
 
-        pass
+        keys = [self._key(key) for key in request.keys]
+        return collect(keys, self.tracker.engine.get_entities(*(
+            TrackedEvent,
+            keys), join=raw.Event if request.join else None), request.join)
 
     @rpc.method(messages.EventRange, messages.Events)
     def get_range(self, request):
 
         ''' Retrieve a range of :py:class:`event.TrackedEvent`
-            models by special values attached to them. '''
+            models by special values attached to them. Events
+            created between ``start`` and ``end`` are paged from
+            the time index, oldest first, and fetched in one
+            round-trip per page. '''
+
+        ids, cursor = self.tracker.engine.timeline(*(
+            TrackedEvent.__name__,
+            self._timestamp(request.start) if request.start else None,
+            self._timestamp(request.end) if request.end else None), limit=_RANGE_LIMIT, cursor=request.cursor)
 
-        pass
+        keys = [model.Key(TrackedEvent, eid) for eid in ids]
+        response = collect(keys, self.tracker.engine.get_entities(TrackedEvent, keys))
+        response.cursor = cursor
+        return response
 
     @rpc.method(messages.EventQuery, messages.EventRange)
     def query(self, request):
 
         ''' Execute a compound/arbitrary query across
             :py:class:`event.TrackedEvent` records,
-            returning matching results. '''
+            returning matching results. Aggregations fed by
+            sampled hits report the sampling ``multiplier``,
+            and their values are estimates. '''
 
         if not request.options:
             _opts = query.QueryOptions(keys_only=True)  # default to keys-only
@@ -125,20 +320,23 @@ class EventDataService(rpc.Service):
 
         # build start range
         if request.start:
-            timestamp_start = int(request.start / 1e3) if len(str(request.start)) > 10 else request.start
+            timestamp_start = self._timestamp(request.start)
             q.filter(TrackedEvent.created > datetime.datetime.fromtimestamp(timestamp_start))
         else:
             timestamp_start = None
 
         # build end range
         if request.end:
-            timestamp_end = int(request.end / 1e3) if len(str(request.end)) > 10 else request.end
+            timestamp_end = self._timestamp(request.end)
             q.filter(TrackedEvent.created < datetime.datetime.fromtimestamp(timestamp_end))
         else:
             timestamp_end = None
 
-        # add arbitrary filter directives
-        if request.filter:
+        # plan against event indexes, if we can
+        plan = self._plan(request, _opts, timestamp_start, timestamp_end)
+
+        # otherwise, add arbitrary filter directives
+        if request.filter and plan is None:
             for directive in request.filter:
 
                 # `==` filter
@@ -167,10 +365,11 @@ class EventDataService(rpc.Service):
 
                 # `IN` filter
                 elif directive.operator is Operator.IN:
-                    q.filter(TrackedEvent[directive.property] in directive.value)
+                    raise self.exceptions.invalid_filter('`IN` filters are only supported on indexed '
+                                                         'properties. Got: "%s".' % directive.property)
 
         # add arbitrary sort directives
-        if request.sort:
+        if request.sort and plan is None:
             for directive in request.sort:
 
                 # ascending sort
@@ -181,10 +380,18 @@ class EventDataService(rpc.Service):
                 if directive.operator is Direction.DESCENDING:
                     q.sort(-TrackedEvent[directive.property])
 
-        results = q.fetch()  # fetch results
+        # serve from event indexes if we can, otherwise fetch through the query engine
+        if plan is not None:
+            ids, cursor = self.tracker.planner.execute(plan, _opts.limit or 0, _opts.offset or 0, _opts.cursor)
+            results = [model.Key(TrackedEvent, eid) for eid in ids]
+            if not _opts.keys_only:
+                results = [entity for entity in self.tracker.engine.get_entities(TrackedEvent, results) if (
+                    entity is not None)]
+        else:
+            results, cursor = q.fetch(), None
 
         # initialize results containers
-        _matched_aggregations, _touched_aggregations = set(), set()
+        _matched_aggregations, _touched_aggregations, _multipliers = set(), set(), {}
         _matched_attributions, _touched_attributions = set(), set()
 
         edges, event_data, _aggr_raw, _attr_raw, _final = {
@@ -200,76 +407,62 @@ class EventDataService(rpc.Service):
                     if aggregation not in _matched_aggregations:
                         _matched_aggregations.add(aggregation)
 
+                    # track the largest sampling multiplier behind each aggregation
+                    _multipliers[aggregation] = max(_multipliers.get(aggregation, 1), event.multiplier or 1)
+
             # build unique set of attribution groups to pull
             if event.attributions:
                 for attribution in event.attributions:
                     if attribution not in _matched_attributions:
                         _matched_attributions.add(attribution)
 
-        # pull aggregated values
+        # pull aggregated values, through the result cache
+        _modified = None
         if len(_matched_aggregations):
-            for matched_aggregation in _matched_aggregations:
-
-                # split aggregation key and extract metadata
-                match_split = matched_aggregation.split(self.tracker.engine._magic_separator)
-                path, window, identifier = match_split[1:-2], match_split[-2], match_split[-1]
+            _buckets = sorted(_matched_aggregations)
+            for matched_aggregation, (description, value, modified) in zip(_buckets, self.tracker.cache.read(*(
+                    _buckets,
+                    self._describe))):
 
-                # extract name and data from path
-                if len(path) > 1:
-                    nm, data = path[0], path[1:]
-                    main_value, auxilliary = (nm, data[0]), dict(zip(data[1::2], data[2::2])) if len(data) > 1 else {}
-                else:
-                    nm, data = path[0], []
-                    main_value, auxilliary = None, {}
-
-                aux = tuple(auxilliary.items())  # make lookup list of all pairs
-
-                # grab value, calculate window
-                wire_window, trange = self.tracker.resolve_timewindow(*(
-                    window,
-                    identifier,
-                    edge.Timewindow.WindowScope
-                ))
-
-                window_type, window_delta = wire_window  # extract window values
-                window_begin, window_end = trange  # extract beginning and end of window
+                group, window_type, window_delta, window_begin, window_end = description
 
                 # initialize aggregation in hash, if we haven't seen it yet
-                if (nm, (main_value, aux)) not in _touched_aggregations:
-                    edges['aggregations'][(nm, (main_value, aux))] = []
-                    _touched_aggregations.add((nm, (main_value, aux)))
+                if group not in _touched_aggregations:
+                    edges['aggregations'][group] = []
+                    _touched_aggregations.add(group)
 
                 # generate aggregation item
                 _directive = edge.Aggregation(**{
                     'window': edge.Timewindow(**{
                         'scope': window_type,
                         'delta': window_delta,
-                        'start': int(time.mktime(window_begin.timetuple())) if window_begin else None,
-                        'end': int(time.mktime(window_end.timetuple())) if window_end else None
-                    })
+                        'start': window_begin,
+                        'end': window_end
+                    }),
+                    'value': self._value(value),  # estimated, if sampled (increments are scaled on write)
+                    'multiplier': _multipliers.get(matched_aggregation, 1)
                 })
 
                 _aggr_raw.append((matched_aggregation, _directive))
-                edges['aggregations'][(nm, (main_value, aux))].append(_directive)
-
-            # batch-get aggregation values
-            aggregation_values = self.tracker.engine.get_multi((key for key, obj in _aggr_raw))
-
-            # zip objects up with values and fill in results
-            for obj, value in zip((obj for key, obj in _aggr_raw), aggregation_values):
-                try:
-                    if isinstance(value, basestring):
-                        if '.' in value:
-                            obj.value = float(value)
-                        else:
-                            obj.value = int(value)
-                    else:
-                        obj.value = value
-                except ValueError:
-                    try:
-                        obj.value = int(value)
-                    except ValueError:
-                        obj.value = value
+                edges['aggregations'][group].append(_directive)
+                _modified = max(_modified, modified)
+
+        # tag the result, so clients can skip it if it hasn't changed
+        _tag = hashlib.sha1(cursor or '')
+        for result in results:
+            _tag.update('|%s' % getattr(result, 'key', result).id)
+        for matched_aggregation, _directive in _aggr_raw:
+            _tag.update('|%s=%r' % (matched_aggregation, _directive.value))
+        etag, modified = _tag.hexdigest(), int(_modified if _modified is not None else time.time())
+
+        if getattr(_opts, 'etag', None) == etag:
+            return messages.EventRange(**{
+                'start': timestamp_start,
+                'end': timestamp_end,
+                'etag': etag,
+                'modified': modified,
+                'unchanged': True
+            })
 
         # build eventrange result
         event_range = messages.EventRange(**{
@@ -277,9 +470,16 @@ class EventDataService(rpc.Service):
             'end': timestamp_end,
             'data': event_data,
             'aggregations': [],
-            'attributions': []
+            'attributions': [],
+            'cursor': cursor,
+            'etag': etag,
+            'modified': modified
         })
 
+        # explain the query plan, if requested
+        if getattr(_opts, 'explain', False):
+            event_range.plan = plan.explain() if plan is not None else ['full query (no applicable indexes)']
+
         for k, v in edges['aggregations'].iteritems():
 
             # extract everything
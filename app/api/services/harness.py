@@ -28,6 +28,10 @@ from apptools.util import datastructures
 from api.models.tracker import raw
 from api.models.tracker import event
 
+# Event Data API
+from api.services.event import messages as eventapi
+from api.services.event.service import collect
+
 # tracker endpoints
 from api.handlers.tracker import TrackerEndpoint
 from api.handlers.tracker.legacy import LegacyEndpoint
@@ -182,6 +186,32 @@ class HarnessService(rpc.Service):
             raise self.exceptions.key_not_found('Failed to retrieve key at %s `%s`.' % (src, val))
         return record
 
+    @rpc.method(eventapi.EventKeys, eventapi.Events)
+    def get_events(self, request):
+
+        ''' Raw-retrieve a batch of full events (and,
+            with ``join``, the raw event behind each) in
+            one round-trip. Missing events come back as
+            key-only placeholders, in request order.
+
+            :param request: Input message request of
+            the class :py:class:`eventapi.EventKeys`.
+
+            :returns: Resulting :py:class:`eventapi.Events`. '''
+
+        keys = []
+        for key in request.keys:
+            if key.encoded:
+                keys.append(model.Key.from_urlsafe(key.encoded))
+            elif key.id:
+                keys.append(model.Key(event.TrackedEvent, key.id))
+            else:
+                raise self.exceptions.ambiguous_key('Must provide at least a key `id` or `encoded`.')
+
+        return collect(keys, self.tracker.engine.get_entities(*(
+            event.TrackedEvent,
+            keys), join=raw.Event if request.join else None), request.join)
+
     @rpc.method(URLTestRequest, URLTestResults)
     def test_urls(self, request):
 
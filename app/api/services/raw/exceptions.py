@@ -23,3 +23,7 @@ class InvalidKey(Error): ''' Raised in the case of an invalid or missing `model.
 
 ## NotFound - raised in the case that we are missing a record that was requested.
 class NotFound(InvalidKey): ''' Raised in the case of not finding a record we're looking for. '''
+
+
+## InvalidCursor - raised in the case of a cursor that can't be resumed.
+class InvalidCursor(Error): ''' Raised in the case of an invalid or corrupt paging cursor. '''
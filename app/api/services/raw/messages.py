@@ -25,6 +25,19 @@ class RawKeys(rpc.messages.Message):
         retrieved or altered in batch. '''
 
     keys = rpc.messages.MessageField(model.Key.to_message_model(), 1, repeated=True)
+    chunk = rpc.messages.IntegerField(2)  # most events to read per round-trip, if set
+
+
+## RawCursor
+# Requests a page of a walk through all raw events.
+class RawCursor(rpc.messages.Message):
+
+    ''' Requests one page of a walk through all
+        :py:class:`raw.Event` models, starting over
+        or resuming at ``cursor``. '''
+
+    cursor = rpc.messages.StringField(1)  # cursor returned with the previous page, if any
+    limit = rpc.messages.IntegerField(2)  # maximum events per page, if set
 
 
 ## RawEvents
@@ -37,3 +50,4 @@ class RawEvents(rpc.messages.Message):
 
     count = rpc.messages.IntegerField(1)
     events = rpc.messages.MessageField(raw.Event.to_message_model(), 2, repeated=True)
+    cursor = rpc.messages.StringField(3)  # cursor for the next page of a walk, unless it's complete
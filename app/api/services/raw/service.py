@@ -33,9 +33,12 @@ class RawDataService(rpc.Service):
     exceptions = rpc.Exceptions(**{
         'generic': exceptions.Error,
         'invalid_key': exceptions.InvalidKey,
-        'not_found': exceptions.NotFound
+        'not_found': exceptions.NotFound,
+        'invalid_cursor': exceptions.InvalidCursor
     })
 
+    _cursor_separator = ':'  # separates the walk mode (``index`` or ``scan``) from its position, in cursors
+
     @rpc.method(model.Key, raw.Event)
     def get(self, request):
 
@@ -80,39 +83,40 @@ class RawDataService(rpc.Service):
     def get_multi(self, request):
 
         ''' Retrieve multiple :py:class:`raw.Event` entities
-            in batch. '''
+            in batch, in one round-trip. Events are returned in
+            the order their keys were given, with key-only
+            placeholders for missing events. With ``chunk`` set,
+            events are read ``chunk`` at a time instead. '''
 
         try:
 
             # decode target keys
             target_keys = []
-            for key in request.keys:
+            for i, key in enumerate(request.keys):
                 if key.encoded:
-                    target_keys.append(model.Key.from_urlsafe(request.encoded))
+                    target_keys.append(model.Key.from_urlsafe(key.encoded))
 
-                elif request.id:
-                    target_keys.append(model.Key(raw.Event, request.id))
+                elif key.id:
+                    target_keys.append(model.Key(raw.Event, key.id))
 
-            # check target keys
-            if not all(target_keys):
-                for i, key in enumerate(target_keys):  # let user know which was a failure
-                    if not key or not key.id:
-                        raise self.exceptions('Found invalid key at position %s. '
-                                              'Resulting key: "%s".' % (i, key))
+                else:  # let user know which was a failure
+                    raise self.exceptions.invalid_key('Found invalid key at position %s. Must provide '
+                                                      'either a URLsafe-encoded `model.Key` or '
+                                                      'valid `model.Key` ID.' % i)
 
+            # pull events from storage in one round-trip (or one per chunk)
             tally, results = 0, []
-            for key in target_keys:
-
-                # pull event from storage
-                raw_ev = raw.Event.get(key)
+            for key, raw_ev in zip(target_keys, self.tracker.engine.get_entities(*(
+                    raw.Event,
+                    target_keys), chunk=request.chunk or None)):
 
-                # null events are returned as empty structures
+                # null events are returned as key-only structures
                 if not raw_ev:
-                    results.append(raw.Event())
+                    results.append(raw.Event(key=key).to_message())
                     continue
 
                 tally += 1  # otherwise, it's a result (only increment count in this case)
-                results.append(raw_ev)
+                results.append(raw_ev.to_message())
 
             # return with materialized count and event list
             return messages.RawEvents(count=tally, events=results)
@@ -128,9 +132,60 @@ class RawDataService(rpc.Service):
             self.logging.error('Encountered unhandled, unbound exception: (%s, %s).' % context)
             raise self.exceptions.generic('Encountered unhandled exception "%s": %s.' % context)
 
-    @rpc.method(rpc.messages.VoidMessage, messages.RawEvents)
+    @rpc.method(messages.RawCursor, messages.RawEvents)
     def get_all(self, request):
 
-        ''' Retrieve all known :py:class:`raw.Event` entities. '''
+        ''' Retrieve all known :py:class:`raw.Event` entities,
+            one page at a time. Pages are walked from the raw
+            event time index, if it's configured, untrimmed and
+            marked ``complete`` (i.e. backfilled), or else the keyspace
+            (with ``SCAN``), and each page is read in
+            one round-trip. Pass back the returned ``cursor`` to
+            continue; the walk is complete when no cursor is
+            returned. Keyspace walks may repeat an event across
+            pages. '''
+
+        engine = self.tracker.engine
+        batch = engine.config.get('reads', {}).get('batch', 500)
+        limit = min(request.limit or batch, batch)
+
+        try:
 
-        raise NotImplementedError('`EventTracker` Raw API does not yet support `get_all`.')
+            # resume the walk in the cursor's mode, or pick one: the time index only holds events written
+            # since indexing was turned on (and within ``retention``), so it's only walked once marked ``complete``
+            if request.cursor:
+                mode, position = request.cursor.split(self._cursor_separator, 1)
+            else:
+                indexing = engine.config.get('indexing', {})
+                mode, position = 'index' if (indexing.get('enabled', False) and not indexing.get('retention', 0) and (
+                    indexing.get('kinds', {}).get(raw.Event.__name__, {}).get('complete', False))) else 'scan', None
+
+            if mode == 'index':
+                ids, position = engine.timeline(raw.Event.__name__, limit=limit, cursor=position)
+
+            elif mode == 'scan':
+                ids, position, seen = [], int(position or 0), set()
+                while True:
+                    found, position = engine.scan(raw.Event, position, count=limit)
+                    for identifier in found:
+                        if identifier not in seen:
+                            seen.add(identifier)
+                            ids.append(identifier)
+                    if not position or len(ids) >= limit:
+                        break
+
+            else:
+                raise ValueError('Unknown walk mode `%s`.' % mode)
+
+        except ValueError as e:
+            raise self.exceptions.invalid_cursor('Invalid cursor "%s": %s' % (request.cursor, str(e)))
+
+        # pull the page in one round-trip, skipping events that were deleted since they were listed
+        tally, results = 0, []
+        for raw_ev in engine.get_entities(raw.Event, [model.Key(raw.Event, identifier) for identifier in ids]):
+            if raw_ev is not None:
+                tally += 1
+                results.append(raw_ev.to_message())
+
+        return messages.RawEvents(count=tally, events=results, cursor=(
+            self._cursor_separator.join((mode, str(position))) if position else None))
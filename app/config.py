@@ -71,6 +71,191 @@ _PREBUFFER_THRESHOLD = 60  # configurable task limit per prebuffer batch
 _PREBUFFER_FREQUENCY = 30  # configurable time threshold for prebuffer flush
 
 
+# Tracker Platform
+_config['platform.tracker.Tracker'] = {
+    'debug': True,
+
+    'deferred': {
+        'enabled': False,  # respond to hits before running policy enforcement and writes
+        'max_inflight': 500  # maximum in-flight deferred hits before falling back to inline processing
+    },
+
+    'bulk': {
+        'chunk': 200,  # hits to queue onto one pipeline (and flush in one round-trip) in bulk uploads
+        'max_items': 5000  # most hits accepted in one bulk upload
+    }
+}
+
+
+# Event Builder
+_config['tracker.event.EventBuilder'] = {
+    'debug': True,
+
+    'dedup': {
+        'enabled': False,  # drop hits whose own ID (`XAF-Hash`/`XAF-Request-ID`) was already seen within the window
+        'window': 300,  # dedup window, in seconds (TTL of the authoritative `SET NX` marker in Redis)
+        'size': 100000  # most recently-seen IDs to remember per worker, answering repeats without a round-trip
+    }
+}
+
+
+# Event Engine
+_config['tracker.engine.EventEngine'] = {
+    'debug': True,
+
+    'scripting': {
+        'enabled': False  # apply each event's aggregation increments in one server-side Lua call
+    },
+
+    'sharding': {
+        'enabled': False,  # spread hot counter buckets across shards (summed on read)
+        'shards': 8,  # shard count for automatically-detected hot buckets
+        'strategy': 'worker',  # pick a shard per worker (`worker`) or per increment (`random`)
+        'max_buckets': 10000,  # most sharded buckets each worker remembers the registered shard count for
+
+        'auto': {
+            'enabled': False,  # detect hot buckets automatically, in addition to declared ones
+            'threshold': 1000,  # increments per window before a bucket is considered hot
+            'window': 1.0  # detection window, in seconds
+        }
+    },
+
+    'slots': {
+        'enabled': False,  # pack hour-level buckets into one small hash per dimension and day, keyed by hour slot
+        'legacy': True  # also read hour-level buckets where they were written before `enabled` was switched on
+    },
+
+    'indexing': {
+        'enabled': False,  # index persisted events by time, in sorted sets written alongside each entity
+        'retention': 7 * 86400,  # seconds of entries to keep in each index (`0` to keep them forever)
+        'trim': 60,  # minimum time (in seconds) between trims of an index, per worker
+
+        'kinds': {
+            # kind => time property to score by, and properties to keep per-value indexes for
+            # (`complete` marks an index as backfilled, so full walks can use it in place of `SCAN`,
+            # as long as `retention` is `0`)
+            'Event': {'property': 'timestamp', 'scopes': ('policy', 'error', 'legacy'), 'complete': False},
+            'TrackedEvent': {'property': 'created', 'scopes': ('error', 'tracker', 'profile')}
+        }
+    },
+
+    'reads': {
+        'chunk': 1000,  # most entities to read per round-trip in batched reads (`0` for no limit)
+        'batch': 500  # entities per page when walking a whole kind (via its time index or `SCAN`)
+    }
+}
+
+
+# Counter Buffer
+_config['tracker.buffer.CounterBuffer'] = {
+    'debug': True,
+    'enabled': False,  # coalesce aggregation increments in-process before writing
+    'interval': 0.05,  # maximum time (in seconds) between flushes
+    'max_buckets': 1000,  # flush once this many distinct buckets are pending
+    'max_deltas': 5000,  # flush once this many increments are pending (bounds lost deltas on a crash)
+
+    'backoff': {
+        'initial': 0.1,  # delay (in seconds) before retrying after a failed flush, doubled per failure
+        'max': 5.0  # longest delay (in seconds) between retries
+    }
+}
+
+
+# Key Codec
+_config['tracker.codec.KeyCodec'] = {
+    'debug': True,
+    'enabled': False,  # write aggregation buckets under compact, dictionary-encoded names
+    'cache': 65536  # maximum encoded/decoded names to remember per worker
+}
+
+
+# Rollup Engine
+_config['tracker.rollup.RollupEngine'] = {
+    'debug': True,
+    'enabled': False,  # write only finest-grain buckets per hit, and derive coarser windows in the background
+    'grain': 'hour',  # finest-grain interval written by hits (`hour` or `day`)
+    'delay': 60,  # seconds to wait after a window closes before rolling it up
+    'interval': 30,  # seconds between background rollup runs
+    'batch': 500,  # maximum windows to roll up per run
+    'cache': 4096,  # maximum pending windows to keep parsed per worker
+    'retention': 35 * 86400  # seconds to remember how much of each window was rolled up (bounds late writes)
+}
+
+
+# Event IDs
+_config['util.eventid'] = {
+    'worker': None,  # worker ID (0-1023) embedded in generated event IDs, or `None` to lease one from Redis
+    'lease': 300  # seconds a leased worker ID is held for, renewed at half this
+}
+
+
+# Query Planner
+_config['tracker.planner.QueryPlanner'] = {
+    'debug': True,
+    'ttl': 30  # seconds to keep intersected/unioned index results around for paging
+}
+
+
+# Result Cache
+_config['tracker.cache.ResultCache'] = {
+    'debug': True,
+    'enabled': False,  # cache aggregation values per worker (closed windows go stale if writes land after `grace`)
+    'size': 100000,  # most buckets to keep, evicting least-recently-used first
+    'ttl': 5,  # seconds to keep values for windows that are still open
+    'grace': 300  # seconds after a window closes before its value is considered final
+}
+
+
+# Work Queue
+_config['tracker.queue.WorkQueue'] = {
+    'debug': True,
+    'enabled': False,  # split ingestion: hits only persist + queue raw events, workers (`tools/enforcer.py`) enforce them
+    'batch': 100,  # raw events claimed (and written in one pipeline) per worker batch
+    'idle': 0.5,  # seconds a worker waits when the queue is empty
+    'pause': 0  # seconds a worker waits between batches, to throttle enforcement
+}
+
+
+# Spool
+_config['tracker.spool.Spool'] = {
+    'debug': True,
+    'enabled': False,  # circuit breaker around the engine, journaling hits to local disk while Redis is down
+    'path': '/ns/runtime/spool/tracker',  # journal directory, shared by all workers on a node
+    'threshold': 5,  # consecutive datastore outage errors that trip the breaker
+    'cooldown': 10,  # seconds before hits are let through to Redis again, after tripping
+    'segment': 16 * 1024 * 1024,  # journal segments rotate at this size, in bytes
+    'sync': {
+        'records': 100,  # ``fsync`` the journal every this many records...
+        'interval': 1.0  # ...or seconds, whichever comes first
+    },
+    'interval': 5,  # seconds between replay runs
+    'batch': 200  # journaled hits replayed per pipeline
+}
+
+
+# Admission Controller
+_config['tracker.admission.AdmissionController'] = {
+    'debug': True,
+    'enabled': False,  # degrade lower-priority hits first under overload (conversions are never degraded)
+    'depth': 500,  # in-flight hits per worker at full load
+    'latency': 0.05,  # smoothed pipeline round-trip time at full load, in seconds
+    'smoothing': 0.2,  # weight of each new round-trip time in the smoothed latency
+    'shed': {  # load at which each event type skips aggregations, records raw only, then is sampled
+        'IMPRESSION': (1.0, 1.5, 2.0),
+        'CLICK': (1.5, 2.0, 3.0),
+        'CUSTOM': (2.0, 3.0, 4.0)
+    },
+    'sample': 0.1,  # fraction of sampled-out hits still recorded (raw only)
+
+    'sampling': {
+        'types': {  # record 1 in N hits of each event type, scaling their aggregations by N (conversions are never sampled)
+            'IMPRESSION': 1
+        },
+        'profiles': {}  # record 1 in N hits for a profile (by definition path), overriding its event type's rate
+    }
+}
+
+
 # Policy Engine
 _config['tracker.policy.PolicyEngine'] = {
     'strict': False,
@@ -82,8 +267,8 @@ _config['tracker.policy.PolicyEngine'] = {
 _config['protocol.aggregation.Aggregation'] = {
     'debug': True,
     'hasher': {
-        'enabled': False,
-        'algorithm': hashlib.sha1
+        'enabled': False,  # hash property values in bucket keys (not reversible - values can't be reported)
+        'algorithm': 'fast'  # `fast` for a non-cryptographic 64-bit hash, or a `hashlib` constructor
     }
 }
 
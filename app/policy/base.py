@@ -42,6 +42,9 @@ _DEFAULT_LOOKBACK = (timedelta.TimeWindow.ONE_HOUR,
                      timedelta.TimeWindow.YEAR,
                      timedelta.TimeWindow.FOREVER)
 
+# Counter shards for buckets hit by every event (only applied when engine sharding is enabled)
+_HOT_SHARDS = {timedelta.TimeWindow.YEAR: 8, timedelta.TimeWindow.FOREVER: 8}
+
 
 ## EventProfile
 # Default Event Profile.
@@ -92,7 +95,7 @@ class EventProfile(core.AbstractProfile):
             'binding': event.EventType,
             'category': parameter.ParameterType.INTERNAL,
             'aggregations': [
-                aggregation.Aggregation(interval=_DEFAULT_LOOKBACK)
+                aggregation.Aggregation(interval=_DEFAULT_LOOKBACK, shards=_HOT_SHARDS)
             ]
         }
 
@@ -104,7 +107,7 @@ class EventProfile(core.AbstractProfile):
             'binding': event.EventProvider,
             'category': parameter.ParameterType.INTERNAL,
             'aggregations': [
-                aggregation.Aggregation(interval=_DEFAULT_LOOKBACK)
+                aggregation.Aggregation(interval=_DEFAULT_LOOKBACK, shards=_HOT_SHARDS)
             ]
         }
 
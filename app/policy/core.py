@@ -27,6 +27,128 @@ from protocol import aggregation
 from apptools.util import decorators as util
 
 
+## Globals
+_identity = lambda x: x  # pass-through converter for parameters without a basetype
+
+
+## MatchPlan
+# Frozen, precompiled parameter matching structure for a single profile.
+class MatchPlan(object):
+
+    ''' Precompiled matching plan for a :py:class:`Profile`
+        descendent, built once (at class-construction time)
+        by :py:meth:`Profile.Interpreter.compile`.
+
+        Resolves names, categories, separators and basetype
+        converters for every parameter in the profile's
+        ``chain``, so that per-hit matching in the
+        :py:class:`PolicyEngine` is reduced to dictionary
+        lookups and set operations against the request.
+
+        Each ``view`` is a tuple of ``(artifacts, expected,
+        aliases)``, where ``artifacts`` maps a full identifier
+        to a ``(parameter, converter)`` pair, ``expected`` is a
+        ``frozenset`` of those identifiers and ``aliases`` is a
+        tuple of ``(identifier, names)`` for parameters that
+        accept more than one name. '''
+
+    __slots__ = ('http',
+                 'mapping',
+                 'special',
+                 'missing',
+                 'enforced')
+
+    def __init__(self, policy):
+
+        ''' Compile a new :py:class:`MatchPlan` for ``policy``.
+
+            :param policy: :py:class:`Profile` descendent to
+            compile a matching plan for.
+
+            :raises InvalidParamName: In the case of an invalid
+            or empty parameter name.
+
+            :raises DuplicateParameterName: In the case of two
+            distinct parameters that resolve to the same name.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        from api.platform.tracker import exceptions
+
+        artifacts, http_artifacts, special, missing, aliases = {}, {}, [], {}, {}
+
+        for prm in policy.parameters:
+            prefix = prm.config.get('category', '')  # grab category prefix
+            name = prm.config.get('name', False)
+
+            if name is False:  # default to using parameter full name
+                name = prm.name
+
+            if name in (None, False, '', [], set(), tuple(), frozenset()) or not isinstance(name, (
+                    basestring, list, set, tuple, frozenset)):
+
+                raise exceptions.InvalidParamName("Invalid property name for parameter '%s'."
+                                                  " Found name of type '%s'." % (prm, type(name)))
+
+            names = None
+            if isinstance(name, (set, tuple, list, frozenset)):
+                names = name = tuple(name)
+                name = name[0]  # start with first available name
+
+            # resolve value converter
+            if prm.basetype is not None:
+                if prm.basetype == basestring:
+                    converter = unicode
+                else:
+                    converter = prm.basetype
+            else:
+                converter = _identity
+
+            if prm.mapper:
+                converter = (prm.mapper, converter)
+
+            # compute identifier
+            identifier = prm.config.get('separator', '').join([prefix, name]) if prefix else name
+
+            if name in artifacts:
+                if artifacts[name][0] is not prm:
+                    raise exceptions.DuplicateParameterName("Encountered more than one parameter with the name "
+                                                            "'%s' (violating property was '%s'." % (identifier, name))
+
+            artifacts[identifier] = (prm, converter)
+
+            # http.DataSlot.PARAM == 1 (all special slots are >1)
+            # http.DataSlot.PATH == 0x5 (maximum, anything above this bound is invalid)
+            if 1 < prm.config.get('source', 0) <= 0x5:
+                if not any((spec[0] is prm for spec in special)):
+                    special.append((prm, converter, prm.config['source'], name))
+            else:
+                http_artifacts[identifier] = (prm, converter)
+
+            # pre-build context for a missing value
+            if names:
+                aliases[identifier] = names
+                missing[identifier] = [
+                    "Expected property \"%s\" with primary name \"%s\" (and name options %s) was not found.",
+                    prm.name,
+                    identifier,
+                    ', '.join(map(lambda s: '"%s"' % s, names))
+                ]
+            else:
+                aliases.pop(identifier, None)
+                missing[identifier] = ["Expected property \"%s\" (at name \"%s\") was not found.", prm.name, identifier]
+
+        def _view(table):
+            return table, frozenset(table), tuple((i, n) for i, n in aliases.iteritems() if i in table)
+
+        self.special = tuple(special)
+        self.missing = {i: (artifacts[i][0], tuple(context)) for i, context in missing.iteritems()}
+        self.enforced = frozenset((i for i, (prm, converter) in artifacts.iteritems() if (
+            prm.config.get('policy', parameter.ParameterPolicy.OPTIONAL) in (
+                parameter.ParameterPolicy.REQUIRED, parameter.ParameterPolicy.ENFORCED))))
+        self.mapping, self.http = _view(artifacts), _view(http_artifacts)
+
+
 ## Profile
 # Metaclass that provides structure for overridable profiles.
 class Profile(type):
@@ -40,6 +162,7 @@ class Profile(type):
         defined via :py:class:`EventProfile`-subclasses. '''
 
     registry = {}  # central profile registry
+    refcodes = {}  # normalized legacy refcode => profile index
 
     ## Interpreter
     # Manages interpretation and merging of `Profile` descendents.
@@ -57,6 +180,9 @@ class Profile(type):
         attributions = tuple()
         integrations = tuple()
         configuration = tuple()
+        transports = None
+        plan = None
+        aggregation_plan = None
 
         ## == Internal Members == ##
         __tree__ = tuple()
@@ -374,7 +500,29 @@ class Profile(type):
                 setattr(self, k, v)
 
             if overlay:
-                return self.overlay(overlay)
+                self.overlay(overlay)
+            return self.compile(base_policy)
+
+        def compile(self, base_policy):
+
+            ''' Compile a frozen :py:class:`MatchPlan` and transport
+                lookup for a fully-built :py:class:`EventProfile`
+                descendent. Profiles never change after import, so
+                this only happens once, at class-construction time.
+
+                :param base_policy: Built :py:class:`EventProfile`
+                descendent to compile a matching plan for.
+
+                :returns: ``self``, for method chainability. '''
+
+            # map each input channel to its nearest transport config
+            self.transports = {}
+            for compound in [base_policy] + list(base_policy.chain):
+                for spec in compound.__interpreter__.configuration:
+                    self.transports.setdefault(spec.transport, spec)
+
+            self.plan = MatchPlan(base_policy)
+            self.aggregation_plan = aggregation.AggregationPlan(base_policy)
             return self
 
         __call__ = overlay
@@ -456,15 +604,47 @@ class Profile(type):
             :param dynamic_klass: Dynamically-factoried class, produced
             by :py:meth:`Profile.__new__`.
 
+            :raises ValueError: In the case of a legacy ``refcode``
+            that is already claimed by another profile.
+
             :returns: The dynamic class that was passed-in and added
             to the local registry (at :py:attr:`Profile.registry`),
             such that method chaning takes place on the :py:class:`Profile`
             factoried rather than the meta-descendent. '''
 
         if dynamic_klass.__name__ != 'AbstractProfile':
-            cls.registry[(dynamic_klass.__path__, dynamic_klass.__name__)] = dynamic_klass
+            identity = (dynamic_klass.__path__, dynamic_klass.__name__)
+
+            # index legacy refcodes declared directly on this profile
+            if 'refcode' in dynamic_klass.__dict__:
+                refcode = dynamic_klass.__dict__['refcode']
+                if isinstance(refcode, basestring):
+                    refcode = (refcode,)
+
+                for code in frozenset((cls.normalize_refcode(code) for code in refcode)):
+                    existing = cls.refcodes.get(code)
+                    if existing is not None and (existing.__path__, existing.__name__) != identity:
+                        raise ValueError('Legacy refcode "%s" of profile "%s" is already claimed by'
+                                         ' profile "%s".' % (code, dynamic_klass.__definition__,
+                                                             existing.__definition__))
+                    cls.refcodes[code] = dynamic_klass
+
+            cls.registry[identity] = dynamic_klass
         return dynamic_klass
 
+    @staticmethod
+    def normalize_refcode(refcode):
+
+        ''' Normalize a legacy ``refcode`` for lookup in the
+            refcode index, at :py:attr:`Profile.refcodes`.
+
+            :param refcode: Raw refcode string.
+
+            :returns: Normalized (lowercased and stripped)
+            refcode string. '''
+
+        return refcode.lower().strip()
+
 
 ## AbstractProfile
 # Enforces application of metaclasses and intercepts construction calls.
@@ -519,6 +699,29 @@ class AbstractProfile(object):
             for primitive in generator:
                 yield primitive
 
+    @util.classproperty
+    def plan(cls):
+
+        ''' Retrieve the precompiled :py:class:`MatchPlan` for
+            the locally-interpreted :py:class:`Profile`.
+
+            :returns: :py:class:`MatchPlan` compiled at class
+            construction time, or ``None`` for abstract
+            profiles. '''
+
+        return cls.__interpreter__.plan
+
+    @util.classproperty
+    def aggregation_plan(cls):
+
+        ''' Retrieve the precompiled :py:class:`AggregationPlan`
+            for the locally-interpreted :py:class:`Profile`.
+
+            :returns: :py:class:`AggregationPlan` compiled at class
+            construction time, or ``None`` for abstract profiles. '''
+
+        return cls.__interpreter__.aggregation_plan
+
     @util.classproperty
     def parameters(cls):
 
@@ -580,6 +783,21 @@ class AbstractProfile(object):
             for integration in compound.__interpreter__.integrations:
                 yield integration
 
+    @classmethod
+    def resolve_transport(cls, channel):
+
+        ''' Resolve the :py:class:`TransportConfig` that applies
+            to an input ``channel``, preferring the most specific
+            declaration in the profile ``chain``.
+
+            :param channel: Input channel, enumerated at
+            :py:class:`transport.InputChannel`.
+
+            :returns: Matching :py:class:`TransportConfig`
+            subclass, or ``None`` if none is declared. '''
+
+        return (cls.__interpreter__.transports or {}).get(channel)
+
     @classmethod
     def resolve_parameter(cls, qualified_path):
 
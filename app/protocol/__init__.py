@@ -21,6 +21,7 @@ from . import builtin
 from . import special
 from . import timedelta
 from . import transport
+from . import timewindow
 from . import environment
 
 # Sub-protocol extensions
@@ -33,7 +34,7 @@ from . import integration
 __extensions__ = __all__ = [
     'meta', 'http', 'event',
     'builtin', 'special', 'transport',
-    'timedelta', 'parameter', 'decorators',
+    'timedelta', 'timewindow', 'parameter', 'decorators',
     'environment', 'decorators', 'attribution',
     'aggregation', 'integration'
 ]
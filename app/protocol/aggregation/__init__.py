@@ -11,22 +11,36 @@ Description coming soon.
 '''
 
 # stdlib
-import time
+import zlib
+import struct
 import config
 import base64
-import hashlib
-import datetime
 
 # Protocol
 from protocol import meta
 from protocol import special
 from protocol import timedelta
+from protocol import timewindow
 
 # apptools util
 from apptools.util import debug
 from apptools.util import decorators
 
 
+def fasthash(value):
+
+    ''' Fast, non-cryptographic 64-bit hash for aggregation
+        values, built from ``crc32`` and ``adler32``.
+
+        :param value: Value to hash (``str`` or ``unicode``).
+
+        :returns: 8-byte raw digest (``str``). '''
+
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return struct.pack('>II', zlib.crc32(value) & 0xffffffff, zlib.adler32(value) & 0xffffffff)
+
+
 ## Aggregation
 # Specification class for an aggregated property.
 class Aggregation(meta.ProtocolBinding):
@@ -41,6 +55,7 @@ class Aggregation(meta.ProtocolBinding):
     prop = None  # target properties of this aggregation
     interval = None  # intervals we wish to aggregate for
     permutations = None  # permutations of this aggregation
+    shards = None  # counter shards for hot buckets, as an ``int`` or ``{interval: int}``
 
     ## == Internals == ##
     _BUCKET_PREFIX = special.Prefixes.AGGREGATION  # prefix for bucket name (usually `__aggregation__`)
@@ -57,15 +72,35 @@ class Aggregation(meta.ProtocolBinding):
         # set name + interval, default interval is ``FOREVER`` (global count), set empty tuple of perms
         self.interval = config.get('interval', timedelta.TimeWindow.FOREVER)
         self.permutations = config.get('permutations', tuple())
+        self.shards = config.get('shards', None)
+
+    @classmethod
+    def _hasher(cls):
+
+        ''' Resolve the value hasher for bucket keys, according
+            to the ``hasher`` config block. ``algorithm`` may be
+            ``fast`` (see :py:func:`fasthash`) or a ``hashlib``
+            constructor.
+
+            :returns: Callable producing a raw digest for a value,
+            or ``None`` if value hashing is disabled. '''
+
+        hasher = cls.config.get('hasher', {})
+        if hasher.get('enabled', False) is not True:
+            return None
 
-    def _hashhex(self, value):
+        algorithm = hasher.get('algorithm', 'fast')
+        if algorithm == 'fast':
+            return fasthash
+        return lambda value: algorithm(value.encode('utf-8') if isinstance(value, unicode) else value).digest()
+
+    def _hashvalue(self, value):
 
         ''' Hash the target value according to the current
             settings for bucket key hashing. '''
 
-        if self.config.get('hasher', {}).get('enabled', False) is True:
-            return self.config.get('hasher', {}).get('algorithm', hashlib.sha1)(value).hexdigest()
-        return value
+        hasher = self._hasher()
+        return hasher(value) if hasher else value
 
     @decorators.memoize
     @decorators.classproperty
@@ -90,80 +125,6 @@ class Aggregation(meta.ProtocolBinding):
             'name': _split[-1]
         })._setcondition(cls.config.get('debug', True))
 
-    ## == Timewindow Builders == ##
-    def _hour_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for an hour. '''
-
-        return str(int(time.mktime(datetime.datetime(**{
-            'year': stamp.year,
-            'month': stamp.month,
-            'day': stamp.day,
-            'hour': stamp.hour
-        }).timetuple()) / 1e2))
-
-    def _day_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for a day. '''
-
-        # generates timestamp with day-level granularity
-        return str(int(time.mktime(stamp.date().timetuple()) / 1e3))
-
-    def _week_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for a week. '''
-
-        # like: ``<year>:<week #>``
-        calendar = stamp.date().isocalendar()
-        if window != timedelta.TimeWindow.ONE_WEEK:
-            return self._WINDOW_SEPARATOR.join(map(unicode, list(calendar[:-1])))
-        return self._WINDOW_SEPARATOR.join(map(unicode, calendar[:-1]))
-
-    def _month_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for a month. '''
-
-        # like: ``<year>:<month>``
-        if window != timedelta.TimeWindow.ONE_MONTH:
-            return self._WINDOW_SEPARATOR.join(map(unicode, (stamp.year, stamp.month)))
-        return self._WINDOW_SEPARATOR.join(map(unicode, (stamp.year, stamp.month)))
-
-    def _year_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for a year. '''
-
-        return unicode(stamp.year)
-
-    def _global_timewindow(self, window, stamp):
-
-        ''' Build a timewindow for ``FOREVER``. '''
-
-        return self._GLOBAL_WINDOW
-
-    _window_builders = {
-        timedelta.TimeWindow.ONE_DAY: _day_timewindow,
-        timedelta.TimeWindow.ONE_HOUR: _hour_timewindow,
-        timedelta.TimeWindow.TWO_HOURS: _hour_timewindow,
-        timedelta.TimeWindow.THREE_HOURS: _hour_timewindow,
-        timedelta.TimeWindow.FOUR_HOURS: _hour_timewindow,
-        timedelta.TimeWindow.FIVE_MONTHS: _hour_timewindow,
-        timedelta.TimeWindow.SIX_MONTHS: _hour_timewindow,
-        timedelta.TimeWindow.ONE_WEEK: _week_timewindow,
-        timedelta.TimeWindow.TWO_WEEKS: _week_timewindow,
-        timedelta.TimeWindow.THREE_WEEKS: _week_timewindow,
-        timedelta.TimeWindow.FOUR_WEEKS: _week_timewindow,
-        timedelta.TimeWindow.FIVE_WEEKS: _week_timewindow,
-        timedelta.TimeWindow.SIX_WEEKS: _week_timewindow,
-        timedelta.TimeWindow.MONTH: _month_timewindow,
-        timedelta.TimeWindow.TWO_MONTHS: _month_timewindow,
-        timedelta.TimeWindow.THREE_MONTHS: _month_timewindow,
-        timedelta.TimeWindow.FOUR_MONTHS: _month_timewindow,
-        timedelta.TimeWindow.FIVE_MONTHS: _month_timewindow,
-        timedelta.TimeWindow.SIX_MONTHS: _month_timewindow,
-        timedelta.TimeWindow.YEAR: _year_timewindow,
-        timedelta.TimeWindow.FOREVER: _global_timewindow
-    }
-
     ## == Component Builders == ##
     def _build_window(self, interval, created):
 
@@ -171,8 +132,7 @@ class Aggregation(meta.ProtocolBinding):
             ``interval`` and ``created`` timestamp. '''
 
         # calculate timewindow string
-        result = self._window_builders.get(interval, self._global_timewindow)(self, interval, created)
-        return result
+        return timewindow.identifier(interval, created)
 
     def _build_spec(self, policy, event):
 
@@ -202,7 +162,7 @@ class Aggregation(meta.ProtocolBinding):
                                          'to have a null value.' % (self, prop))
                     continue
 
-                b64_value = base64.b64encode(value)
+                b64_value = base64.b64encode(self._hashvalue(value))
                 self.logging.debug('Encoding value "%s" to b64 "%s".' % (value, b64_value))
                 hashspec.append(b64_value)
 
@@ -261,6 +221,55 @@ class Aggregation(meta.ProtocolBinding):
         for perm, spec in self._build_perms(policy, event):
             yield perm, spec
 
+    def shards_for(self, interval):
+
+        ''' Resolve the declared counter shard count for buckets
+            of this ``Aggregation`` at ``interval``.
+
+            :param interval: Interval enumerated at
+            :py:class:`timedelta.TimeWindow`.
+
+            :returns: Declared shard count (``int``), or ``0``
+            if buckets at ``interval`` are not declared hot. '''
+
+        if isinstance(self.shards, dict):
+            return self.shards.get(interval, 0)
+        return self.shards or 0
+
+    def compile(self, policy):
+
+        ''' Compile this ``Aggregation`` and all attached
+            permutations against ``policy``, resolving every
+            property up front. Used by :py:class:`AggregationPlan`.
+
+            :param policy: Built :py:class:`EventProfile`
+            descendent to resolve permutation properties against.
+
+            :returns: Yields a tuple of ``(name, path, literal)``
+            steps for each property set (this aggregation first,
+            then each permutation). '''
+
+        if not self.prop:
+            return
+
+        owners = [self.prop]
+        for props in self.permutations:
+            if not isinstance(props, (list, set, frozenset, tuple)):
+                props = (props,)
+
+            resolved = [policy.resolve_parameter(prop) for prop in props]
+            if None in resolved:
+                self.logging.warning('Skipping permutation %s of aggregation %s, which could '
+                                     'not be resolved against policy "%s".' % (props, self, policy))
+                continue
+            owners.append(self.prop + resolved)
+
+        for props in owners:
+            yield tuple(((
+                prop.name,
+                self._PATH_SEPARATOR.join((prop.group.name, prop.name)),
+                prop.basetype is float or prop.literal is True) for prop in props))
+
     def __call__(self, policy, event):
 
         ''' Proxy for ``__call__`` to a nested generator
@@ -270,3 +279,92 @@ class Aggregation(meta.ProtocolBinding):
         # set owner and build
         for aggregation, spec in self.build(policy, event):
             yield spec
+
+
+## AggregationPlan
+# Precompiled aggregation specs for a single profile.
+class AggregationPlan(object):
+
+    ''' Precompiled aggregation plan for a :py:class:`Profile`
+        descendent, built once (at class-construction time)
+        by :py:meth:`Profile.Interpreter.compile`.
+
+        Every :py:class:`Aggregation` in the profile's ``chain``
+        and each of its permutations is reduced to a template of
+        prebuilt key chunks, so that per-event work is limited to
+        encoding property values and appending window suffixes.
+        Output matches :py:meth:`Aggregation.build` exactly. '''
+
+    __slots__ = ('entries', 'hasher')
+
+    def __init__(self, policy):
+
+        ''' Compile a new :py:class:`AggregationPlan` for ``policy``.
+
+            :param policy: :py:class:`Profile` descendent to compile
+            an aggregation plan for.
+
+            :returns: Nothing, as this is a constructor. '''
+
+        entries = []
+        for aggregation in policy.aggregations:
+            intervals = tuple(((
+                interval,
+                Aggregation._CHUNK_SEPARATOR.join(('', str(interval), '')),
+                aggregation.shards_for(interval)) for interval in aggregation.interval))
+
+            for steps in aggregation.compile(policy):
+                entries.append((aggregation, steps, intervals))
+
+        self.entries, self.hasher = tuple(entries), Aggregation._hasher()
+
+    def build(self, event, detail=False):
+
+        ''' Build bucket specifications for every aggregation
+            in this plan against ``event``.
+
+            :param event: :py:class:`TrackedEvent` to build specs for.
+
+            :param detail: Flag (``bool``) to also yield compiled
+            details for each spec. Defaults to ``False``.
+
+            :returns: Yields ``(delta, specs)`` pairs, like
+            :py:meth:`Aggregation.build`, or ``(delta, specs, details)``
+            if ``detail`` is set, where ``details`` holds an
+            ``(interval, infix, shards)`` tuple for each spec. '''
+
+        windows, params, created, hasher = {}, event.params, event.created, self.hasher
+        prefix, chunk = Aggregation._BUCKET_PREFIX, Aggregation._CHUNK_SEPARATOR
+
+        for aggregation, steps, intervals in self.entries:
+
+            hashspec, last = [prefix], steps[-1]
+            for name, path, literal in steps:
+                hashspec.append(path)
+
+                if literal:
+                    delta = params.get(name)  # direct delta value
+                    continue
+
+                delta, value = 1, params.get(name)
+                if value is None:
+                    aggregation.logging.warning('Failed to calculate aggregation '
+                                                '%s because property "%s" was found '
+                                                'to have a null value.' % (aggregation, name))
+                    continue
+                hashspec.append(base64.b64encode(hasher(value) if hasher else value))
+
+            # a null final property means no buckets for this aggregation
+            if not last[2] and params.get(last[0]) is None:
+                continue
+
+            base, final = chunk.join(hashspec), []
+            for interval, infix, count in intervals:
+                if interval not in windows:
+                    windows[interval] = timewindow.identifier(interval, created)
+                final.append(base + infix + windows[interval])
+
+            if detail:
+                yield delta, tuple(final), intervals
+            else:
+                yield delta, tuple(final)
@@ -28,6 +28,7 @@ class Prefixes(meta.ProtocolDefinition):
     REVERSE_INDEX = '__reverse__'  # used by apptools internals to resolve forward indexes
     AGGREGATION = '__aggregation__'  # used by ``EventTracker`` to store aggregated property values
     ATTRIBUTION = '__attribution__'  # used by ``EventTracker`` to store attribution adjacency sets
+    TIMELINE = '__timeline__'  # used by ``EventTracker`` to index events by time
 
 
 ## Separators
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hermes Protocol: Timewindows
+
+Calculates aggregation bucket window identifiers (write path) and
+their begin/end bounds (read path), for every interval enumerated at
+:py:class:`protocol.timedelta.TimeWindow`.
+
+Identifiers match the existing bucket key format exactly:
+
+  * hour-level: local hour start, in epoch seconds, divided by ``100``
+  * day-level: local midnight, in epoch seconds, divided by ``1000``
+  * week-level: ISO ``<year>:<week>``
+  * month-level: ``<year>:<month>``
+  * year-level: ``<year>``
+  * ``FOREVER``: ``__global__``
+
+Identifiers for the current hour/day/week/month/year are cached until
+the boundary rolls over, so most events resolve their windows with a
+pair of comparisons. Decoded bounds are cached by identifier.
+
+Hour-level windows can also be addressed as a slot within their day
+(see :py:func:`slot`), for storage that packs a day's hours together.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+"""
+
+# stdlib
+import time
+import datetime
+
+# Protocol
+from protocol import special
+from protocol import timedelta
+
+
+# Globals
+HOUR, DAY, WEEK, MONTH, YEAR, FOREVER = range(6)  # window granularities
+
+_ONE_HOUR = 3600  # seconds in an hour
+_HOUR_DIVISOR = 100  # hour start is stored as ``epoch / 100``
+_DAY_DIVISOR = 1000  # midnight is stored as ``epoch / 1000`` (truncated)
+_BOUNDS_LIMIT = 4096  # maximum decoded bounds to hold before resetting the cache
+_SEPARATOR = special.Separators.HASH_KEY_VALUE  # separator for compound identifiers (ie. `2013:28`)
+
+_current = {}  # granularity => (begin, end, identifier) for the most recently seen period
+_bounds = {}  # (interval, identifier) => (begin, end) epoch bounds
+_slots = {}  # hour identifier => (day identifier, slot) for packed hour slots
+
+
+## Window table: interval => (granularity, span)
+_windows = {
+    timedelta.TimeWindow.ONE_DAY: (DAY, 1),
+    timedelta.TimeWindow.YEAR: (YEAR, 1),
+    timedelta.TimeWindow.FOREVER: (FOREVER, 1)
+}
+
+for _first, _last, _granularity in ((timedelta.TimeWindow.ONE_HOUR, timedelta.TimeWindow.SIX_HOURS, HOUR),
+                                    (timedelta.TimeWindow.ONE_WEEK, timedelta.TimeWindow.SIX_WEEKS, WEEK),
+                                    (timedelta.TimeWindow.MONTH, timedelta.TimeWindow.SIX_MONTHS, MONTH)):
+    for _interval in xrange(_first, _last + 1):
+        _windows[_interval] = (_granularity, _interval - (_first - 1))
+
+
+def _midnight(date):
+
+    ''' Local epoch timestamp for midnight at the start of ``date``. '''
+
+    return int(time.mktime((date.year, date.month, date.day, 0, 0, 0, 0, 0, -1)))
+
+
+def _add_months(year, month, count):
+
+    ''' Add ``count`` months to ``year``/``month``.
+
+        :returns: Tuple of ``(year, month)``. '''
+
+    month += count - 1
+    return year + (month // 12), (month % 12) + 1
+
+
+def _iso_monday(year, week):
+
+    ''' Resolve the ``date`` of the Monday starting ISO
+        week ``week`` of ``year``. '''
+
+    january_fourth = datetime.date(year, 1, 4)
+    return january_fourth + datetime.timedelta(days=(7 * (week - 1)) - (january_fourth.isoweekday() - 1))
+
+
+def _compute(granularity, stamp):
+
+    ''' Calculate the identifier and naive local bounds of the
+        period of ``granularity`` that contains ``stamp``.
+
+        :returns: Tuple of ``(begin, end, identifier)``. '''
+
+    if granularity is HOUR:
+        begin = stamp.replace(minute=0, second=0, microsecond=0)
+        epoch = int(time.mktime((stamp.year, stamp.month, stamp.day, stamp.hour, 0, 0, 0, 0, -1)))
+        return begin, begin + datetime.timedelta(hours=1), str(epoch // _HOUR_DIVISOR)
+
+    date = stamp.date()
+
+    if granularity is DAY:
+        begin = datetime.datetime(date.year, date.month, date.day)
+        return begin, begin + datetime.timedelta(days=1), str(_midnight(date) // _DAY_DIVISOR)
+
+    if granularity is WEEK:
+        year, week, weekday = date.isocalendar()
+        monday = date - datetime.timedelta(days=weekday - 1)
+        begin = datetime.datetime(monday.year, monday.month, monday.day)
+        return begin, begin + datetime.timedelta(days=7), _SEPARATOR.join((unicode(year), unicode(week)))
+
+    if granularity is MONTH:
+        begin = datetime.datetime(date.year, date.month, 1)
+        end = datetime.datetime(*_add_months(date.year, date.month, 1), day=1)
+        return begin, end, _SEPARATOR.join((unicode(date.year), unicode(date.month)))
+
+    # year-level
+    return datetime.datetime(date.year, 1, 1), datetime.datetime(date.year + 1, 1, 1), unicode(date.year)
+
+
+## === Public API === ##
+def resolve(interval):
+
+    ''' Resolve the granularity and span of an interval.
+
+        :param interval: Interval enumerated at
+        :py:class:`protocol.timedelta.TimeWindow`.
+
+        :returns: Tuple of ``(granularity, span)``, where ``span``
+        is a count of ``granularity`` periods. Unknown intervals
+        resolve to ``(FOREVER, 1)``. '''
+
+    return _windows.get(interval, (FOREVER, 1))
+
+
+def identifier(interval, stamp, cache=True):
+
+    ''' Calculate the bucket window identifier for an event
+        created at ``stamp`` (write path).
+
+        :param interval: Interval enumerated at
+        :py:class:`protocol.timedelta.TimeWindow`.
+
+        :param stamp: Naive local ``datetime`` the event was
+        created at.
+
+        :param cache: Flag (``bool``) to consult and update the
+        current-period cache. Pass ``False`` for stamps that are
+        not recent, so they don't evict the current period.
+
+        :returns: Window identifier string, in the existing
+        bucket key format. '''
+
+    granularity = _windows.get(interval, (FOREVER, 1))[0]
+    if granularity is FOREVER:
+        return timedelta._GLOBAL_WINDOW_POSTFIX
+
+    if not cache:
+        return _compute(granularity, stamp)[2]
+
+    current = _current.get(granularity)
+    if current is None or not (current[0] <= stamp < current[1]):
+        current = _current[granularity] = _compute(granularity, stamp)
+    return current[2]
+
+
+def bounds(interval, identifier):
+
+    ''' Decode the epoch bounds of the bucket window at
+        ``identifier`` (read path).
+
+        :param interval: Interval enumerated at
+        :py:class:`protocol.timedelta.TimeWindow`.
+
+        :param identifier: Window identifier, as generated by
+        :py:func:`identifier`.
+
+        :raises ValueError: If ``interval`` is not a known interval
+        or ``identifier`` cannot be decoded.
+
+        :returns: Tuple of ``(begin, end)`` local epoch timestamps,
+        or ``(None, None)`` for ``FOREVER``. '''
+
+    key = (interval, identifier)
+    if key in _bounds:
+        return _bounds[key]
+
+    if interval not in _windows:
+        raise ValueError('Invalid window `%s` for bounds calculation.' % interval)
+
+    granularity, span = _windows[interval]
+
+    try:
+        if granularity is FOREVER:
+            result = None, None
+
+        elif granularity is HOUR:
+            begin = int(identifier) * _HOUR_DIVISOR
+            result = begin, begin + (span * _ONE_HOUR)
+
+        elif granularity is DAY:
+            # stored midnight was truncated, so find the one midnight in ``[id * 1000, id * 1000 + 1000)``
+            date = datetime.date.fromtimestamp(int(identifier) * _DAY_DIVISOR + (_DAY_DIVISOR - 1))
+            result = _midnight(date), _midnight(date + datetime.timedelta(days=span))
+
+        elif granularity is WEEK:
+            year, week = map(int, identifier.split(_SEPARATOR))
+            monday = _iso_monday(year, week)
+            result = _midnight(monday), _midnight(monday + datetime.timedelta(days=(7 * span)))
+
+        elif granularity is MONTH:
+            year, month = map(int, identifier.split(_SEPARATOR))
+            end_year, end_month = _add_months(year, month, span)
+            result = _midnight(datetime.date(year, month, 1)), _midnight(datetime.date(end_year, end_month, 1))
+
+        else:  # year-level
+            year = int(identifier)
+            result = _midnight(datetime.date(year, 1, 1)), _midnight(datetime.date(year + span, 1, 1))
+
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError('Invalid identifier `%s` for window `%s`.' % (identifier, interval))
+
+    if len(_bounds) >= _BOUNDS_LIMIT:
+        _bounds.clear()
+    _bounds[key] = result
+    return result
+
+
+def slot(interval, identifier):
+
+    ''' Resolve the day and hour slot of an hour-level bucket
+        window, for storage that packs every hour of a day into
+        one structure.
+
+        :param interval: Hour-level interval enumerated at
+        :py:class:`protocol.timedelta.TimeWindow`.
+
+        :param identifier: Hour window identifier, as generated
+        by :py:func:`identifier`.
+
+        :raises ValueError: If ``interval`` is not hour-level or
+        ``identifier`` cannot be decoded.
+
+        :returns: Tuple of ``(day identifier, slot)``, where the
+        day identifier matches the ``ONE_DAY`` window and ``slot``
+        counts hours since local midnight (``0`` - ``24``, as
+        DST days can run to 25 hours). '''
+
+    if identifier in _slots:
+        return _slots[identifier]
+
+    if _windows.get(interval, (FOREVER, 1))[0] is not HOUR:
+        raise ValueError('Window `%s` is not hour-level, and has no slot.' % interval)
+
+    try:
+        begin = int(identifier) * _HOUR_DIVISOR
+    except (TypeError, ValueError):
+        raise ValueError('Invalid identifier `%s` for window `%s`.' % (identifier, interval))
+
+    midnight = _midnight(datetime.date.fromtimestamp(begin))
+    if len(_slots) >= _BOUNDS_LIMIT:
+        _slots.clear()
+    _slots[identifier] = result = str(midnight // _DAY_DIVISOR), (begin - midnight) // _ONE_HOUR
+    return result
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hermes: Event IDs
+
+Generates compact, time-ordered (k-sortable) IDs for raw and tracked
+events. Each ID packs a 64-bit integer:
+
+  * 42 bits: milliseconds since :py:data:`EPOCH`
+  * 10 bits: worker ID (see :py:func:`worker`)
+  * 12 bits: per-millisecond sequence
+
+and is encoded as exactly 11 base62 characters, in an alphabet that
+sorts in ASCII order. IDs therefore sort by creation time, both as
+integers and as strings, so a time range of events can be selected
+by ID alone (see :py:func:`bounds`).
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+"""
+
+# stdlib
+import os
+import time
+import zlib
+import socket
+import string
+import datetime
+import threading
+
+# app config
+import config
+
+
+## Globals
+EPOCH = 1356998400000  # 2013-01-01T00:00:00Z, in milliseconds
+LENGTH = 11  # characters in an encoded ID
+
+_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase  # base62, in ASCII order
+_INDEX = dict((char, i) for i, char in enumerate(_ALPHABET))
+_WORKER_BITS, _SEQUENCE_BITS = 10, 12
+_WORKER_MASK, _SEQUENCE_MASK = (1 << _WORKER_BITS) - 1, (1 << _SEQUENCE_BITS) - 1
+
+_SKEW = 1000  # milliseconds a stamp may lag the last ID before it's treated as a backfill
+
+_lock = threading.Lock()
+_state = {'pid': None, 'worker': 0, 'renew': None, 'last': 0, 'sequence': 0, 'backfill': 0}
+_allocator = None  # callable leasing worker IDs, if registered (see :py:func:`register`)
+
+
+def _millis(stamp=None):
+
+    ''' Convert ``stamp`` to milliseconds since the Unix epoch.
+
+        :param stamp: Naive local ``datetime``, epoch timestamp
+        in seconds, or ``None`` for the current time. '''
+
+    if stamp is None:
+        return int(time.time() * 1000)
+    if isinstance(stamp, datetime.datetime):
+        return int(time.mktime(stamp.timetuple()) * 1000) + (stamp.microsecond // 1000)
+    return int(stamp * 1000)
+
+
+def _encode(number):
+
+    ''' Encode ``number`` as a fixed-width base62 string. '''
+
+    chars = []
+    for i in xrange(LENGTH):
+        number, digit = divmod(number, 62)
+        chars.append(_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def _pack(millis, worker, sequence):
+
+    ''' Pack ID components into an encoded ID. '''
+
+    return _encode(((max(millis - EPOCH, 0)) << (_WORKER_BITS + _SEQUENCE_BITS)) | (
+        (worker & _WORKER_MASK) << _SEQUENCE_BITS) | (sequence & _SEQUENCE_MASK))
+
+
+## === Public API === ##
+def register(allocator):
+
+    ''' Register a callable to lease worker IDs from, so that
+        concurrently running processes never share one.
+
+        :param allocator: Callable accepting the worker ID
+        currently held by this process (or ``None``) and a lease
+        TTL in seconds, returning the leased worker ID (``int``).
+        It should renew the held ID when it can. '''
+
+    global _allocator
+    _allocator = allocator
+    _state['pid'] = None
+
+
+def worker():
+
+    ''' Resolve the worker ID embedded in IDs generated by
+        this process: the ``worker`` option of the ``util.eventid``
+        config block, or else an ID leased from the allocator
+        registered with :py:func:`register` (renewed at half its
+        ``lease`` TTL). Without either - or if the allocator fails
+        before a lease is held - fall back to a hash of the hostname
+        and PID, which may collide across a large fleet.
+
+        :returns: Worker ID (``int``, ``0`` - ``1023``). '''
+
+    pid, now = os.getpid(), time.time()
+    if _state['pid'] == pid and (_state['renew'] is None or now < _state['renew']):
+        return _state['worker']
+
+    _config = config.config.get('util.eventid', {})
+    held = _state['worker'] if _state['pid'] == pid else None
+    configured, renew = _config.get('worker'), None
+
+    if configured is None and _allocator is not None:
+        ttl = _config.get('lease', 300)
+        try:
+            configured, renew = _allocator(held, ttl), now + (ttl / 2.0)
+        except Exception:
+            configured, renew = held, now + 1  # keep what we hold, and retry shortly
+
+    if configured is None:
+        configured = zlib.crc32('%s:%s' % (socket.gethostname(), pid))
+
+    _state['pid'], _state['worker'], _state['renew'] = pid, configured & _WORKER_MASK, renew
+    return _state['worker']
+
+
+def generate(stamp=None):
+
+    ''' Generate a new event ID.
+
+        :param stamp: Creation time to embed, as a naive local
+        ``datetime`` or epoch timestamp in seconds. Defaults to
+        ``None``, meaning now. IDs generated by one process never
+        go backwards for current-time stamps. Older stamps (backfills)
+        keep their own time, with a rolling sequence.
+
+        :returns: Encoded ID (``str``). '''
+
+    millis, identity = _millis(stamp), worker()
+
+    with _lock:
+        if millis < _state['last'] - _SKEW:
+
+            # backfill: embed the stamp as given, without disturbing the current sequence
+            _state['backfill'] = sequence = (_state['backfill'] + 1) & _SEQUENCE_MASK
+            return _pack(millis, identity, sequence)
+
+        if millis <= _state['last']:
+
+            # same (or an earlier) millisecond: bump the sequence, borrowing from the next millisecond on overflow
+            millis, sequence = _state['last'], _state['sequence'] + 1
+            if sequence > _SEQUENCE_MASK:
+                millis, sequence = millis + 1, 0
+        else:
+            sequence = 0
+
+        _state['last'], _state['sequence'] = millis, sequence
+
+    return _pack(millis, identity, sequence)
+
+
+def decode(eid):
+
+    ''' Decode an ID generated by :py:func:`generate`.
+
+        :param eid: Encoded ID (``str``).
+
+        :raises ValueError: If ``eid`` is not a generated ID
+        (for instance, an ID passed in via ``XAF-Request-ID``).
+
+        :returns: Tuple of ``(timestamp, worker, sequence)``, where
+        ``timestamp`` is in seconds since the Unix epoch. '''
+
+    if not isinstance(eid, basestring) or len(eid) != LENGTH:
+        raise ValueError('Invalid event ID `%s`.' % eid)
+
+    number = 0
+    try:
+        for char in eid:
+            number = (number * 62) + _INDEX[char]
+    except KeyError:
+        raise ValueError('Invalid event ID `%s`.' % eid)
+
+    return ((number >> (_WORKER_BITS + _SEQUENCE_BITS)) + EPOCH) / 1000.0, (
+        (number >> _SEQUENCE_BITS) & _WORKER_MASK), number & _SEQUENCE_MASK
+
+
+def bounds(begin, end):
+
+    ''' Calculate the range of IDs generated from ``begin``
+        up to (but not including) ``end``.
+
+        :param begin: Start of the range, as a naive local
+        ``datetime`` or epoch timestamp in seconds.
+
+        :param end: End of the range, in the same form.
+
+        :returns: Tuple of ``(first, last)`` encoded IDs, both
+        inclusive, for range scans over IDs. '''
+
+    return _pack(_millis(begin), 0, 0), _pack(_millis(end) - 1, _WORKER_MASK, _SEQUENCE_MASK)
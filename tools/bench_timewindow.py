@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+
+Hermes: Timewindow Benchmark
+
+Checks :py:mod:`protocol.timewindow` against the original
+``datetime``/``mktime`` window builders and ``strptime``
+decoder, then times both on the write and read paths. Reads
+are timed with the bounds cache cleared on every call (the
+calculation itself), and again with it warm.
+
+Usage: python tools/bench_timewindow.py [ITERATIONS]
+
+-sam (<sam.gammon@ampush.com>)
+
+'''
+
+import os
+import sys
+import time
+import timeit
+import datetime
+
+ROOT_PATH = '/'.join(os.path.abspath(__file__).split('/')[0:-2])
+APP_PATH = '/'.join([ROOT_PATH, 'app'])
+
+if APP_PATH not in sys.path:
+    sys.path.insert(0, APP_PATH)
+
+from protocol import timedelta
+from protocol import timewindow
+
+
+# Intervals written by default (see ``policy.base._DEFAULT_LOOKBACK``)
+INTERVALS = (timedelta.TimeWindow.ONE_HOUR,
+             timedelta.TimeWindow.ONE_DAY,
+             timedelta.TimeWindow.ONE_WEEK,
+             timedelta.TimeWindow.TWO_WEEKS,
+             timedelta.TimeWindow.FOUR_WEEKS,
+             timedelta.TimeWindow.YEAR,
+             timedelta.TimeWindow.FOREVER)
+
+
+## == Original implementation == ##
+def legacy_identifier(interval, stamp):
+
+    ''' Window identifiers, as built by ``Aggregation._window_builders``. '''
+
+    if interval == timedelta.TimeWindow.ONE_DAY:
+        return str(int(time.mktime(stamp.date().timetuple()) / 1e3))
+    if timedelta.TimeWindow.ONE_HOUR <= interval <= timedelta.TimeWindow.FOUR_HOURS:
+        return str(int(time.mktime(datetime.datetime(**{
+            'year': stamp.year,
+            'month': stamp.month,
+            'day': stamp.day,
+            'hour': stamp.hour
+        }).timetuple()) / 1e2))
+    if timedelta.TimeWindow.ONE_WEEK <= interval <= timedelta.TimeWindow.SIX_WEEKS:
+        return ':'.join(map(unicode, stamp.date().isocalendar()[:-1]))
+    if timedelta.TimeWindow.MONTH <= interval <= timedelta.TimeWindow.SIX_MONTHS:
+        return ':'.join(map(unicode, (stamp.year, stamp.month)))
+    if interval == timedelta.TimeWindow.YEAR:
+        return unicode(stamp.year)
+    return timedelta._GLOBAL_WINDOW_POSTFIX
+
+
+def legacy_bounds(interval, identifier):
+
+    ''' Window bounds, as decoded by ``Tracker.resolve_timewindow`` (week-level path). '''
+
+    year, week = map(int, identifier.split(':'))
+    begin = datetime.datetime.strptime("%04d-%02d-1" % (year, week), "%Y-%W-%w")
+    end = begin + datetime.timedelta(days=7)
+    return int(time.mktime(begin.timetuple())), int(time.mktime(end.timetuple()))
+
+
+def check(days=800):
+
+    ''' Compare identifiers for every hour across ``days`` days,
+        and make sure every identifier decodes to bounds that
+        contain the hour it was built from. '''
+
+    start, mismatches = datetime.datetime(2012, 1, 1, 0, 30), 0
+    for offset in xrange(days * 24):
+        stamp = start + datetime.timedelta(hours=offset)
+        epoch = time.mktime(stamp.timetuple())
+
+        for interval in INTERVALS:
+            ident = timewindow.identifier(interval, stamp)
+            if ident != legacy_identifier(interval, stamp):
+                mismatches += 1
+                print "Mismatch: %s @ %s: %r != %r" % (interval, stamp, ident, legacy_identifier(interval, stamp))
+
+            begin, end = timewindow.bounds(interval, ident)
+            if begin is not None and not (begin <= epoch < end):
+                mismatches += 1
+                print "Bounds: %s @ %s: %s not in [%s, %s)" % (interval, stamp, epoch, begin, end)
+
+    return mismatches
+
+
+def main(iterations=20000):
+
+    ''' Run the consistency check, then the benchmark. '''
+
+    mismatches = check()
+    print "Consistency: %s mismatches." % mismatches
+
+    stamp = datetime.datetime.now()
+    write_old = timeit.timeit(lambda: [legacy_identifier(i, stamp) for i in INTERVALS], number=iterations)
+    write_new = timeit.timeit(lambda: [timewindow.identifier(i, stamp) for i in INTERVALS], number=iterations)
+
+    def uncached(interval, identifier):
+
+        ''' Decode bounds with an empty cache, to time the calculation itself. '''
+
+        timewindow._bounds.clear()
+        return timewindow.bounds(interval, identifier)
+
+    week = timewindow.identifier(timedelta.TimeWindow.ONE_WEEK, stamp)
+    read_old = timeit.timeit(lambda: legacy_bounds(timedelta.TimeWindow.ONE_WEEK, week), number=iterations)
+    read_new = timeit.timeit(lambda: uncached(timedelta.TimeWindow.ONE_WEEK, week), number=iterations)
+    read_hit = timeit.timeit(lambda: timewindow.bounds(timedelta.TimeWindow.ONE_WEEK, week), number=iterations)
+
+    for label, old, new in (('write (per event, %s intervals)' % len(INTERVALS), write_old, write_new),
+                            ('read (per bucket, uncached)', read_old, read_new),
+                            ('read (per bucket, cached)', read_old, read_hit)):
+        print "%-34s old: %8.2fus  new: %8.2fus  (%.1fx)" % (
+            label, (old / iterations) * 1e6, (new / iterations) * 1e6, old / new)
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*map(int, sys.argv[1:2])))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+'''
+Tools: Enforcement Workers
+
+Runs enforcement workers for split ingestion mode (see
+:py:class:`api.platform.tracker.queue.WorkQueue`), which
+claim queued raw events from Redis in batches and run policy
+enforcement and aggregation for them. Run as many as needed,
+on as many nodes as needed:
+
+.. code-block :: console
+
+    $ python tools/enforcer.py [processes] [name]
+
+Each process is named ``<name>:<index>`` (``name`` defaults
+to the hostname). Names must be stable across restarts, so a
+restarted worker picks up any batch it left unfinished.
+
+:author: Sam Gammon (sam.gammon@ampush.com)
+:copyright: (c) 2013 Ampush.
+:license: This is private source code - all rights are reserved. For details about
+          embedded licenses and other legalese, see `LICENSE.md`.
+'''
+
+import sys, os, socket
+
+ROOT_PATH = '/'.join(os.path.abspath(__file__).split('/')[0:-2])
+APP_PATH = '/'.join([ROOT_PATH, 'app'])
+LIB_PATH = '/'.join([APP_PATH, 'lib'])
+DISTLIB_PATH = '/'.join([LIB_PATH, 'dist'])
+
+for x in (ROOT_PATH, APP_PATH, LIB_PATH, DISTLIB_PATH):
+    if x not in sys.path:
+        sys.path = [x] + sys.path
+
+import bootstrap
+
+
+def work(name):
+
+    ''' Run one enforcement worker named ``name``, forever. '''
+
+    bootstrap.AppBootstrapper.prepareImports()
+
+    from api.platform.tracker import Tracker
+    Tracker().queue.run(name)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    name = sys.argv[2] if len(sys.argv) > 2 else socket.gethostname()
+
+    # fork a worker for every process past the first, which runs here
+    for index in xrange(1, processes):
+        if not os.fork():
+            work('%s:%s' % (name, index))
+            os._exit(0)
+
+    work('%s:0' % name)